@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import tempfile
+from datetime import datetime
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2.7
+    tracemalloc = None
+
+import yaml
+
+from adles import __version__ as adles_version
+from adles.interfaces.vsphere_interface import VsphereInterface
+from adles.parser import check_syntax, parse_yaml
+from adles.vsphere import Vsphere
+from adles.vsphere.folder_utils import find_in_folder, traverse_path
+from adles.vsphere.profiler import perf_counter
+from adles.vsphere.simulator import Simulator
+
+SCENARIOS = ["parse", "lookup", "deploy", "cleanup"]
+
+
+class Benchmark:
+    """ Measures the hot paths of ADLES against a :class:`Simulator`.
+
+    Each measurement records the wall time, the number of
+    API round trips made to the simulator, and the peak memory
+    allocated by Python while it ran (not measured on Python 2.7,
+    which lacks tracemalloc). Logs below ERROR are silenced
+    while a measurement runs, so logging doesn't skew it.
+    """
+    __version__ = "0.1.1"
+
+    def __init__(self, latency=0.0, task_duration=0.0, quiet=True):
+        """
+        :param float latency: Seconds each call to the server takes
+        :param float task_duration: Seconds each task takes to complete
+        :param bool quiet: Silence logs below ERROR during measurements
+        """
+        self._log = logging.getLogger('Benchmark')
+        self.latency = float(latency)
+        self.task_duration = float(task_duration)
+        self.quiet = quiet
+        self.results = {}  # Name of measurement -> dict of metrics
+
+    def measure(self, name, func, sim=None):
+        """
+        Measures a function call.
+
+        :param str name: Name to record the measurement under
+        :param func: Function to call with no arguments
+        :param sim: Simulator to count the round trips of
+        :type sim: :class:`Simulator` or None
+        :return: What the function returned
+        """
+        calls = sim.round_trips() if sim is not None else 0
+        disabled = logging.root.manager.disable
+        if self.quiet:
+            logging.disable(logging.WARNING)
+        if tracemalloc is not None:
+            tracemalloc.start()
+        start = perf_counter()
+        try:
+            result = func()
+        finally:
+            elapsed = perf_counter() - start
+            peak = None
+            if tracemalloc is not None:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            logging.disable(disabled)
+        self.results[name] = {
+            "time": elapsed,
+            "round_trips": (sim.round_trips() - calls
+                            if sim is not None else 0),
+            "peak_memory": peak}
+        self._log.info("%s: %s", name, format_result(self.results[name]))
+        return result
+
+    def run_parse(self, sizes, num_services=5):
+        """
+        Parses and checks the syntax of generated exercise specifications.
+
+        :param sizes: Numbers of folders in the specifications
+        :type sizes: list(int)
+        :param int num_services: Number of services in each folder
+        """
+        tmp = tempfile.mkdtemp(prefix="adles-bench-")
+        try:
+            infra_file = os.path.join(tmp, "infra.yaml")
+            with open(infra_file, "w") as f:
+                yaml.dump(make_infra(), f, default_flow_style=False)
+            for size in sizes:
+                spec_file = os.path.join(tmp, "exercise-%d.yaml" % size)
+                with open(spec_file, "w") as f:
+                    yaml.dump(make_spec(size, num_services, infra_file), f,
+                              default_flow_style=False)
+                self.measure("parse/parse_yaml/%d" % size,
+                             lambda: parse_yaml(spec_file))
+                spec = self.measure("parse/check_syntax/%d" % size,
+                                    lambda: check_syntax(spec_file))
+                if spec is None:
+                    self._log.error("Generated specification with %d folders "
+                                    "failed the syntax check", size)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def run_lookup(self, sizes, lookups=100):
+        """
+        Looks up VMs by path and name in inventories of increasing size,
+        first by searching the server then using the inventory index.
+
+        :param sizes: Numbers of objects in the inventories
+        :type sizes: list(int)
+        :param int lookups: Number of lookups to make of each kind
+        """
+        for size in sizes:
+            sim = self._simulator()
+            server = Vsphere(service_instance=sim.connect())
+            root = server.datacenter.vmFolder
+            paths = populate_inventory(sim, size)
+            rand = random.Random(size)  # The same lookups for each run
+            paths = [rand.choice(paths) for _ in range(lookups)]
+            names = [p.rsplit("/", 1)[1] for p in paths[:max(lookups // 10,
+                                                             1)]]
+            for mode in ("live", "indexed"):
+                if mode == "indexed":
+                    self.measure("lookup/snapshot_inventory/%d" % size,
+                                 server.snapshot_inventory, sim)
+                folder = find_in_folder(root, "bench")
+                self.measure("lookup/traverse_path/%s/%d" % (mode, size),
+                             lambda: self._lookup_paths(root, paths), sim)
+                self.measure("lookup/find_in_folder/%s/%d" % (mode, size),
+                             lambda: self._lookup_names(folder, names), sim)
+            server.clear_inventory()
+
+    def _lookup_paths(self, root, paths):
+        for path in paths:
+            if traverse_path(root, path) is None:
+                self._log.error("Could not find %s", path)
+
+    def _lookup_names(self, folder, names):
+        for name in names:
+            if find_in_folder(folder, name, recursive=True) is None:
+                self._log.error("Could not find %s", name)
+
+    def run_phases(self, num_folders, num_services, scenarios=SCENARIOS):
+        """
+        Creates Masters for and deploys an environment,
+        then cleans it up.
+
+        :param int num_folders: Number of folders in the environment
+        :param int num_services: Number of services in each folder
+        :param scenarios: Scenarios to measure (deploy | cleanup).
+        The environment is deployed for cleanup even if it isn't measured.
+        :type scenarios: list(str)
+        """
+        size = "%dx%d" % (num_folders, num_services)
+        sim = self._simulator()
+        templates = sim.add_folder(None, "Templates")
+        for i in range(num_services):
+            sim.add_vm(templates, "template-%d" % i, template=True)
+        server = Vsphere(service_instance=sim.connect())
+
+        tmp = tempfile.mkdtemp(prefix="adles-bench-")
+        try:
+            infra = make_infra()["vmware-vsphere"]
+            infra["journal-file"] = os.path.join(tmp, "journal.db")
+            spec = make_spec(num_folders, num_services,
+                             os.path.join(tmp, "infra.yaml"))
+            interface = VsphereInterface(infra, spec, server=server)
+
+            def phase(name, func):
+                if name.split("/")[0] in scenarios:
+                    self.measure("%s/%s" % (name, size), func, sim)
+                else:
+                    func()
+
+            phase("deploy/create_masters", interface.create_masters)
+            phase("deploy/deploy_environment", interface.deploy_environment)
+            if "cleanup" in scenarios:
+                phase("cleanup/cleanup_environment",
+                      interface.cleanup_environment)
+                phase("cleanup/cleanup_masters", interface.cleanup_masters)
+            if interface.journal is not None:
+                interface.journal.close()
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        server.clear_inventory()
+
+    def _simulator(self):
+        return Simulator(latency=self.latency,
+                         task_duration=self.task_duration)
+
+    def save(self, filename):
+        """
+        Saves the results to a JSON file.
+
+        :param str filename: Name of the file to save to
+        """
+        data = {
+            "adles": adles_version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.now().isoformat(),
+            "latency": self.latency,
+            "task_duration": self.task_duration,
+            "results": self.results}
+        with open(filename, "w") as f:
+            json.dump(data, f, indent=2)
+        self._log.info("Saved benchmark results to %s", filename)
+
+    def format(self):
+        """
+        Formats the results as a table.
+
+        :return: The formatted results
+        :rtype: str
+        """
+        lines = ["%-44s %10s %12s %12s" % ("Benchmark", "Time",
+                                           "Round trips", "Peak memory")]
+        for name, result in self.results.items():
+            lines.append("%-44s %9.3fs %12d %12s"
+                         % (name, result["time"], result["round_trips"],
+                            _fmt_bytes(result["peak_memory"])))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return "Benchmark(latency=%s, task_duration=%s)" % \
+               (self.latency, self.task_duration)
+
+
+def compare_results(old, new, threshold=10.0, min_time=0.01):
+    """
+    Compares two sets of benchmark results.
+    A result regressed if it made or took more than threshold percent
+    more round trips or time.
+
+    :param dict old: Results of the baseline, as saved by :class:`Benchmark`
+    :param dict new: Results to compare with the baseline
+    :param float threshold: Percent slower a result must be to regress
+    :param float min_time: Seconds slower a result must be to regress,
+    so the noise of very fast results is ignored
+    :return: Lines of the comparison, and the number of regressions
+    :rtype: tuple(list(str), int)
+    """
+    lines = ["Comparing with results of ADLES %s from %s"
+             % (old.get("adles"), old.get("date")),
+             "%-44s %10s %10s %8s %12s" % ("Benchmark", "Baseline", "Time",
+                                           "Change", "Round trips")]
+    regressions = 0
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        base = old["results"][name]
+        change = ((result["time"] - base["time"]) / base["time"] * 100.0
+                  if base["time"] > 0 else 0.0)
+        line = "%-44s %9.3fs %9.3fs %+7.1f%% %5d -> %d" % (
+            name, base["time"], result["time"], change,
+            base["round_trips"], result["round_trips"])
+        limit = base["round_trips"] * (1.0 + threshold / 100.0)
+        if result["round_trips"] > limit or \
+                (change > threshold
+                 and result["time"] - base["time"] > min_time):
+            line += "  REGRESSION"
+            regressions += 1
+        lines.append(line)
+    return lines, regressions
+
+
+def load_results(filename):
+    """
+    Loads benchmark results saved by :meth:`Benchmark.save`.
+
+    :param str filename: Name of the JSON file
+    :return: The results
+    :rtype: dict or None
+    """
+    try:
+        with open(filename) as f:
+            data = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        logging.error("Could not load benchmark results from %s: %s",
+                      filename, str(e))
+        return None
+    if "results" not in data:
+        logging.error("No benchmark results in %s", filename)
+        return None
+    return data
+
+
+def make_infra():
+    """
+    Makes an infrastructure specification for the simulator.
+
+    :return: The infrastructure specification
+    :rtype: dict
+    """
+    return {"vmware-vsphere": {
+        "hostname": "simulator",
+        "port": 443,
+        "datacenter": "datacenter",
+        "datastore": "Datastore",
+        "template-folder": "Templates",
+        "vswitch": "vSwitch0"}}
+
+
+def make_spec(num_folders, num_services, infra_file):
+    """
+    Makes an exercise specification with base folders that each
+    have an instance of every service.
+
+    :param int num_folders: Number of folders
+    :param int num_services: Number of services in each folder
+    :param str infra_file: Name of the infrastructure file it uses
+    :return: The exercise specification
+    :rtype: dict
+    """
+    services = dict(("service-%d" % i, {"template": "template-%d" % i})
+                    for i in range(num_services))
+    folders = {}
+    for i in range(num_folders):
+        folders["folder-%d" % i] = {
+            "group": "students",
+            "services": dict(("instance-%d" % j, {
+                "service": "service-%d" % j,
+                "networks": ["unique-net", "generic-net"]})
+                for j in range(num_services))}
+    return {
+        "metadata": {
+            "name": "adles-bench",
+            "description": "Generated specification for benchmarks",
+            "activity": "Benchmark",
+            "prefix": "bench",
+            "infra-file": infra_file},
+        "groups": {"students": {"user-list": ["student"]}},
+        "services": services,
+        "networks": {
+            "unique-networks": {"unique-net": {"description": "Unique"}},
+            "generic-networks": {"generic-net": {"description": "Generic"}}},
+        "folders": folders}
+
+
+def populate_inventory(sim, size, per_folder=100):
+    """
+    Adds VMs in folders to a simulator's inventory.
+    The objects are all in a folder named "bench" in the vmFolder.
+
+    :param sim: The simulator to add to
+    :type sim: :class:`Simulator`
+    :param int size: Number of folders and VMs to add,
+    not counting the "bench" folder
+    :param int per_folder: Number of VMs in each folder
+    :return: Paths of the VMs added, relative to the vmFolder
+    :rtype: list(str)
+    """
+    root = sim.add_folder(None, "bench")
+    paths = []
+    for i in range(size):
+        if i % (per_folder + 1) == 0:
+            folder_name = "folder-%d" % i
+            folder = sim.add_folder(root, folder_name)
+        else:
+            sim.add_vm(folder, "vm-%d" % i)
+            paths.append("bench/%s/vm-%d" % (folder_name, i))
+    return paths
+
+
+def format_result(result):
+    """
+    Formats the metrics of a measurement.
+
+    :param dict result: The measurement
+    :return: The formatted metrics
+    :rtype: str
+    """
+    return "%.3fs, %d round trips, %s peak memory" % \
+           (result["time"], result["round_trips"],
+            _fmt_bytes(result["peak_memory"]))
+
+
+def _fmt_bytes(num):
+    """ Formats a number of bytes with a binary unit. """
+    if num is None:  # Not measured
+        return "n/a"
+    for unit in ("B", "KiB", "MiB"):
+        if num < 1024:
+            return "%.1f %s" % (num, unit) if unit != "B" else "%d B" % num
+        num /= 1024.0
+    return "%.1f GiB" % num
@@ -17,6 +17,9 @@ import logging
 
 class Group:
     """ Manages a group of users that has been loaded from a specification """
+    __slots__ = ("name", "group_type", "users", "size", "is_template",
+                 "instance", "ad_group")
+    _log = logging.getLogger('Group')
 
     def __init__(self, name, group, instance=None):
         """
@@ -24,14 +27,15 @@ class Group:
         :param dict group: Dict specification of the group
         :param int instance: Instance number of a template group
         """
-        self._log = logging.getLogger('Group')
         self._log.debug("Initializing Group '%s'", name)
 
+        self.ad_group = None
         if instance:
             self.is_template = True
             self.instance = instance
         else:
             self.is_template = False
+            self.instance = None
 
         # !!! NOTE: ad-groups must be handled externally by caller !!!
         if "ad-group" in group:
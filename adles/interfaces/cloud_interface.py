@@ -38,10 +38,10 @@ class CloudInterface(LibcloudInterface):
         self._log.debug(self.available_images)
         self._log.debug(self.available_sizes)
 
-    def create_masters(self):
+    def create_masters(self, resume=False):
         pass
 
-    def deploy_environment(self):
+    def deploy_environment(self, resume=False):
         pass
 
     def cleanup_masters(self, network_cleanup=False):
@@ -65,10 +65,10 @@ class DockerInterface(Interface):
         # List images currently on the server
         self._log.debug("Images: %s", str(self.client.images.list()))
 
-    def create_masters(self):
+    def create_masters(self, resume=False):
         pass
 
-    def deploy_environment(self):
+    def deploy_environment(self, resume=False):
         pass
 
     def cleanup_masters(self, network_cleanup=False):
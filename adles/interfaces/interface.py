@@ -38,12 +38,20 @@ class Interface:
         self.thresholds = {}    # Thresholds for platforms
         self.groups = {}        # Groups for platforms
 
-    def create_masters(self):
-        """Master creation phase."""
+    def create_masters(self, resume=False):
+        """
+        Master creation phase.
+
+        :param bool resume: Resume a previous run of the phase
+        """
         pass
 
-    def deploy_environment(self):
-        """Environment deployment phase."""
+    def deploy_environment(self, resume=False):
+        """
+        Environment deployment phase.
+
+        :param bool resume: Resume a previous run of the phase
+        """
         pass
 
     def cleanup_masters(self, network_cleanup=False):
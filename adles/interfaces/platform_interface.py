@@ -15,29 +15,35 @@
 import logging
 
 from adles.interfaces import Interface
+from adles.vsphere.profiler import Profiler
 
 
 class PlatformInterface(Interface):
     """Generic interface used to uniformly interact with
     platform-specific interfaces."""
-    __version__ = "1.0.0"
+    __version__ = "1.1.0"
 
-    def __init__(self, infra, spec):
+    def __init__(self, infra, spec, profiler=None):
         """
         :param dict infra: Full infrastructure configuration
         :param dict spec: Full exercise specification
+        :param profiler: Profiler to account for the calls made to
+        the platforms [default: a new profiler]
+        :type profiler: :class:`Profiler` or None
         """
         super(self.__class__, self).__init__(infra=infra, spec=spec)
         self._log = logging.getLogger(str(self.__class__))
         self._log.debug("Initializing %s %s", self.__class__, self.__version__)
         self.interfaces = []  # List of instantiated platform interfaces
+        self.profiler = profiler if profiler is not None else Profiler()
 
         # Select the Interface to use based on
         # the specified infrastructure platform
         for platform, config in infra.items():
             if platform == "vmware-vsphere":
                 from .vsphere_interface import VsphereInterface
-                self.interfaces.append(VsphereInterface(config, spec))
+                self.interfaces.append(VsphereInterface(
+                    config, spec, profiler=self.profiler))
             elif platform == "docker":
                 from .docker_interface import DockerInterface
                 self.interfaces.append(DockerInterface(config, spec))
@@ -53,22 +59,29 @@ class PlatformInterface(Interface):
                 self._log.error("Invalid platform: %s", str(platform))
                 raise ValueError
 
-    # @time_execution
-    def create_masters(self):
-        """Master creation phase."""
+    def create_masters(self, resume=False):
+        """
+        Master creation phase.
+
+        :param bool resume: Resume a previous run of the phase
+        """
         self._log.info("Creating Master instances for %s",
                        self.metadata["name"])
-        for i in self.interfaces:
-            i.create_masters()
+        with self.profiler.phase("masters"):
+            for i in self.interfaces:
+                i.create_masters(resume=resume)
 
-    # @time_execution
-    def deploy_environment(self):
-        """Environment deployment phase."""
+    def deploy_environment(self, resume=False):
+        """
+        Environment deployment phase.
+
+        :param bool resume: Resume a previous run of the phase
+        """
         self._log.info("Deploying environment for %s", self.metadata["name"])
-        for i in self.interfaces:
-            i.deploy_environment()
+        with self.profiler.phase("deploy"):
+            for i in self.interfaces:
+                i.deploy_environment(resume=resume)
 
-    # @time_execution
     def cleanup_masters(self, network_cleanup=False):
         """
         Cleans up master instances.
@@ -77,10 +90,10 @@ class PlatformInterface(Interface):
         """
         self._log.info("Cleaning up Master instances for %s",
                        self.metadata["name"])
-        for i in self.interfaces:
-            i.cleanup_masters(network_cleanup=network_cleanup)
+        with self.profiler.phase("cleanup"):
+            for i in self.interfaces:
+                i.cleanup_masters(network_cleanup=network_cleanup)
 
-    # @time_execution
     def cleanup_environment(self, network_cleanup=False):
         """
         Cleans up a deployed environment.
@@ -88,5 +101,6 @@ class PlatformInterface(Interface):
         :param bool network_cleanup: If networks should be cleaned up
         """
         self._log.info("Cleaning up environment for %s", self.metadata["name"])
-        for i in self.interfaces:
-            i.cleanup_masters(network_cleanup=network_cleanup)
+        with self.profiler.phase("cleanup"):
+            for i in self.interfaces:
+                i.cleanup_environment(network_cleanup=network_cleanup)
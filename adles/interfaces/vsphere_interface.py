@@ -15,20 +15,30 @@
 import logging
 import sys
 import os.path
+import threading
 
+from pyVmomi import vim, VmomiSupport
+
+from adles.journal import Journal
+from adles.planner import run_plan
 from adles.vsphere.folder_utils import format_structure
-from adles.utils import pad, read_json, is_folder, is_vm, get_vlan
+from adles.utils import pad, read_json
 from adles.vsphere import Vsphere
-from adles.vsphere.network_utils import create_portgroup
+from adles.vsphere.inventory import Inventory
+from adles.vlan import VlanAllocator
+from adles.vsphere.network_utils import create_portgroup, \
+    create_portgroups, get_portgroups, remove_portgroups
+from adles.vsphere.placement import Placement
 from adles.vsphere.vm import VM
 from adles.interfaces import Interface
+from adles.interfaces.vsphere_planner import VspherePlanner
 
 
 class VsphereInterface(Interface):
     """Generic interface for the VMware vSphere platform."""
-    __version__ = "1.0.7"
+    __version__ = "1.16.0"
 
-    def __init__(self, infra, spec):
+    def __init__(self, infra, spec, server=None, profiler=None):
         """
         .. warning:: The infrastructure and spec are assumed to be valid,
         therefore checks on key existence and types are NOT performed 
@@ -36,53 +46,89 @@ class VsphereInterface(Interface):
 
         :param dict infra: Infrastructure information
         :param dict spec: The parsed exercise specification
+        :param server: vSphere server to use instead of connecting
+        with the login information in the infrastructure
+        :type server: :class:`Vsphere` or None
+        :param profiler: Profiler to account for the calls made to the server
+        :type profiler: :class:`Profiler` or None
         """
         super(self.__class__, self).__init__(infra=infra, spec=spec)
         self._log = logging.getLogger(str(self.__class__))
         self._log.debug("Initializing %s %s", self.__class__, self.__version__)
         self.master_folder = None
         self.template_folder = None
-        # Used to do lookups of Generic networks during deployment
-        self.net_table = {}
-        # Cache containing Master instances (TODO: potential naming conflicts)
+        self.templates = None  # Catalogue of the templates in template_folder
+        self.template_vms = {}  # Template moId -> VM, for the Master plan
+        # Directory of networks by lowercase name, so the networks of NICs
+        # are looked up without searching the server. It's filled once
+        # per phase by _load_networks, and None when it needs to be filled.
+        self.net_table = None
+        # Master instances by their path, as in the plan
+        # (e.g "/MASTER-FOLDERS/(MASTER) folder/(MASTER) service")
         self.masters = {}
-
-        if "thresholds" in infra:
-            self.thresholds = infra["thresholds"]
-        else:
-            self.thresholds = {
-                "folder": {
-                    "warn": 25,
-                    "error": 50},
-                "service": {
-                    "warn": 50,
-                    "error": 70}
-            }
-
-        # Read infrastructure login information
-        if "login-file" in infra:
-            logins = read_json(infra["login-file"])
+        # Paths of the Masters cloned in this run, with their vNICs
+        # already configured by the clone
+        self.created_masters = set()
+        # Guards the network directory when cloning concurrently
+        self._net_lock = threading.RLock()
+
+        # Maximum number of operations to run at the same time
+        self.max_workers = int(infra.get("max-workers", 8))
+        # Maximum number of Masters to create at the same time
+        self.master_workers = int(infra.get("master-workers",
+                                            self.max_workers))
+
+        # Compiles the specification into plans of operations for each phase
+        self.planner = VspherePlanner(infra, spec)
+        self.thresholds = self.planner.thresholds
+
+        # Journal of completed work, used to resume an interrupted phase.
+        # It's opened by the phases that use it, as are the VLANs.
+        self.journal = None
+        self.journal_file = self.metadata.get(
+            "journal-file", infra.get("journal-file", "%s-journal.db"
+                                      % self.metadata["name"]))
+        self._vlans = None
+        self.vlan_range = (int(infra.get("vlan-start", 2000)),
+                           int(infra.get("vlan-end", 4094)))
+
+        # Connect to vCenter, unless given a server to use
+        if server is not None:
+            self.server = server
         else:
-            self._log.warning("No login-file specified, "
-                              "defaulting to user prompts...")
-            logins = {}
-
-        # Instantiate the vSphere vCenter server instance class
-        self.server = Vsphere(username=logins.get("user"),
-                              password=logins.get("pass"),
-                              hostname=infra.get("hostname"),
-                              port=int(infra.get("port")),
-                              datastore=infra.get("datastore"),
-                              datacenter=infra.get("datacenter"))
+            self.server = self._connect(infra)
+        if profiler is not None:
+            self.server.profile(profiler)
+        # Snapshot the inventory so lookups by name don't search the server
+        self.server.snapshot_inventory()
 
         # Acquire ESXi hosts
-        if "hosts" in infra:
-            hosts = infra["hosts"]
-            self.host = self.server.get_host(hosts[0])
+        hosts = infra.get("host-list", infra.get("hosts"))
+        if hosts:
             # Gather all the ESXi hosts
             self.hosts = [self.server.get_host(h) for h in hosts]
+            if None in self.hosts:
+                self._log.error("Could not find all ESXi hosts in %s",
+                                str(hosts))
+                sys.exit(1)
+            self.host = self.hosts[0]
         else:
             self.host = self.server.get_host()  # First host found in Datacenter
+            self.hosts = [self.host]
+
+        # Spread VMs across the hosts and datastores
+        if "datastore-list" in infra:
+            datastores = [self.server.get_datastore(d)
+                          for d in infra["datastore-list"]]
+            if None in datastores:
+                self._log.error("Could not find all datastores in %s",
+                                str(infra["datastore-list"]))
+                sys.exit(1)
+        else:
+            datastores = [self.server.datastore]
+        self.placement = Placement(self.server, self.hosts, datastores,
+                                   infra.get("placement", "round-robin"))
+        self._log.info("VM placement: %s", str(self.placement))
 
         # Instantiate and initialize Groups
         self.groups = self._init_groups()
@@ -123,11 +169,47 @@ class VsphereInterface(Interface):
         if "vswitch" in infra:
             self.vswitch_name = infra["vswitch"]
         else:
-            from pyVmomi import vim
             self.vswitch_name = self.server.get_item(vim.Network).name
 
         self._log.debug("Finished initializing VsphereInterface")
 
+    @property
+    def vlans(self):
+        """ VLANs of the networks created for the exercise,
+        kept in the journal file (:class:`VlanAllocator`) """
+        with self._net_lock:  # Networks are created by workers
+            if self._vlans is None:
+                self._vlans = VlanAllocator(self.journal_file,
+                                            self.metadata["name"],
+                                            start=self.vlan_range[0],
+                                            end=self.vlan_range[1])
+        return self._vlans
+
+    def _connect(self, infra):
+        """
+        Connects to the vCenter server using the infrastructure's
+        login information.
+
+        :param dict infra: Infrastructure information
+        :return: The vSphere server
+        :rtype: :class:`Vsphere`
+        """
+        # Read infrastructure login information
+        if "login-file" in infra:
+            logins = read_json(infra["login-file"])
+        else:
+            self._log.warning("No login-file specified, "
+                              "defaulting to user prompts...")
+            logins = {}
+
+        # Instantiate the vSphere vCenter server instance class
+        return Vsphere(username=logins.get("user"),
+                       password=logins.get("pass"),
+                       hostname=infra.get("hostname"),
+                       port=int(infra.get("port")),
+                       datastore=infra.get("datastore"),
+                       datacenter=infra.get("datacenter"))
+
     def _init_groups(self):
         """
         Instantiate and initialize Groups.
@@ -171,8 +253,13 @@ class VsphereInterface(Interface):
                             str(self.server.user_dir.domainList))
         return groups
 
-    def create_masters(self):
-        """ Exercise Environment Master creation phase. """
+    def create_masters(self, resume=False):
+        """
+        Exercise Environment Master creation phase.
+
+        :param bool resume: Skip work recorded in the journal by a previous run
+        """
+        self.server.refresh_inventory()
 
         # Get folder containing templates
         self.template_folder = self.server_root.traverse_path(
@@ -184,192 +271,453 @@ class VsphereInterface(Interface):
         else:
             self._log.debug("Found template folder: '%s'",
                             self.template_folder.name)
+        self.templates = self.server.get_template_catalogue(
+            self.template_folder)
+        self._log.debug("Templates: %s", str(self.templates))
 
-        # Create master folder to hold base service instances
-        self.master_folder = self.root_folder.traverse_path(
-            self.master_root_name)
-        if not self.master_folder:
-            self.master_folder = self.server.create_folder(
-                self.master_root_name, self.root_folder)
-            self._log.info("Created Master folder '%s' in '%s'",
-                           self.master_root_name, self.root_name)
-
-        # Create networks for master instances
-        for net in self.networks:
-            # Iterate through the base network types (unique and generic)
-            self._create_master_networks(net_type=net, default_create=True)
+        # Pick up any recent changes to the hosts' network status
+        for host in self.hosts:
+            host.configManager.networkSystem.RefreshNetworkSystem()
+        self.net_table = None  # The networks may have changed
 
-        # Create Master instances
-        self._master_parent_folder_gen(self.folders, self.master_folder)
+        # Create the networks up front, then the Master folders and instances
+        plan = self.planner.plan_masters()
+        self._wrap_templates(plan)
+        self._provision_networks(self._master_networks(plan))
+        self._run_plan(plan, "masters", resume, workers=self.master_workers)
 
         # Output fully deployed master folder tree to debugging
         self._log.debug(format_structure(self.root_folder.enumerate()))
 
-    def _master_parent_folder_gen(self, folder, parent):
+    def deploy_environment(self, resume=False):
         """
-        Generates parent-type Master folders.
+        Exercise Environment deployment phase
 
-        :param dict folder: Dict with the folder tree structure as in spec
-        :param parent: Parent folder
-        :type parent: vim.Folder
+        :param bool resume: Skip work recorded in the journal by a previous run
         """
-        skip_keys = ["instances", "description", "enabled"]
-        if not self._is_enabled(folder):  # Check if disabled
-            self._log.warning("Skipping disabled parent-type folder %s",
-                              parent.name)
-            return
+        self.server.refresh_inventory()
+        self.master_folder = self.root_folder.traverse_path(
+            self.master_root_name)
+        if self.master_folder is None:  # Check if Master folder was found
+            self._log.error("Could not find Master folder '%s'. "
+                            "Please ensure the  Master Creation phase "
+                            "has been run and the folder exists "
+                            "before attempting Deployment",
+                            self.master_root_name)
+            sys.exit(1)
+        self._log.debug("Master folder name: %s\tPrefix: %s",
+                        self.master_folder.name, self.master_prefix)
+        self.net_table = None  # Look the networks up again for the phase
+
+        # Create the generic networks of every instance before cloning,
+        # then convert Masters to templates and clone the instances
+        plan = self.planner.plan_deployment()
+        self._wrap_masters(plan)
+        self._provision_networks(self._deploy_networks(plan))
+        self._run_plan(plan, "deploy", resume)
+        self._log.info("Finished deploying environment")
 
-        # We have to check every item, as they could be keywords or sub-folders
-        for sub_name, sub_value in folder.items():
-            if sub_name in skip_keys:
-                # Skip configurations that are not relevant
-                continue
-            elif sub_name == "group":
-                pass  # group = self._get_group(sub_value)
-            elif sub_name == "master-group":
-                pass  # master_group = self._get_group(sub_value)
-            else:
-                folder_name = self.master_prefix + sub_name
-                new_folder = self.server.create_folder(folder_name,
-                                                       create_in=parent)
-
-                if "services" in sub_value:  # It's a base folder
-                    if self._is_enabled(sub_value):
-                        self._log.info("Generating Master base-type folder %s",
-                                       sub_name)
-                        self._master_base_folder_gen(sub_name, sub_value,
-                                                     new_folder)
-                    else:
-                        self._log.warning("Skipping disabled "
-                                          "base-type folder %s", sub_name)
-                else:  # It's a parent folder, recurse
-                    if self._is_enabled(sub_value):
-                        self._master_parent_folder_gen(sub_value,
-                                                       parent=new_folder)
-                        self._log.info("Generating Master "
-                                       "parent-type folder %s", sub_name)
-                    else:
-                        self._log.warning("Skipping disabled "
-                                          "parent-type folder %s", sub_name)
+        # Output fully deployed environment tree to debugging
+        self._log.debug(format_structure(self.root_folder.enumerate()))
+
+    def _run_plan(self, plan, phase, resume=False, workers=None):
+        """
+        Executes a plan of operations, recording them in the journal.
+
+        :param plan: The plan to execute
+        :type plan: :class:`Plan`
+        :param str phase: Name of the phase in the journal
+        :param bool resume: Skip work recorded in the journal by a previous run
+        :param int workers: Maximum number of operations to run
+        at the same time [default: max_workers]
+        :return: Results of the operations that succeeded by key
+        :rtype: dict
+        """
+        workers = self.max_workers if workers is None else int(workers)
+        self._log.info("Executing %s using %d workers...",
+                       plan.name, workers)
+        self.journal = Journal(self.journal_file, phase, resume=resume)
+        try:
+            results, failed = run_plan(plan, self._execute, workers)
+        finally:
+            self.journal.close()
+            self.journal = None
+        self._log.info("Completed %d of %d operations",
+                       len(results), len(plan))
+        if failed:
+            self._log.error("%d operations failed or were skipped: %s",
+                            len(failed), ", ".join(failed))
+        return results
+
+    def _execute(self, op, results):
+        """
+        Performs a planned operation, unless the journal shows it's done.
+        This is run by the workers executing a plan.
 
-    def _master_base_folder_gen(self, folder_name, folder_dict, parent):
+        :param op: The operation to perform
+        :type op: :class:`Operation`
+        :param dict results: Results of the finished operations
+        :return: The result of the operation, None or False if it failed
+        """
+        if op.key in self.journal:
+            self._log.debug("Skipping %s, already done", op.key)
+            obj = self._from_journal(op.key)
+            return obj if obj is not None else True
+        result = getattr(self, "_op_" + op.kind)(op, results)
+        if result is not None and result is not False:
+            self._record(op.key, result)
+        return result
+
+    def _op_folder(self, op, results):
+        """ Creates a folder, in the environment root folder by default. """
+        parent = results[op.deps[0]] if op.deps else self.root_folder
+        folder = self.server.create_folder(op.params["name"], create_in=parent)
+        if folder is not None and op.params["name"] == self.master_root_name:
+            self.master_folder = folder
+        return folder
+
+    def _op_portgroup(self, op, results):
+        """
+        Resolves a network of the Master creation phase,
+        which was created by :meth:`_provision_networks`.
         """
-        Generates base-type Master folders.
+        network = self._find_network(op.path)
+        if network is None:
+            self._log.error("Could not find network '%s'", op.path)
+        return network
 
-        :param str folder_name: Name of the base folder
-        :param dict folder_dict: Dict with the base folder tree as in spec
-        :param parent: Parent folder
-        :type parent: vim.Folder
+    def _master_networks(self, plan):
         """
-        # Set the group to apply permissions for
-        # if "master-group" in folder_dict:
-        #     master_group = self._get_group(folder_dict["master-group"])
-        # else:
-        #     master_group = self._get_group(folder_dict["group"])
+        Gets the networks needed by the Masters in a plan.
 
-        # Create Master instances
-        for sname, sconfig in folder_dict["services"].items():
-            if not self._is_vsphere(sconfig["service"]):
-                self._log.debug("Skipping non-vsphere service '%s'", sname)
+        :param plan: Plan of the Master creation phase
+        :type plan: :class:`Plan`
+        :return: Name -> (VLAN ID or None to allocate one, vSwitch name)
+        of the networks
+        :rtype: dict
+        """
+        networks = {}
+        for op in plan:
+            if op.kind == "portgroup":
+                config = op.params["config"]
+                # NOTE: if monitoring, we want promiscuous=True
+                networks[op.path] = (
+                    int(config["vlan"]) if "vlan" in config else None,
+                    config.get("vswitch", self.vswitch_name))
+        return networks
+
+    def _deploy_networks(self, plan):
+        """
+        Gets the generic networks needed by the service instances in a plan.
+        The unique networks were created in the Master creation phase.
+
+        :param plan: Plan of the deployment phase
+        :type plan: :class:`Plan`
+        :return: Name -> (VLAN ID or None to allocate one, vSwitch name)
+        of the networks
+        :rtype: dict
+        """
+        networks = {}
+        for op in plan:
+            if op.kind != "clone" or op.params.get("instance") is None:
                 continue
+            for name in op.params.get("networks", []):
+                if self._determine_net_type(name) != "generic-networks":
+                    continue
+                net_name = self._get_net_name(name, op.params["instance"])
+                if net_name not in networks:
+                    networks[net_name] = (
+                        None,
+                        self.networks["generic-networks"][name].get(
+                            "vswitch", self.vswitch_name))
+        return networks
+
+    def _provision_networks(self, networks):
+        """
+        Creates any of the networks that don't exist on every host VMs
+        are placed on, then fills the network directory.
+        The portgroups on the hosts are read once, and the missing
+        portgroups are created concurrently. Networks without a VLAN are
+        allocated one that isn't used by any of the hosts' portgroups.
+
+        :param dict networks: Name -> (VLAN ID or None, vSwitch name)
+        of the networks to provision
+        :return: Name -> network of the networks provisioned
+        :rtype: dict(str, vim.Network)
+        """
+        if networks:
+            collector = self.server.content.propertyCollector
+            existing = get_portgroups(self.hosts, collector)
+            self._reserve_vlans(existing)
+            portgroups = {}
+            for name, (vlan, vswitch_name) in networks.items():
+                if vlan is None:
+                    vlan = self.vlans.allocate(name)
+                if vlan is None:  # Every VLAN has been allocated
+                    continue
+                portgroups[name] = (vlan, vswitch_name)
+            created = create_portgroups(portgroups, self.hosts, collector,
+                                        max_workers=self.max_workers,
+                                        existing=existing)
+            self._log.info("Provisioned %d networks, created %d portgroups",
+                           len(networks), created)
+        self._load_networks()
+        resolved = dict((name, self._find_network(name)) for name in networks)
+        missing = [name for name, net in resolved.items() if net is None]
+        if missing:
+            self._log.error("Could not provision networks: %s",
+                            ", ".join(missing))
+        return resolved
+
+    def _create_portgroup(self, name, vlan, vswitch_name):
+        """
+        Creates a portgroup on every host VMs are placed on,
+        so VMs can use the network regardless of what host they're on.
+
+        :param str name: Name of the portgroup
+        :param int vlan: VLAN ID of the portgroup
+        :param str vswitch_name: Name of the vSwitch to create it on
+        """
+        for host in self.hosts:
+            create_portgroup(name=name, host=host, promiscuous=False,
+                             vlan=vlan, vswitch_name=vswitch_name)
+        self._load_networks()  # Add the new network to the directory
+
+    def _reserve_vlans(self, portgroups):
+        """
+        Reserves the VLANs of portgroups on the hosts that weren't
+        allocated to the exercise, so they aren't allocated to it's networks.
+
+        :param dict portgroups: Portgroups on the hosts,
+        as returned by :func:`get_portgroups`
+        """
+        in_use = set()
+        for host_portgroups in portgroups.values():
+            for name, vlan in host_portgroups.items():
+                if self.vlans.get(name) != vlan:
+                    in_use.add(vlan)
+        reserved = self.vlans.reserve(in_use)
+        self._log.debug("Reserved %d VLANs in use on the hosts", reserved)
+
+    def _load_networks(self):
+        """
+        Fills the network directory with every network in the Datacenter,
+        using a single retrieval of their names.
+        """
+        inventory = Inventory.retrieve(
+            self.server.content, vimtypes=[vim.Network],
+            container=self.server.datacenter.networkFolder)
+        table = {}
+        for obj in inventory:
+            if isinstance(obj, vim.Network):
+                table[str(inventory.get(obj, "name")).lower()] = obj
+        with self._net_lock:
+            self.net_table = table
+        self._log.debug("Loaded %d networks into the network directory",
+                        len(table))
+
+    def _find_network(self, name):
+        """
+        Looks up a network in the network directory.
+
+        :param str name: Name of the network
+        :return: The network found
+        :rtype: vim.Network or None
+        """
+        with self._net_lock:
+            if self.net_table is None:
+                self._load_networks()
+            return self.net_table.get(str(name).lower())
 
-            self._log.info("Creating Master instance '%s' from service '%s'",
-                           sname, sconfig["service"])
+    def _wrap_templates(self, plan):
+        """
+        Wraps the templates of the Masters in a plan,
+        retrieving the properties of all of them with a single call.
 
-            vm = self._create_service(parent, sconfig["service"],
-                                      sconfig["networks"])
-            if vm is None:
-                self._log.error("Failed to create Master instance '%s' "
-                                "in folder '%s'", sname, folder_name)
-                continue  # Skip to the next service
+        :param plan: Plan of the Mastering phase
+        :type plan: :class:`Plan`
+        """
+        templates = []
+        for op in plan:
+            if op.kind == "master":
+                config = self.services[op.params["service"]]
+                template = self.templates.get(config["template"])
+                if template is not None and template not in templates:
+                    templates.append(template)
+        self.template_vms = dict((vm.get_vim_vm()._moId, vm)
+                                 for vm in VM.from_many(templates))
+        self._log.debug("Wrapped %d templates", len(self.template_vms))
+
+    def _wrap_masters(self, plan):
+        """
+        Wraps the Masters in a plan, using a single retrieval to find
+        them in the Master folder and another to get their properties.
 
-    def _create_service(self, folder, service_name, networks):
+        :param plan: Plan of the Deployment phase
+        :type plan: :class:`Plan`
+        """
+        paths = set(op.path.lower() for op in plan if op.kind == "template")
+        if not paths:
+            return
+        inventory = Inventory.retrieve(
+            self.server.content, vimtypes=[vim.VirtualMachine],
+            container=self.master_folder)
+        found = {}  # moId -> path of the Masters in the plan
+        for obj in inventory:
+            if not isinstance(obj, vim.VirtualMachine):
+                continue
+            parts = []
+            current = obj
+            while current is not None and current != self.master_folder:
+                parts.append(str(inventory.get(current, "name", "")))
+                current = inventory.get(current, "parent")
+            path = "/".join([""] + [self.master_root_name] +
+                            list(reversed(parts)))
+            if current is not None and path.lower() in paths:
+                found.setdefault(obj._moId, (path.lower(), obj))
+        for vm in VM.from_many(obj for _, obj in found.values()):
+            self.masters[found[vm.get_vim_vm()._moId][0]] = vm
+        self._log.debug("Wrapped %d of %d Masters", len(found), len(paths))
+
+    def _op_master(self, op, results):
         """
         Retrieves and clones a service into a master folder.
+        The Master is created with it's resources, note and vNICs
+        configured, so creating it takes a single clone.
 
-        :param folder: Folder to create service in
-        :type folder: vim.Folder
-        :param str service_name: Name of the service to clone
-        :param list networks: Networks to configure the service with
         :return: The service VM instance
         :rtype: :class:`VM`
         """
-        if not self._is_vsphere(service_name):
-            self._log.debug("Skipping non-vsphere service '%s'", service_name)
-            return None
-
+        folder = results[op.deps[0]]
+        service_name = op.params["service"]
         config = self.services[service_name]
         vm_name = self.master_prefix + service_name
+        log = self._master_log(op.path)
+        log.info("Creating Master instance '%s'", vm_name)
 
+        # Resource configurations (minus storage currently)
+        resources = dict(config.get("resource-config", {}))
+        resources.pop("storage", None)
         test = folder.traverse_path(vm_name)  # Check service already exists
         if test is None:
             # Find the template that matches the service definition
-            template = self.template_folder.traverse_path(config["template"])
+            template = self.templates.get(config["template"])
             if not template:
-                self._log.error("Could not find template '%s' for service '%s'",
-                                config["template"], service_name)
+                log.error("Could not find template '%s' for service '%s'",
+                          config["template"], service_name)
                 return None
-            self._log.info("Creating service '%s'", service_name)
+            log.info("Creating service '%s'", service_name)
+            wrapped = self.template_vms.get(template._moId)
+            if wrapped is None:
+                wrapped = VM(vm=template)
+            host, datastore, pool = self.placement.place(
+                key=os.path.dirname(op.path), memory=wrapped.memory or 0,
+                storage=wrapped.storage or 0)
+            changes = self._nic_changes(wrapped,
+                                        op.params.get("networks", []))
             vm = VM(name=vm_name, folder=folder,
-                    resource_pool=self.server.get_pool(),
-                    datastore=self.server.datastore, host=self.host)
-            if not vm.create(template=template):
+                    resource_pool=pool or self.server.get_pool(),
+                    datastore=datastore, host=host)
+            if not vm.create(template=template, device_changes=changes,
+                             note=config.get("note"), **resources):
+                log.error("Failed to create Master instance '%s'", vm_name)
                 return None
-        else:
-            self._log.warning("Service %s already exists", service_name)
-            vm = VM(vm=test)
-            if vm.is_template():  # Check if it's been converted already
-                self._log.warning("Service %s is a Template, "
-                                  "skipping configuration", service_name)
-                return vm
-
-        # Resource configurations (minus storage currently)
-        if "resource-config" in config:
-            vm.edit_resources(**config["resource-config"])
-
+            log.info("Created Master instance '%s'", vm_name)
+            self.created_masters.add(op.path)
+            return vm
+
+        log.warning("Service %s already exists", service_name)
+        vm = VM(vm=test)
+        if vm.is_template():  # Check if it's been converted already
+            log.warning("Service %s is a Template, "
+                        "skipping configuration", service_name)
+            return vm
+        if resources:
+            vm.edit_resources(**resources)
         if "note" in config:  # Set VM note if specified
             vm.set_note(config["note"])
+        return vm
 
+    def _master_log(self, path):
+        """
+        Gets the logger for the Master of a service,
+        so the logs of Masters created at the same time are kept separate.
+
+        :param str path: Path of the Master
+        :return: The logger
+        :rtype: logging.Logger
+        """
+        return logging.getLogger("Master." + os.path.basename(path))
+
+    def _op_nics(self, op, results):
+        """ Configures the vNICs of a Master or service instance. """
+        if op.path in self.created_masters:
+            return True  # Cloned with its vNICs, so there's nothing to do
+        vm = self._as_vm(results[op.deps[0]])
+        if vm.is_template():
+            return True  # Masters that were already converted are skipped
         # NOTE: management interfaces matter here!
         # (If implemented with Monitoring extensions)
-        self._configure_nics(vm, networks=networks)  # Configure VM NICs
-
-        # Post-creation snapshot
+        self._configure_nics(vm, networks=op.params["networks"],
+                             instance=op.params.get("instance"))
+        return True
+
+    def _op_snapshot(self, op, results):
+        """ Takes the post-creation snapshot of a Master. """
+        vm = self._as_vm(results[op.deps[0]])
+        if vm.is_template():
+            return True
+        self._master_log(op.path).info("Taking snapshot of Master '%s'",
+                                       vm.name)
         vm.create_snapshot("Start of Mastering",
                            "Beginning of Mastering phase for exercise %s",
                            self.metadata["name"])
-        return vm
+        return True
+
+    def _op_template(self, op, results):
+        """
+        Converts a Master to a Template, or prepares it for instant cloning.
 
-    def _create_master_networks(self, net_type, default_create):
-        """
-        Creates a network as part of the Master creation phase.
-
-        :param str net_type: Top-level type of the network 
-        (unique | generic | base)
-        :param bool default_create: Whether to create networks 
-        if they don't already exist
-        """
-        # Pick up any recent changes to the host's network status
-        self.host.configManager.networkSystem.RefreshNetworkSystem()
-        self._log.info("Creating %s", net_type)
-
-        for name, config in self.networks[net_type].items():
-            exists = self.server.get_network(name)
-            if exists:
-                self._log.info("PortGroup '%s' already exists on host '%s'",
-                               name, self.host.name)
-            else:  # NOTE: if monitoring, we want promiscuous=True
-                self._log.warning("PortGroup '%s' does not exist on host '%s'",
-                                  name, self.host.name)
-                if default_create:
-                    self._log.info("Creating portgroup '%s' on host '%s'",
-                                   name, self.host.name)
-                    create_portgroup(name=name, host=self.host,
-                                     promiscuous=False,
-                                     vlan=int(config.get("vlan",
-                                                         next(get_vlan()))),
-                                     vswitch_name=config.get("vswitch",
-                                                             self.vswitch_name))
+        :return: The Master
+        :rtype: :class:`VM`
+        """
+        vm = self.masters.get(op.path.lower())  # Wrapped before the phase
+        if vm is None:
+            # Path of the Master in the Master folder
+            path = op.path[len(self.master_root_name) + 2:]
+            item = self.master_folder.traverse_path(path)
+            if not isinstance(item, vim.VirtualMachine):
+                self._log.error("Couldn't find Master '%s' in folder '%s'",
+                                path, self.master_folder.name)
+                return None
+            vm = VM(vm=item)
+            self.masters[op.path.lower()] = vm
+        if op.params["mode"] == "instant":
+            self._prepare_instant_master(vm)
+            return vm
+        if vm.is_template():
+            # Skip if they already exist from a previous run
+            self._log.debug("Master '%s' is already a template", vm.name)
+            return vm
+
+        # Cleanly power off VM before converting to template
+        if vm.powered_on():
+            vm.change_state("off", attempt_guest=True)
+
+        # Take a snapshot to allow reverts to the start of the exercise
+        vm.create_snapshot("Start of exercise",
+                           "Beginning of deployment phase, "
+                           "post-master configuration")
+
+        # Convert Master instance to Template
+        vm.convert_template()
+        # convert_template() assumes it worked, so check with the server
+        if not vm.refresh() or not vm.is_template():
+            self._log.error("Master '%s' did not convert to Template",
+                            vm.name)
+            return None
+        self._log.debug("Converted Master '%s' to Template", vm.name)
+        return vm
 
     def _configure_nics(self, vm, networks, instance=None):
         """
@@ -377,298 +725,171 @@ class VsphereInterface(Interface):
         for a service instance.
 
         :param vm: Virtual Machine to configure vNICs on
-        :type vm: vim.VirtualMachine
+        :type vm: :class:`VM`
         :param list networks: List of networks to configure
         :param int instance: Current instance of a folder 
         for Deployment purposes
+        :return: If the vNICs were configured
+        :rtype: bool
         """
         self._log.info("Editing NICs for VM '%s'", vm.name)
-        num_nics = len(list(vm.network))
-        num_nets = len(networks)
-        nets = networks  # Copy the passed variable so we can edit it later
+        return self._nic_changes(vm, networks, instance).apply()
+
+    def _nic_changes(self, vm, networks, instance=None):
+        """
+        Determines the changes needed for the vNICs of a VM to be
+        on the networks configured for a service. The changes are made
+        with a single reconfiguration, or when a clone of the VM is created.
+
+        :param vm: Virtual Machine the changes are for,
+        or the Master a service instance will be cloned from
+        :type vm: :class:`VM`
+        :param list networks: List of networks to configure
+        :param int instance: Current instance of a folder 
+        for Deployment purposes
+        :return: The changes to the vNICs
+        :rtype: :class:`DeviceChanges`
+        """
+        changes = vm.device_changes()
+        nics = changes.get_nics()
 
         # Ensure number of NICs on VM
         # matches number of networks configured for the service
         #
         # Note that monitoring interfaces will be
         # counted and included in the networks list
-        if num_nics > num_nets:     # Remove excess interfaces
-            diff = int(num_nics - num_nets)
+        if len(nics) > len(networks):     # Remove excess interfaces
             self._log.debug("VM '%s' has %d extra NICs, removing...",
-                            vm.name, diff)
-            for _, nic in enumerate(reversed(range(num_nics)), start=1):
-                vm.remove_nic(nic)
-        elif num_nics < num_nets:   # Create missing interfaces
-            diff = int(num_nets - num_nics)
+                            vm.name, len(nics) - len(networks))
+            for nic in nics[len(networks):]:
+                changes.remove_device(
+                    vim.vm.device.VirtualDeviceSpec(device=nic))
+        elif len(nics) < len(networks):   # Create missing interfaces
             self._log.debug("VM '%s' is deficient %d NICs, adding...",
-                            vm.name, diff)
-            # Add NICs to VM and pop them from the list of networks
-            for _ in range(diff):
-                # Select NIC hardware
-                nic_model = ("vmxnet3" if vm.has_tools() else "e1000")
-                net_name = nets.pop()
-                vm.add_nic(network=self.server.get_network(net_name),
-                           model=nic_model, summary=net_name)
-
-        # Edit the interfaces
-        # (NOTE: any NICs added earlier shouldn't be affected by this)
-        for i, net_name in enumerate(networks, start=1):
+                            vm.name, len(networks) - len(nics))
+
+        model = None
+        for i, net_name in enumerate(networks):
             # Setting the summary to network name
             # allows viewing of name without requiring
             # read permissions to the network itself
             if instance is not None:
                 # Resolve generic networks for deployment phase
                 net_name = self._get_net(net_name, instance)
-            network = self.server.get_network(net_name)
-            if vm.get_nic_by_id(i).backing.network == network:
-                continue  # Skip NICs that are already configured
+            network = self._find_network(net_name)
+            if i < len(nics):
+                if nics[i].backing.network == network:
+                    continue  # Skip NICs that are already configured
+                changes.edit_nic(nic_id=i + 1,
+                                 network=network, summary=net_name)
             else:
-                vm.edit_nic(nic_id=i, network=network, summary=net_name)
+                if model is None:  # Select NIC hardware
+                    model = ("vmxnet3" if vm.has_tools() else "e1000")
+                changes.add_nic(network=network, model=model,
+                                summary=net_name)
+        return changes
 
-    def deploy_environment(self):
-        """ Exercise Environment deployment phase """
-        self.master_folder = self.root_folder.traverse_path(
-            self.master_root_name)
-        if self.master_folder is None:  # Check if Master folder was found
-            self._log.error("Could not find Master folder '%s'. "
-                            "Please ensure the  Master Creation phase "
-                            "has been run and the folder exists "
-                            "before attempting Deployment",
-                            self.master_root_name)
-            sys.exit(1)
-        self._log.debug("Master folder name: %s\tPrefix: %s",
-                        self.master_folder.name, self.master_prefix)
-
-        # Verify and convert Master instances to templates
-        self._log.info("Validating and converting Masters to Templates")
-        self._convert_and_verify(folder=self.master_folder)
-        self._log.info("Finished validating "
-                       "and converting Masters to Templates")
-
-        self._log.info("Deploying environment...")
-        self._deploy_parent_folder_gen(spec=self.folders,
-                                       parent=self.root_folder,
-                                       path="")
-        self._log.info("Finished deploying environment")
+    def _prepare_instant_master(self, vm):
+        """
+        Prepares a Master to be instant cloned.
+        Instant clones are made from a running VM, so it is not converted
+        to a Template and is powered on instead.
 
-        # Output fully deployed environment tree to debugging
-        self._log.debug(format_structure(self.root_folder.enumerate()))
+        :param vm: Master instance to prepare
+        :type vm: :class:`VM`
+        """
+        if vm.is_template():  # Converted to a template by a previous run
+            self._log.warning("Converting Master '%s' back to a VM "
+                              "so it can be instant cloned", vm.name)
+            if vm.resource_pool is None:  # Templates don't have a pool
+                vm.resource_pool = self.server.get_pool()
+            vm.convert_vm()
+        if vm.get_vim_vm().snapshot is None:
+            # Take a snapshot to allow reverts to the start of the exercise
+            if vm.powered_on():
+                vm.change_state("off", attempt_guest=True)
+            vm.create_snapshot("Start of exercise",
+                               "Beginning of deployment phase, "
+                               "post-master configuration")
+        if not vm.powered_on():
+            vm.change_state("on")
+        self._log.debug("Prepared Master '%s' for instant cloning", vm.name)
+
+    def _op_clone(self, op, results):
+        """
+        Clones a service instance from it's Master.
 
-    def _convert_and_verify(self, folder):
+        :return: The service instance
+        :rtype: :class:`VM`
         """
-        Converts Masters to Templates before deployment.
-        This also ensures they are powered off before being cloned.
+        folder = results[op.deps[0]] if len(op.deps) > 1 else self.root_folder
+        master = self._as_vm(results[op.deps[-1]])
+        mode = op.params["mode"]
+        host, datastore, pool = self.placement.place(
+            key=os.path.dirname(op.path), memory=master.memory or 0,
+            storage=(master.storage or 0) if mode == "full" else 0)
+        # The clone is created with it's vNICs on the right networks
+        changes = self._nic_changes(master, op.params.get("networks", []),
+                                    op.params.get("instance"))
+        vm = VM(name=op.params["name"], folder=folder,
+                resource_pool=pool or self.server.get_pool(),
+                datastore=datastore, host=host)
+        if not vm.create(template=master.get_vim_vm(),
+                         clone_mode=mode, device_changes=changes):
+            return None
+        return vm
 
-        :param folder: Folder containing Master instances to convert and verify
-        :type folder: vim.Folder
+    @staticmethod
+    def _as_vm(obj):
         """
-        self._log.debug("Converting Masters in folder '%s' to templates",
-                        folder.name)
-        for item in folder.childEntity:
-            if is_vm(item):
-                vm = VM(vm=item)
-                self.masters[vm.name] = vm
-                if vm.is_template():
-                    # Skip if they already exist from a previous run
-                    self._log.debug("Master '%s' is already a template",
-                                    vm.name)
-                    continue
+        Wraps a VM that was rebuilt from the journal.
 
-                # Cleanly power off VM before converting to template
-                if vm.powered_on():
-                    vm.change_state("off", attempt_guest=True)
-
-                # Take a snapshot to allow reverts to the start of the exercise
-                vm.create_snapshot("Start of exercise",
-                                   "Beginning of deployment phase, "
-                                   "post-master configuration")
-
-                # Convert Master instance to Template
-                vm.convert_template()
-                if not vm.is_template():
-                    self._log.error("Master '%s' did not convert to Template",
-                                    vm.name)
-                else:
-                    self._log.debug("Converted Master '%s' to Template",
-                                    vm.name)
-            elif is_folder(item):  # Recurse into sub-folders
-                self._convert_and_verify(item)
-            else:
-                self._log.debug("Unknown item found while "
-                                "templatizing Masters: %s", str(item))
+        :param obj: The VM
+        :type obj: :class:`VM` or vim.VirtualMachine
+        :return: The VM
+        :rtype: :class:`VM`
+        """
+        return obj if isinstance(obj, VM) else VM(vm=obj)
 
-    def _deploy_parent_folder_gen(self, spec, parent, path):
+    def _record(self, key, obj=None):
         """
-        Generates parent-type folder trees.
+        Records a completed operation in the journal.
 
-        :param dict spec: Dict with folder specification
-        :param parent: Parent folder
-        :type parent: vim.Folder
-        :param str path: Folders path at the current level
+        :param str key: Key naming the operation
+        :param obj: vSphere object the operation created, if any
+        :type obj: vim.ManagedEntity or :class:`VM`
         """
-        skip_keys = ["instances", "description", "master-group", "enabled"]
-        if not self._is_enabled(spec):  # Check if disabled
-            self._log.warning("Skipping disabled parent-type folder %s",
-                              parent.name)
+        if self.journal is None:
             return
+        if isinstance(obj, VM):
+            obj = obj.get_vim_vm()
+        value = ""
+        if hasattr(obj, "_moId"):
+            value = "%s:%s" % (type(obj).__name__, obj._moId)
+        self.journal.record(key, value)
+
+    def _from_journal(self, key):
+        """
+        Gets the vSphere object recorded in the journal for an operation,
+        without querying the server.
 
-        for sub_name, sub_value in spec.items():
-            if sub_name in skip_keys:
-                # Skip configurations that are not relevant
-                continue
-            elif sub_name == "group":  # Configure group
-                pass  # group = self._get_group(sub_value)
-            else:  # Create instances of the parent folder
-                self._log.debug("Deploying parent-type folder '%s'", sub_name)
-                num_instances, prefix = self._instances_handler(spec,
-                                                                sub_name,
-                                                                "folder")
-                for i in range(num_instances):
-                    # If prefix is undefined or there's a single instance,
-                    # use the folder's name
-                    instance_name = (sub_name
-                                     if prefix == "" or num_instances == 1
-                                     else prefix)
-
-                    # If multiple instances, append padded instance number
-                    instance_name += (pad(i) if num_instances > 1 else "")
-
-                    # Create a folder for the instance
-                    new_folder = self.server.create_folder(instance_name,
-                                                           create_in=parent)
-
-                    if "services" in sub_value:  # It's a base folder
-                        if self._is_enabled(sub_value):
-                            self._deploy_base_folder_gen(folder_name=sub_name,
-                                                         folder_items=sub_value,
-                                                         parent=new_folder,
-                                                         path=self._path(
-                                                             path, sub_name))
-                        else:
-                            self._log.warning("Skipping disabled "
-                                              "base-type folder %s", sub_name)
-                    else:  # It's a parent folder
-                        if self._is_enabled(sub_value):
-                            self._deploy_parent_folder_gen(parent=new_folder,
-                                                           spec=sub_value,
-                                                           path=self._path(
-                                                               path, sub_name))
-                        else:
-                            self._log.warning("Skipping disabled "
-                                              "parent-type folder %s", sub_name)
-
-    def _deploy_base_folder_gen(self, folder_name, folder_items, parent, path):
-        """
-        Generates folder tree for deployment stage.
-
-        :param str folder_name: Name of the folder
-        :param dict folder_items: Dict of items in the folder
-        :param parent: Parent folder
-        :type parent: vim.Folder
-        :param str path: Folders path at the current level
-        """
-        # Set the group to apply permissions for
-        # group = self._get_group(folder_items["group"])
-
-        # Check if number of instances for the folder exceeds configured limits
-        num_instances, prefix = self._instances_handler(folder_items,
-                                                        folder_name, "folder")
-
-        # Create instances
-        self._log.info("Deploying base-type folder '%s'", folder_name)
-        for i in range(num_instances):
-            # If no prefix is defined or there's only a single instance,
-            # use the folder's name
-            instance_name = (folder_name
-                             if prefix == "" or num_instances == 1
-                             else prefix)
-
-            # If multiple instances, append padded instance number
-            instance_name += (pad(i) if num_instances > 1 else "")
-
-            if num_instances > 1:  # Create a folder for the instance
-                new_folder = self.server.create_folder(instance_name,
-                                                       create_in=parent)
-            else:  # Don't duplicate folder name for single instances
-                new_folder = parent
-
-            # Use the folder's name for the path,
-            # as that's what matches the Master version
-            self._log.info("Generating services for "
-                           "base-type folder instance '%s'", instance_name)
-            self._deploy_gen_services(services=folder_items["services"],
-                                      parent=new_folder,
-                                      path=path, instance=i)
-
-    def _deploy_gen_services(self, services, parent, path, instance):
-        """
-        Generates the services in a folder.
-
-        :param dict services: The "services" dict in a folder
-        :param parent: Parent folder
-        :type parent: vim.Folder
-        :param str path: Folders path at the current level
-        :param int instance: What instance of a base folder this is
-        """
-        # Iterate through the services
-        for service_name, value in services.items():
-            if not self._is_vsphere(value["service"]):
-                # Ignore non-vsphere services
-                self._log.debug("Skipping non-vsphere service '%s'",
-                                service_name)
-                continue
-            self._log.info("Generating service '%s' in folder '%s'",
-                           service_name, parent.name)
-
-            # Check if number of instances for service exceeds configured limits
-            num_instances, prefix = self._instances_handler(value,
-                                                            service_name,
-                                                            "service")
-
-            # Get the Master template instance to clone from
-            master = self.masters.get(self.master_prefix + value["service"],
-                                      None)
-            if master is None:  # Check if the lookup was successful
-                self._log.error("Couldn't find Master for service '%s' "
-                                "in this path:\n%s", value["service"], path)
-                continue  # Skip to the next service
-
-            # Clone the instances of the service from the master
-            for i in range(num_instances):
-                instance_name = prefix + service_name + (" " + pad(i)
-                                                         if num_instances > 1
-                                                         else "")
-                vm = VM(name=instance_name, folder=parent,
-                        resource_pool=self.server.get_pool(),
-                        datastore=self.server.datastore, host=self.host)
-                if not vm.create(template=master.get_vim_vm()):
-                    self._log.error("Failed to create instance %s",
-                                    instance_name)
-                else:
-                    self._configure_nics(vm, value["networks"],
-                                         instance=instance)
-
-    def _is_vsphere(self, service_name):
-        """
-        Checks if a service instance is defined as a vSphere service.
-
-        :param str service_name: Name of the service to lookup in 
-        list of defined services
-        :return: If a service is a vSphere-type service
-        :rtype: bool
+        :param str key: Key naming the operation
+        :return: The object recorded
+        :rtype: vim.ManagedEntity or None
         """
-        if service_name not in self.services:
-            self._log.error("Could not find service %s in list of services",
-                            service_name)
-        elif "template" in self.services[service_name]:
-            return True
-        return False
+        value = self.journal.get(key) if self.journal is not None else None
+        if not value:
+            return None
+        type_name, mo_id = value.split(":", 1)
+        return VmomiSupport.GetVmodlType(type_name)(mo_id,
+                                                    self.root_folder._stub)
 
     def _get_net(self, name, instance=-1):
         """
         Resolves network names. This is mainly to handle generic-type networks.
-        If a generic network does not exist, it is created and added to 
-        the interface lookup table.
+        Generic networks are created before cloning by
+        :meth:`_provision_networks`. If one does not exist, it is created
+        and added to the interface lookup table.
         :param str name: Name of the network
         :param int instance: Instance number 
 
@@ -684,36 +905,35 @@ class VsphereInterface(Interface):
             if instance == -1:
                 self._log.error("Invalid instance for _get_net: %d", instance)
                 raise ValueError
-            # Generate full name for the generic network
-            net_name = name + "-GENERIC-" + pad(instance)
-            if net_name not in self.net_table:
-                exists = self.server.get_network(net_name)
-                if exists is not None:
-                    self._log.debug("PortGroup '%s' already exists "
-                                    "on host '%s'", net_name,
-                                    self.host.name)
-                else:  # Create the generic network if it does not exist
+            net_name = self._get_net_name(name, instance)
+            with self._net_lock:
+                if self._find_network(net_name) is None:
+                    # Create the generic network if it does not exist
                     # WARNING: lookup of name is case-sensitive!
                     # This can (and has0 lead to bugs
-                    self._log.debug("Creating portgroup '%s' on host '%s'",
-                                    net_name,
-                                    self.host.name)
+                    self._log.debug("Creating portgroup '%s'", net_name)
                     vsw = self.networks["generic-networks"][name].get(
                         "vswitch", self.vswitch_name)
-                    create_portgroup(name=net_name,
-                                     host=self.host,
-                                     promiscuous=False,
-                                     vlan=next(get_vlan()),
-                                     vswitch_name=vsw)
-
-                # Register the existence of the generic network
-                self.net_table[net_name] = True
+                    self._create_portgroup(net_name,
+                                           self.vlans.allocate(net_name), vsw)
             return net_name
         else:
             self._log.error("Invalid network type %s for network %s",
                             net_type, name)
             raise TypeError
 
+    @staticmethod
+    def _get_net_name(name, instance):
+        """
+        Generates the full name of a generic network for an instance.
+
+        :param str name: Name of the generic network
+        :param int instance: Instance number
+        :return: Name of the network for the instance
+        :rtype: str
+        """
+        return name + "-GENERIC-" + pad(instance)
+
     def cleanup_masters(self, network_cleanup=False):
         """
         Cleans up any master instances.
@@ -722,6 +942,11 @@ class VsphereInterface(Interface):
         """
         # Get the folder to cleanup in
         master_folder = self.root_folder.find_in(self.master_root_name)
+        if master_folder is None:
+            self._log.error("Could not find master folder '%s' under "
+                            "folder '%s'", self.master_root_name,
+                            self.root_folder.name)
+            return
         self._log.info("Found master folder '%s' under folder '%s', "
                        "proceeding with cleanup...",
                        master_folder.name, self.root_folder.name)
@@ -731,24 +956,49 @@ class VsphereInterface(Interface):
         master_folder.cleanup(vm_prefix=self.master_prefix,
                               recursive=True,
                               destroy_folders=True,
-                              destroy_self=True)
+                              destroy_self=True,
+                              concurrency=self.max_workers)
 
         # Cleanup networks
         if network_cleanup:
-            pass
+            self._cleanup_networks(
+                [n for n in self.vlans.names() if "-GENERIC-" not in n])
 
     def cleanup_environment(self, network_cleanup=False):
         """
         Cleans up a deployed environment.
+        Everything in the environment root folder is destroyed,
+        except for the Masters.
 
         :param bool network_cleanup: If networks should be cleaned up 
         """
         # Get the root environment folder to cleanup in
         enviro_folder = self.root_folder
+        master_folder = enviro_folder.find_in(self.master_root_name)
+        self._log.info("Cleaning up environment in folder '%s'",
+                       enviro_folder.name)
+        enviro_folder.cleanup(recursive=True, destroy_folders=True,
+                              concurrency=self.max_workers,
+                              exclude=[master_folder] if master_folder else [])
 
         # Cleanup networks
         if network_cleanup:
-            pass
+            self._cleanup_networks(
+                [n for n in self.vlans.names() if "-GENERIC-" in n])
+
+    def _cleanup_networks(self, names):
+        """
+        Removes networks that were allocated a VLAN from the hosts,
+        and releases their VLANs so they can be reused.
+
+        :param list names: Names of the networks
+        """
+        self._log.info("Removing %d networks from %d hosts",
+                       len(names), len(self.hosts))
+        remove_portgroups(names, self.hosts, max_workers=self.max_workers)
+        for name in names:
+            self.vlans.release(name)
+        self.net_table = None  # The networks have changed
 
     def __str__(self):
         return str(self.server) + str(self.groups) + str(self.hosts)
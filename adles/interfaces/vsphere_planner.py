@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+from adles.interfaces import Interface
+from adles.planner import Plan
+from adles.utils import pad
+
+# Estimated number of seconds each type of operation takes
+COSTS = {
+    "folder": 1.0,
+    "portgroup": 2.0,
+    "master": 120.0,    # Full clone of a template
+    "nics": 3.0,
+    "snapshot": 5.0,
+    "template": 5.0,
+    "clone": {"full": 120.0, "linked": 10.0, "instant": 3.0}
+}
+
+
+class VspherePlanner(Interface):
+    """ Compiles an exercise specification into plans of vSphere operations.
+
+    Planning only uses the specifications,
+    so a plan can be made without connecting to vCenter.
+    """
+    __version__ = "0.4.0"
+
+    def __init__(self, infra, spec):
+        """
+        :param dict infra: Infrastructure information
+        :param dict spec: The parsed exercise specification
+        """
+        super(self.__class__, self).__init__(infra=infra, spec=spec)
+        self._log = logging.getLogger(str(self.__class__))
+        self.clone_mode = infra.get("clone-mode", "full")
+        if "thresholds" in infra:
+            self.thresholds = infra["thresholds"]
+        else:
+            self.thresholds = {
+                "folder": {
+                    "warn": 25,
+                    "error": 50},
+                "service": {
+                    "warn": 50,
+                    "error": 70}
+            }
+
+    def plan_masters(self):
+        """
+        Plans the Master creation phase.
+
+        :return: The plan
+        :rtype: :class:`Plan`
+        """
+        plan = Plan("Master creation of %s" % self.metadata["name"])
+        root = plan.add("folder", "/" + self.master_root_name,
+                        cost=COSTS["folder"], name=self.master_root_name)
+        for net_type in self.networks:
+            for name, config in self.networks[net_type].items():
+                plan.add("portgroup", name, cost=COSTS["portgroup"],
+                         config=config)
+        self._plan_master_folders(plan, self.folders, root,
+                                  "/" + self.master_root_name)
+        return plan
+
+    def _plan_master_folders(self, plan, folder, parent, path):
+        """
+        Plans parent-type Master folders and their contents.
+
+        :param plan: Plan to add operations to
+        :type plan: :class:`Plan`
+        :param dict folder: Dict with the folder tree structure as in spec
+        :param str parent: Key of the operation creating the parent folder
+        :param str path: Path of the parent folder
+        """
+        skip_keys = ["instances", "description", "enabled",
+                     "group", "master-group"]
+        if not self._is_enabled(folder):  # Check if disabled
+            self._log.warning("Skipping disabled parent-type folder %s", path)
+            return
+
+        # We have to check every item, as they could be keywords or sub-folders
+        for sub_name, sub_value in folder.items():
+            if sub_name in skip_keys:
+                continue
+            elif not self._is_enabled(sub_value):
+                self._log.warning("Skipping disabled folder %s", sub_name)
+                continue
+            folder_name = self.master_prefix + sub_name
+            folder_path = path + "/" + folder_name
+            new_folder = plan.add("folder", folder_path, deps=[parent],
+                                  cost=COSTS["folder"], name=folder_name)
+            if "services" in sub_value:  # It's a base folder
+                self._plan_masters(plan, sub_value["services"],
+                                   new_folder, folder_path)
+            else:  # It's a parent folder, recurse
+                self._plan_master_folders(plan, sub_value,
+                                          new_folder, folder_path)
+
+    def _plan_masters(self, plan, services, folder, path):
+        """
+        Plans the Master instances of a base-type folder.
+
+        :param plan: Plan to add operations to
+        :type plan: :class:`Plan`
+        :param dict services: The "services" dict in a folder
+        :param str folder: Key of the operation creating the folder
+        :param str path: Path of the folder
+        """
+        for sname, sconfig in services.items():
+            if not self._is_vsphere(sconfig["service"]):
+                self._log.debug("Skipping non-vsphere service '%s'", sname)
+                continue
+            networks = sconfig.get("networks", [])
+            vm_path = path + "/" + self.master_prefix + sconfig["service"]
+            if "master:" + vm_path in plan:
+                # Services in a folder share a Master, which is configured
+                # for the first one. Instances get their own networks.
+                self._log.debug("Master %s is already planned", vm_path)
+                continue
+            master = plan.add("master", vm_path, deps=[folder],
+                              cost=COSTS["master"],
+                              service=sconfig["service"], networks=networks)
+            nets = ["portgroup:" + n for n in networks
+                    if "portgroup:" + n in plan]
+            nics = plan.add("nics", vm_path, deps=[master] + nets,
+                            cost=COSTS["nics"], networks=networks)
+            plan.add("snapshot", vm_path, deps=[master, nics],
+                     cost=COSTS["snapshot"])
+
+    def plan_deployment(self):
+        """
+        Plans the Deployment phase.
+
+        :return: The plan
+        :rtype: :class:`Plan`
+        """
+        plan = Plan("Deployment of %s" % self.metadata["name"])
+        self._plan_deploy_folders(plan, self.folders, None, "",
+                                  "/" + self.master_root_name)
+        return plan
+
+    def _plan_deploy_folders(self, plan, spec, parent, path, master_path):
+        """
+        Plans parent-type folder trees.
+
+        :param plan: Plan to add operations to
+        :type plan: :class:`Plan`
+        :param dict spec: Dict with folder specification
+        :param str parent: Key of the operation creating the parent folder,
+        or None for the environment root folder
+        :param str path: Path of the parent folder
+        :param str master_path: Path of the Master folder of the parent folder
+        """
+        skip_keys = ["instances", "description", "master-group",
+                     "enabled", "group"]
+        if not self._is_enabled(spec):  # Check if disabled
+            self._log.warning("Skipping disabled parent-type folder %s", path)
+            return
+
+        for sub_name, sub_value in spec.items():
+            if sub_name in skip_keys:
+                continue
+            elif not self._is_enabled(sub_value):
+                self._log.warning("Skipping disabled folder %s", sub_name)
+                continue
+            num_instances, prefix = self._instances_handler(spec, sub_name,
+                                                            "folder")
+            for i in range(num_instances):
+                # If prefix is undefined or there's a single instance,
+                # use the folder's name
+                instance_name = (sub_name
+                                 if prefix == "" or num_instances == 1
+                                 else prefix)
+
+                # If multiple instances, append padded instance number
+                instance_name += (pad(i) if num_instances > 1 else "")
+                folder_path = path + "/" + instance_name
+                sub_master_path = master_path + "/" + \
+                    self.master_prefix + sub_name
+                new_folder = plan.add("folder", folder_path, deps=[parent],
+                                      cost=COSTS["folder"], name=instance_name)
+                if "services" in sub_value:  # It's a base folder
+                    self._plan_base_folder(plan, sub_name, sub_value,
+                                           new_folder, folder_path,
+                                           sub_master_path)
+                else:  # It's a parent folder
+                    self._plan_deploy_folders(plan, sub_value,
+                                              new_folder, folder_path,
+                                              sub_master_path)
+
+    def _plan_base_folder(self, plan, folder_name, folder_items, parent, path,
+                          master_path):
+        """
+        Plans the instances of a base-type folder.
+
+        :param plan: Plan to add operations to
+        :type plan: :class:`Plan`
+        :param str folder_name: Name of the folder
+        :param dict folder_items: Dict of items in the folder
+        :param str parent: Key of the operation creating the parent folder
+        :param str path: Path of the parent folder
+        :param str master_path: Path of the Master folder of the folder
+        """
+        num_instances, prefix = self._instances_handler(folder_items,
+                                                        folder_name, "folder")
+        for i in range(num_instances):
+            # If no prefix is defined or there's only a single instance,
+            # use the folder's name
+            instance_name = (folder_name
+                             if prefix == "" or num_instances == 1
+                             else prefix)
+
+            # If multiple instances, append padded instance number
+            instance_name += (pad(i) if num_instances > 1 else "")
+
+            if num_instances > 1:  # Create a folder for the instance
+                folder_path = path + "/" + instance_name
+                new_folder = plan.add("folder", folder_path, deps=[parent],
+                                      cost=COSTS["folder"], name=instance_name)
+            else:  # Don't duplicate folder name for single instances
+                folder_path, new_folder = path, parent
+            self._plan_services(plan, folder_items["services"],
+                                new_folder, folder_path, i, master_path)
+
+    def _plan_services(self, plan, services, folder, path, instance,
+                       master_path):
+        """
+        Plans the service instances in a folder.
+
+        :param plan: Plan to add operations to
+        :type plan: :class:`Plan`
+        :param dict services: The "services" dict in a folder
+        :param str folder: Key of the operation creating the folder
+        :param str path: Path of the folder
+        :param int instance: What instance of a base folder this is
+        :param str master_path: Path of the Master folder of the folder
+        """
+        for service_name, value in services.items():
+            if not self._is_vsphere(value["service"]):
+                self._log.debug("Skipping non-vsphere service '%s'",
+                                service_name)
+                continue
+            num_instances, prefix = self._instances_handler(value,
+                                                            service_name,
+                                                            "service")
+            mode = self.get_clone_mode(value["service"])
+
+            # Masters are converted to templates before they're cloned.
+            # Each folder has it's own Masters, at the same path as the
+            # Masters of the folder were created by plan_masters.
+            master_name = self.master_prefix + value["service"]
+            template = plan.add("template", master_path + "/" + master_name,
+                                cost=COSTS["template"], name=master_name,
+                                service=value["service"], mode=mode)
+
+            for i in range(num_instances):
+                instance_name = prefix + service_name + (" " + pad(i)
+                                                         if num_instances > 1
+                                                         else "")
+                # The clone is created with it's vNICs configured
+                plan.add("clone", path + "/" + instance_name,
+                         deps=[folder, template],
+                         cost=COSTS["clone"].get(mode, 0.0),
+                         name=instance_name, mode=mode,
+                         networks=value.get("networks", []),
+                         instance=instance)
+
+    def get_clone_mode(self, service_name):
+        """
+        Gets how instances of a service are cloned from it's Master.
+
+        :param str service_name: Name of the service
+        :return: The clone mode (full | linked | instant)
+        :rtype: str
+        """
+        return self.services[service_name].get("clone-mode", self.clone_mode)
+
+    def _is_vsphere(self, service_name):
+        """
+        Checks if a service instance is defined as a vSphere service.
+
+        :param str service_name: Name of the service to lookup in
+        list of defined services
+        :return: If a service is a vSphere-type service
+        :rtype: bool
+        """
+        if service_name not in self.services:
+            self._log.error("Could not find service %s in list of services",
+                            service_name)
+        elif "template" in self.services[service_name]:
+            return True
+        return False
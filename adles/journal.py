@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import sqlite3
+import threading
+from time import time
+
+
+class Journal:
+    """ On-disk record of the work completed during a phase.
+
+    Each entry is a key naming a completed operation, such as the spec path
+    of a folder or service instance, and a value such as the identifier
+    of the object that was created. Entries are written to a SQLite
+    database as soon as they are recorded, so if a phase is interrupted
+    it can be resumed and skip the work that was already done.
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, filename, phase, resume=False):
+        """
+        :param str filename: Name of the SQLite database file
+        :param str phase: Name of the phase being journaled
+        :param bool resume: Keep the existing entries for the phase
+        instead of starting over
+        """
+        self._log = logging.getLogger('Journal')
+        self.filename = filename
+        self.phase = str(phase)
+        self._lock = threading.Lock()  # Entries are recorded by workers
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS journal ("
+                         "phase TEXT NOT NULL, key TEXT NOT NULL, "
+                         "value TEXT, time REAL, PRIMARY KEY (phase, key))")
+        if resume:
+            rows = self._db.execute("SELECT key, value FROM journal "
+                                    "WHERE phase = ?", (self.phase,))
+            self._entries = dict(rows.fetchall())
+            self._log.info("Resuming phase '%s' with %d completed operations "
+                           "from journal '%s'",
+                           self.phase, len(self._entries), filename)
+        else:
+            self._db.execute("DELETE FROM journal WHERE phase = ?",
+                             (self.phase,))
+            self._entries = {}
+        self._db.commit()
+
+    def record(self, key, value=""):
+        """
+        Records that an operation completed.
+
+        :param str key: Key naming the operation
+        :param str value: Value to store for the operation
+        """
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO journal "
+                             "VALUES (?, ?, ?, ?)",
+                             (self.phase, str(key), str(value), time()))
+            self._db.commit()
+            self._entries[str(key)] = str(value)
+
+    def get(self, key, default=None):
+        """
+        Gets the value recorded for an operation.
+
+        :param str key: Key naming the operation
+        :param default: Value to return if the operation isn't recorded
+        :return: The value recorded
+        :rtype: str
+        """
+        return self._entries.get(str(key), default)
+
+    def close(self):
+        """ Closes the journal's database. """
+        with self._lock:
+            self._db.close()
+
+    def __contains__(self, key):
+        return str(key) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "Journal(%s, %s)" % (self.filename, self.phase)
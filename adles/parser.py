@@ -25,6 +25,12 @@ except ImportError:  # Fallback to using pure Python YAML parser
 
 import adles.utils as utils
 
+CLONE_MODES = ["full", "linked", "instant"]  # Ways to clone service instances
+# Ways to spread VMs across hosts and datastores
+PLACEMENT_STRATEGIES = ["round-robin", "least-loaded", "affinity"]
+# Resources that can be configured for a service
+RESOURCE_CONFIG = ["cpus", "cores", "memory", "max_consoles", "storage"]
+
 
 # PyYAML Reference: http://pyyaml.org/wiki/PyYAMLDocumentation
 def parse_yaml(filename):
@@ -197,6 +203,15 @@ def _verify_services_syntax(services):
         if "note" in value and not isinstance(value["note"], str):
             logging.error("Note must be a string for service %s", key)
             num_errors += 1
+        for resource in value.get("resource-config", {}):
+            if resource not in RESOURCE_CONFIG:
+                logging.error("Invalid resource-config '%s' for service %s",
+                              str(resource), key)
+                num_errors += 1
+        if "clone-mode" in value and value["clone-mode"] not in CLONE_MODES:
+            logging.error("Invalid clone-mode '%s' for service %s",
+                          str(value["clone-mode"]), key)
+            num_errors += 1
         if "template" in value:
             pass
         elif "image" in value or "dockerfile" in value:
@@ -422,6 +437,34 @@ def verify_infra_syntax(infra):
             if "thresholds" in config:
                 num_errors += _checker(["folder", "service"], "infrastructure",
                                        config["thresholds"], "errors")
+            for key in ["max-workers", "master-workers"]:
+                if key in config and \
+                        (not isinstance(config[key], int) or config[key] < 1):
+                    logging.error("vSphere %s must be a positive "
+                                  "Integer: %s", key, str(config[key]))
+                    num_errors += 1
+            for key in ["vlan-start", "vlan-end"]:
+                if key in config and \
+                        (not isinstance(config[key], int)
+                         or not 1 <= config[key] <= 4094):
+                    logging.error("vSphere %s must be an Integer between "
+                                  "1 and 4094: %s", key, str(config[key]))
+                    num_errors += 1
+            if "clone-mode" in config and \
+                    config["clone-mode"] not in CLONE_MODES:
+                logging.error("Invalid vSphere clone-mode: %s",
+                              str(config["clone-mode"]))
+                num_errors += 1
+            if "datastore-list" in config and \
+                    not isinstance(config["datastore-list"], list):
+                logging.error("Invalid type for vSphere datastore-list: %s",
+                              type(config["datastore-list"]))
+                num_errors += 1
+            if "placement" in config and \
+                    config["placement"] not in PLACEMENT_STRATEGIES:
+                logging.error("Invalid vSphere placement: %s",
+                              str(config["placement"]))
+                num_errors += 1
         elif platform == "docker":  # Docker configurations
             warnings = ["url"]
             errors = []
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Operation:
+    """ A single step of a plan, such as creating a folder or cloning a VM """
+
+    def __init__(self, kind, path, deps=None, cost=1.0, **params):
+        """
+        :param str kind: Type of operation (folder | clone | ...)
+        :param str path: Path of the object the operation is for
+        :param list deps: Keys of the operations this operation depends on
+        :param float cost: Estimated number of seconds the operation takes
+        :param params: Parameters used to execute the operation
+        """
+        self.kind = str(kind)
+        self.path = str(path)
+        self.key = "%s:%s" % (self.kind, self.path)
+        self.deps = [d for d in (deps if deps is not None else [])
+                     if d is not None]
+        self.cost = float(cost)
+        self.params = params
+
+    def __str__(self):
+        return "%-10s %s" % (self.kind, self.path)
+
+    def __repr__(self):
+        return "Operation(%s)" % self.key
+
+
+class Plan:
+    """ Directed acyclic graph of the operations needed to perform a phase """
+
+    def __init__(self, name):
+        """
+        :param str name: Name of the plan
+        """
+        self.name = str(name)
+        self.operations = {}  # Operation key -> Operation, in insertion order
+        self._order = []
+
+    def add(self, kind, path, deps=None, cost=1.0, **params):
+        """
+        Adds an operation to the plan.
+        Dependencies must already be in the plan, so the plan is always
+        in a valid order of execution.
+
+        :param str kind: Type of operation
+        :param str path: Path of the object the operation is for
+        :param list deps: Keys of the operations this operation depends on
+        :param float cost: Estimated number of seconds the operation takes
+        :param params: Parameters used to execute the operation
+        :return: Key of the operation
+        :rtype: str
+        :raises KeyError: if a dependency is not in the plan
+        :raises ValueError: if an operation with the same key
+        but different parameters or dependencies is already in the plan
+        """
+        op = Operation(kind, path, deps, cost, **params)
+        planned = self.operations.get(op.key)
+        if planned is not None:  # Already planned, e.g a shared network
+            if planned.params != op.params or planned.deps != op.deps:
+                raise ValueError("Operation %s is already in the plan with "
+                                 "different parameters or dependencies"
+                                 % op.key)
+            return op.key
+        for dep in op.deps:
+            if dep not in self.operations:
+                raise KeyError("Dependency %s of %s is not in the plan"
+                               % (dep, op.key))
+        self.operations[op.key] = op
+        self._order.append(op.key)
+        return op.key
+
+    def dependents(self):
+        """
+        Gets the operations that depend on each operation.
+
+        :return: Operation key -> keys of operations that depend on it
+        :rtype: dict(str, list(str))
+        """
+        dependents = dict((key, []) for key in self._order)
+        for key in self._order:
+            for dep in self.operations[key].deps:
+                dependents[dep].append(key)
+        return dependents
+
+    def estimate(self, workers=1):
+        """
+        Estimates how long the plan will take to execute.
+
+        :param int workers: Number of operations that can run at the same time
+        :return: Total seconds of work, seconds on the critical path
+        (the longest chain of dependent operations), and the estimated
+        number of seconds to execute the plan with the workers
+        :rtype: tuple(float, float, float)
+        """
+        workers = max(int(workers), 1)
+        total = 0.0
+        finish = {}  # Earliest finish time with unlimited workers
+        free = [0.0] * workers  # When each worker is next free
+        scheduled = {}  # Finish time when scheduled on the workers
+        for key in self._order:
+            op = self.operations[key]
+            total += op.cost
+            start = max([finish[d] for d in op.deps] + [0.0])
+            finish[key] = start + op.cost
+            # Greedily run the operation on the worker that is free first
+            ready = max([scheduled[d] for d in op.deps] + [0.0])
+            i = free.index(min(free))
+            scheduled[key] = max(ready, free[i]) + op.cost
+            free[i] = scheduled[key]
+        critical = max(finish.values()) if finish else 0.0
+        makespan = max(scheduled.values()) if scheduled else 0.0
+        return total, critical, makespan
+
+    def format(self, workers=1):
+        """
+        Formats the plan as a human-readable listing of its operations.
+
+        :param int workers: Number of workers to estimate the time taken with
+        :return: The formatted plan
+        :rtype: str
+        """
+        ids = dict((key, i) for i, key in enumerate(self._order, start=1))
+        lines = ["Plan for %s: %d operations" % (self.name, len(self))]
+        for key in self._order:
+            op = self.operations[key]
+            line = "%4d  %s" % (ids[key], str(op))
+            if op.deps:
+                line += "  (after %s)" % ", ".join(str(ids[d])
+                                                   for d in op.deps)
+            lines.append(line)
+        total, critical, makespan = self.estimate(workers)
+        lines.append("Estimated time: %s with %d workers "
+                     "(%s of work, critical path %s)"
+                     % (_fmt_time(makespan), max(int(workers), 1),
+                        _fmt_time(total), _fmt_time(critical)))
+        return "\n".join(lines)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __iter__(self):
+        return (self.operations[key] for key in self._order)
+
+    def __contains__(self, key):
+        return key in self.operations
+
+    def __str__(self):
+        return self.format()
+
+
+def run_plan(plan, execute, max_workers=1):
+    """
+    Executes the operations of a plan, running operations whose
+    dependencies have finished at the same time.
+    If an operation fails, the operations that depend on it are skipped.
+
+    :param plan: The plan to execute
+    :type plan: :class:`Plan`
+    :param execute: Function called with an operation and the dict of
+    results of finished operations, that performs the operation and returns
+    it's result. A result of None or False means the operation failed.
+    :param int max_workers: Maximum number of operations to run at once
+    :return: Results of the operations that succeeded by key,
+    and the keys of the operations that failed or were skipped
+    :rtype: tuple(dict, list(str))
+    """
+    log = logging.getLogger('Planner')
+    dependents = plan.dependents()
+    waiting = dict((op.key, len(op.deps)) for op in plan)
+    results = {}
+    failed = []
+
+    def skip(key):  # Skip everything depending on a failed operation
+        for dependent in dependents[key]:
+            if dependent not in failed:
+                log.warning("Skipping %s since %s failed", dependent, key)
+                failed.append(dependent)
+                skip(dependent)
+
+    with ThreadPoolExecutor(max_workers=max(int(max_workers), 1)) as executor:
+        running = {}
+        for op in plan:
+            if waiting[op.key] == 0:
+                running[executor.submit(execute, op, results)] = op
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                op = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    log.exception("Operation %s failed: %s", op.key, str(e))
+                    result = None
+                if result is None or result is False:
+                    log.error("Operation %s failed", op.key)
+                    failed.append(op.key)
+                    skip(op.key)
+                    continue
+                results[op.key] = result
+                for dependent in dependents[op.key]:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0 and dependent not in failed:
+                        running[executor.submit(
+                            execute, plan.operations[dependent],
+                            results)] = plan.operations[dependent]
+    return results, failed
+
+
+def _fmt_time(seconds):
+    """ Formats a number of seconds as hours, minutes and seconds. """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%d:%02d:%02d" % (hours, minutes, seconds)
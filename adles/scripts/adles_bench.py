@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the deploy, cleanup and lookup hot paths of ADLES using the vSphere simulator.
+
+Usage:
+    adles-bench [options] [SCENARIO ...]
+
+Scenarios:
+    parse      Parse and check the syntax of large generated specifications
+    lookup     Lookup VMs by path and name in inventories of increasing size
+    deploy     Create Masters and deploy an environment of folders x services
+    cleanup    Cleanup the deployed environment and it's Masters
+
+Options:
+    -h, --help                Prints this page
+    --version                 Prints current version
+    -v, --verbose             Emit debugging logs to terminal
+    -o, --output FILE         Save the results to a JSON file
+    -c, --compare FILE        Compare the results with those saved in FILE
+    -l, --latency SEC         Seconds each API call takes [default: 0.0]
+    -t, --task-duration SEC   Seconds each task takes [default: 0.0]
+    --sizes LIST              Inventory sizes for lookup [default: 100,1000,10000,50000]
+    --spec-sizes LIST         Folders in the specs for parse [default: 100,1000,5000]
+    --folders NUM             Folders to deploy [default: 10]
+    --services NUM            Services in each folder [default: 5]
+    --threshold PCT           Percent slower that is a regression [default: 10]
+
+Examples:
+    adles-bench -o results.json
+    adles-bench --sizes 100,1000 lookup
+    adles-bench -l 0.005 --folders 20 deploy cleanup
+    adles-bench -c results.json
+
+"""
+
+import logging
+import sys
+
+from docopt import docopt
+
+from adles.benchmark import Benchmark, SCENARIOS, compare_results, \
+    load_results
+
+__version__ = "0.1.0"
+
+
+def main():
+    args = docopt(__doc__, version=__version__, help=True)
+    # Only warnings are shown, and the measurements only show errors,
+    # so logging doesn't skew them
+    logging.basicConfig(level=(logging.DEBUG if args["--verbose"]
+                               else logging.WARNING),
+                        format="%(levelname)-8s %(name)-7s %(message)s")
+
+    scenarios = args["SCENARIO"] or SCENARIOS
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            logging.error("Unknown scenario '%s', the scenarios are: %s",
+                          scenario, ", ".join(SCENARIOS))
+            sys.exit(1)
+
+    baseline = None
+    if args["--compare"]:
+        baseline = load_results(args["--compare"])
+        if baseline is None:
+            sys.exit(1)
+
+    bench = Benchmark(latency=float(args["--latency"]),
+                      task_duration=float(args["--task-duration"]),
+                      quiet=not args["--verbose"])
+    services = int(args["--services"])
+    if "parse" in scenarios:
+        print("Running parse benchmarks...")
+        bench.run_parse([int(s) for s in args["--spec-sizes"].split(",")],
+                        services)
+    if "lookup" in scenarios:
+        print("Running lookup benchmarks...")
+        bench.run_lookup([int(s) for s in args["--sizes"].split(",")])
+    if "deploy" in scenarios or "cleanup" in scenarios:
+        print("Running deploy and cleanup benchmarks...")
+        bench.run_phases(int(args["--folders"]), services, scenarios)
+    print(bench.format())
+
+    if args["--output"]:
+        bench.save(args["--output"])
+        print("Saved results to %s" % args["--output"])
+
+    if baseline is not None:
+        lines, regressions = compare_results(
+            baseline, {"results": bench.results},
+            threshold=float(args["--threshold"]))
+        print("\n".join(lines))
+        if regressions:
+            print("%d benchmarks regressed" % regressions)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,7 +21,7 @@ Uses formal YAML specifications to create virtual environments for educational p
 Usage:
     adles [options] [-]
     adles [options] [-t TYPE] -c SPEC [-]
-    adles [options] (-m | -d) [-p] -s SPEC [-]
+    adles [options] (-m | -d) [-p] [--resume | --plan] -s SPEC [-]
     adles [options] (--cleanup-masters | --cleanup-enviro) [--nets] -s SPEC [-]
 
 Options:
@@ -34,9 +34,13 @@ Options:
     -p, --package           Build environment from package specification
     -m, --masters           Master creation phase of specification
     -d, --deploy            Environment deployment phase of specification
+    --resume                Resume an interrupted phase using it's journal
+    --journal FILE          Journal file to use, instead of the one next to SPEC
+    --plan                  Print the operations of a phase without running it
     --cleanup-masters       Cleanup masters created by a specification
     --cleanup-enviro        Cleanup environment created by a specification
     --nets                  Cleanup networks created during either phase
+    --profile FILE          Save the timing of every vCenter call to a CSV file
     --print-spec NAME       Prints the named specification: exercise, package, infrastructure
     --list-examples         Prints the list of examples available
     --print-example NAME    Prints the named example
@@ -48,6 +52,9 @@ Examples:
     adles -c examples/tutorial.yaml
     adles --verbose --masters --spec examples/experiment.yaml
     adles -vds examples/competition.yaml
+    adles -vd --resume -s examples/competition.yaml
+    adles -m --profile masters.csv -s examples/competition.yaml
+    adles --deploy --plan -s examples/competition.yaml
     adles --cleanup-masters --nets -s examples/competition.yaml
     adles --print-example competition | adles -v -c -
 
@@ -58,7 +65,7 @@ Project:    https://github.com/GhostofGoes/ADLES
 """
 
 import logging
-from os.path import basename, exists, splitext, join
+from os.path import basename, dirname, exists, splitext, join
 
 from docopt import docopt
 from pyVmomi import vim
@@ -66,6 +73,7 @@ from pyVmomi import vim
 from adles.interfaces import PlatformInterface
 from adles.parser import check_syntax, parse_yaml
 from adles.utils import setup_logging
+from adles.vsphere.profiler import Profiler
 from adles import __version__
 
 
@@ -115,17 +123,38 @@ def main():
             logging.info("Overriding infrastructure config file with '%s'",
                          override)
             spec["metadata"]["infra-file"] = override
+            # The override wasn't checked along with the exercise
+            infra = check_syntax(override, spec_type="infra")
+        else:
+            infra = parse_yaml(spec["metadata"]["infra-file"])
+        if infra is None:  # Ensure it was loaded and passed the check
+            logging.error("Could not load infrastructure file '%s'",
+                          spec["metadata"]["infra-file"])
+            exit(1)
+        if args["--plan"]:  # Print the plan without connecting to anything
+            print_plan(spec, infra, masters=args["--masters"])
+            return
+
+        # Keep the journal next to the specification, unless the
+        # infrastructure or the command line says where it goes
+        if args["--journal"]:
+            spec["metadata"]["journal-file"] = args["--journal"]
+        elif not any("journal-file" in config for config in infra.values()):
+            spec["metadata"]["journal-file"] = join(
+                dirname(spec_filename),
+                spec["metadata"]["name"] + "-journal.db")
 
         # Instantiate the Interface and call functions for the specified phase
+        profiler = Profiler(keep_calls=bool(args["--profile"]))
         try:
-            interface = PlatformInterface(infra=parse_yaml(
-                spec["metadata"]["infra-file"]), spec=spec)
+            interface = PlatformInterface(infra=infra, spec=spec,
+                                          profiler=profiler)
             if args["--masters"]:
-                interface.create_masters()
+                interface.create_masters(resume=args["--resume"])
                 logging.info("Finished Master creation for %s",
                              spec["metadata"]["name"])
             elif args["--deploy"]:
-                interface.deploy_environment()
+                interface.deploy_environment(resume=args["--resume"])
                 logging.info("Finished deployment of %s",
                              spec["metadata"]["name"])
             elif args["--cleanup-masters"]:
@@ -146,6 +175,11 @@ def main():
             print()
             logging.warning("User terminated session prematurely")
             exit(1)
+        finally:  # Summarize the calls made, even if the phase failed
+            if len(profiler) > 0:
+                logging.info("API calls made:\n%s", profiler.format())
+            if args["--profile"]:
+                profiler.save(args["--profile"])
 
     elif args["--validate"]:  # Just validate syntax, no building of environment
         if args["--type"]:
@@ -203,5 +237,23 @@ def main():
         logging.error("Invalid arguments. Argument dump:\n%s", str(args))
 
 
+def print_plan(spec, infra, masters=False):
+    """
+    Prints the plan of operations for a phase and it's estimated cost.
+
+    :param dict spec: The exercise specification
+    :param dict infra: The infrastructure specification
+    :param bool masters: Plan the Master creation phase instead of Deployment
+    """
+    if "vmware-vsphere" not in infra:
+        logging.error("Plans can only be made for the vmware-vsphere platform")
+        return
+    from adles.interfaces.vsphere_planner import VspherePlanner
+    config = infra["vmware-vsphere"]
+    planner = VspherePlanner(config, spec)
+    plan = planner.plan_masters() if masters else planner.plan_deployment()
+    print(plan.format(workers=int(config.get("max-workers", 8))))
+
+
 if __name__ == '__main__':
     main()
@@ -19,11 +19,12 @@ Usage:
     cleanup-vms [options]
 
 Options:
-    -h, --help          Prints this page
-    --version           Prints current version
-    -n, --no-color      Do not color terminal output
-    -v, --verbose       Emit debugging logs to terminal
-    -f, --file FILE     Name of JSON file with server connection information
+    -h, --help             Prints this page
+    --version              Prints current version
+    -n, --no-color         Do not color terminal output
+    -v, --verbose          Emit debugging logs to terminal
+    -f, --file FILE        Name of JSON file with server connection information
+    -c, --concurrency NUM  Number of VMs to destroy at once [default: 10]
 
 Examples:
     cleanup-vms -vf logins.json
@@ -37,7 +38,7 @@ from docopt import docopt
 from adles.utils import ask_question, default_prompt, script_setup, resolve_path
 from adles.vsphere.folder_utils import format_structure
 
-__version__ = "0.5.11"
+__version__ = "0.7.0"
 
 
 def main():
@@ -85,25 +86,16 @@ def main():
                      destroy_folders, destroy_self)
 
         # Show how many items matched the options
-        v, f = folder.retrieve_items(vm_prefix, folder_prefix, recursive=True)
-        num_vms = len(v)
-        if destroy_folders:
-            num_folders = len(f)
-            if destroy_self:
-                num_folders += 1
-        else:
-            num_folders = 0
+        items = folder.select_cleanup(vm_prefix, folder_prefix, recursive,
+                                      destroy_folders, destroy_self)
         logging.info("%d VMs and %d folders match the options",
-                     num_vms, num_folders)
+                     len(items.vms), len(items.folders))
 
-        # Confirm and destroy
+        # Confirm and destroy what was counted
         if ask_question("Continue with destruction? "):
             logging.info("Destroying folder '%s'...", folder_name)
-            folder.cleanup(vm_prefix=vm_prefix,
-                           folder_prefix=folder_prefix,
-                           recursive=recursive,
-                           destroy_folders=destroy_folders,
-                           destroy_self=destroy_self)
+            folder.cleanup(concurrency=int(args["--concurrency"]),
+                           items=items)
         else:
             logging.info("Destruction cancelled")
     else:
@@ -35,10 +35,10 @@ import logging
 from docopt import docopt
 
 from adles.utils import ask_question, pad, default_prompt, \
-    script_setup, resolve_path, is_vm
+    script_setup, resolve_path
 from adles.vsphere.vm import VM
 
-__version__ = "0.6.1"
+__version__ = "0.7.1"
 
 
 def main():
@@ -58,7 +58,8 @@ def main():
         folder_from, from_name = resolve_path(server, "folder",
                                               "you want to clone all VMs in")
         # Get VMs in the folder
-        v = [VM(vm=x) for x in folder_from.childEntity if is_vm(x)]
+        catalogue = server.get_template_catalogue(folder_from)
+        v = VM.from_many(x for _, x in catalogue.templates())
         vms.extend(v)
         logging.info("%d VMs found in source folder %s", len(v), from_name)
         if not ask_question("Keep the same names? "):
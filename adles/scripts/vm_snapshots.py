@@ -38,7 +38,7 @@ from adles.utils import script_setup, ask_question, resolve_path, is_vm
 from adles.vsphere.folder_utils import format_structure
 from adles.vsphere.vm import VM
 
-__version__ = "0.2.0"
+__version__ = "0.2.1"
 
 
 # noinspection PyUnboundLocalVariable
@@ -62,7 +62,7 @@ def main():
 
     if ask_question("Multiple VMs? ", default="yes"):
         f, f_name = resolve_path(server, "folder", "with VMs")
-        vms = [VM(vm=x) for x in f.childEntity if is_vm(x)]
+        vms = VM.from_many(x for x in f.childEntity if is_vm(x))
         logging.info("Found %d VMs in folder '%s'", len(vms), f_name)
         if ask_question("Show the status of the VMs in the folder? "):
             logging.info("Folder structure: \n%s", format_structure(
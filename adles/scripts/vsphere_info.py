@@ -19,25 +19,35 @@ Usage:
     vsphere-info [options]
 
 Options:
-    -h, --help          Prints this page
-    --version           Prints current version
-    -n, --no-color       Do not color terminal output
-    -v, --verbose       Emit debugging logs to terminal
-    -f, --file FILE     Name of JSON file with server connection information
+    -h, --help            Prints this page
+    --version             Prints current version
+    -n, --no-color        Do not color terminal output
+    -v, --verbose         Emit debugging logs to terminal
+    -f, --file FILE       Name of JSON file with server connection information
+    -d, --depth DEPTH     Only list folders down to this depth
+    -p, --prefix PREFIX   Only list VMs with names starting with the prefix
+    -s, --state STATE     Only list VMs in a power state (on | off | suspended)
+    -j, --json            List folders as JSON Lines
+    -o, --output FILE     File to list folders to, instead of the terminal
 
 Examples:
     vsphere-info -vf logins.json
+    vsphere-info -f logins.json --json --depth 2 -o folders.jsonl
 
 """
 
 import logging
+import sys
 
 from docopt import docopt
 
 from adles.utils import script_setup, resolve_path, ask_question
-from adles.vsphere.folder_utils import format_structure
+from adles.vsphere.folder_utils import render_tree
 
-__version__ = "0.6.4"
+__version__ = "0.7.0"
+
+# Power states that can be given with --state
+STATES = {"on": "poweredOn", "off": "poweredOff", "suspended": "suspended"}
 
 
 def main():
@@ -68,16 +78,31 @@ def main():
     # Folder
     elif thing_type == "folder":
         folder, folder_name = resolve_path(server, "folder")
-        if "VirtualMachine" in folder.childType \
-                and ask_question("Want to see power state "
-                                 "of VMs in the folder?"):
-            contents = folder.enumerate(recursive=True, power_status=True)
-        else:
-            contents = folder.enumerate(recursive=True, power_status=False)
+        states = None
+        if args["--state"]:
+            if args["--state"].lower() not in STATES:
+                logging.error("Invalid power state: %s", args["--state"])
+                return
+            states = [STATES[args["--state"].lower()]]
+        power_status = bool(states) or (
+            "VirtualMachine" in folder.childType
+            and ask_question("Want to see power state "
+                             "of VMs in the folder?"))
         logging.info("Information for Folder %s\n"
-                     "Types of items folder can contain: %s\n%s",
-                     folder_name, str(folder.childType),
-                     format_structure(contents))
+                     "Types of items folder can contain: %s",
+                     folder_name, str(folder.childType))
+        items = folder.walk(
+            max_depth=int(args["--depth"]) if args["--depth"] else None,
+            power_status=power_status, vm_prefix=args["--prefix"] or '',
+            power_states=states)
+        output = args["--output"]
+        stream = open(output, "w") if output else sys.stdout
+        try:
+            count = render_tree(items, stream, json_lines=args["--json"])
+        finally:
+            if output:
+                stream.close()
+        logging.info("Listed %d items in folder %s", count, folder_name)
 
     # That's not a thing!
     else:
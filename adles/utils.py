@@ -16,6 +16,11 @@ import logging
 import logging.handlers
 import sys
 import os
+import threading
+
+from pyVmomi import vim
+
+from adles.vlan import VlanAllocator
 
 
 # Credit to: http://stackoverflow.com/a/15707426/2214380
@@ -387,15 +392,30 @@ def setup_logging(filename, colors=True, console_verbose=False,
     logger.addHandler(console)
 
 
+_vlans = None  # Allocator for get_vlan, created when it's first used
+_vlans_lock = threading.Lock()
+
+
 def get_vlan():
     """
     Generates globally unique VLAN tags.
+    The tags are shared by every generator in the process, and come from a
+    :class:`VlanAllocator` that's created the first time a tag is generated.
+    VLANs for the networks of an exercise are allocated by the exercise's
+    own allocator, which also avoids the VLANs in use on the hosts.
 
     :return: VLAN tag
     :rtype: int
     """
-    for i in range(2000, 4096):
-        yield i
+    global _vlans
+    with _vlans_lock:
+        if _vlans is None:
+            _vlans = VlanAllocator()
+    while True:
+        vlan = _vlans.allocate()
+        if vlan is None:  # All of the VLANs have been used
+            return
+        yield vlan
 
 
 def is_folder(obj):
@@ -406,6 +426,10 @@ def is_folder(obj):
     :return: If the object is a folder
     :rtype: bool
     """
+    # Check the type of vSphere objects instead of using hasattr,
+    # which would retrieve the property from the server
+    if hasattr(type(obj), "_wsdlName"):
+        return isinstance(obj, vim.Folder)
     return hasattr(obj, "childEntity")
 
 
@@ -417,4 +441,6 @@ def is_vm(obj):
     :return: If the object is a VM
     :rtype: bool
     """
+    if hasattr(type(obj), "_wsdlName"):  # Same as in is_folder
+        return isinstance(obj, vim.VirtualMachine)
     return hasattr(obj, "summary")
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import sqlite3
+import threading
+from bisect import bisect_right, insort
+
+
+class VlanAllocator:
+    """ Allocates VLAN tags to the networks of an exercise.
+
+    The free VLANs are kept as a sorted list of [start, end] ranges, and
+    VLANs are allocated from the start of the lowest range, so allocation
+    is constant time and the same networks get the same VLANs on every run.
+    VLANs that are in use outside of the exercise, such as by existing
+    portgroups on the hosts, are reserved so they're never allocated.
+
+    Allocations are kept in a SQLite database by the name of the network
+    they're for, so networks keep their VLAN if an exercise is deployed
+    again, and the VLAN is reused once it's released during cleanup.
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, filename=None, exercise="", start=2000, end=4094):
+        """
+        :param str filename: Name of the SQLite database file to persist
+        the allocations to, or None to keep them in memory
+        :param str exercise: Name of the exercise the allocations are for
+        :param int start: Lowest VLAN tag to allocate
+        :param int end: Highest VLAN tag to allocate
+        """
+        self._log = logging.getLogger('VlanAllocator')
+        self.filename = filename
+        self.exercise = str(exercise)
+        self.start = int(start)
+        self.end = int(end)
+        self._lock = threading.Lock()  # Networks are created by workers
+        self._free = [[self.start, self.end]]  # Sorted free ranges
+        self._allocated = {}  # Network name -> VLAN tag
+        self._db = sqlite3.connect(filename if filename else ":memory:",
+                                   check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS vlans ("
+                         "exercise TEXT NOT NULL, name TEXT NOT NULL, "
+                         "vlan INTEGER NOT NULL, PRIMARY KEY (exercise, name))")
+        self._db.commit()
+        rows = self._db.execute("SELECT name, vlan FROM vlans "
+                                "WHERE exercise = ?", (self.exercise,))
+        for name, vlan in rows.fetchall():
+            self._allocated[name] = vlan
+            self._take(vlan)
+        if self._allocated:
+            self._log.debug("Loaded %d VLAN allocations for exercise '%s'",
+                            len(self._allocated), self.exercise)
+
+    def reserve(self, vlans):
+        """
+        Reserves VLANs that are in use, so they aren't allocated.
+
+        :param vlans: VLAN tags to reserve
+        :type vlans: iterable(int)
+        :return: Number of VLANs that were reserved
+        :rtype: int
+        """
+        with self._lock:
+            return sum(1 for vlan in set(vlans) if self._take(int(vlan)))
+
+    def allocate(self, name=None):
+        """
+        Allocates a VLAN for a network.
+        If the network already has a VLAN, the same VLAN is returned.
+
+        :param str name: Name of the network, or None for a VLAN
+        that isn't persisted and can't be released
+        :return: The VLAN tag, or None if there are no free VLANs
+        :rtype: int or None
+        """
+        with self._lock:
+            if name is not None and str(name) in self._allocated:
+                return self._allocated[str(name)]
+            if not self._free:
+                self._log.error("No free VLANs between %d and %d to "
+                                "allocate for network '%s'",
+                                self.start, self.end, str(name))
+                return None
+            first = self._free[0]
+            vlan = first[0]
+            if first[0] == first[1]:
+                self._free.pop(0)
+            else:
+                first[0] += 1
+            if name is not None:
+                self._allocated[str(name)] = vlan
+                self._db.execute("INSERT OR REPLACE INTO vlans "
+                                 "VALUES (?, ?, ?)",
+                                 (self.exercise, str(name), vlan))
+                self._db.commit()
+        self._log.debug("Allocated VLAN %d for network '%s'", vlan, str(name))
+        return vlan
+
+    def release(self, name):
+        """
+        Releases the VLAN allocated to a network, so it can be reused.
+
+        :param str name: Name of the network
+        :return: If the network had a VLAN that was released
+        :rtype: bool
+        """
+        with self._lock:
+            vlan = self._allocated.pop(str(name), None)
+            if vlan is None:
+                return False
+            self._db.execute("DELETE FROM vlans WHERE exercise = ? "
+                             "AND name = ?", (self.exercise, str(name)))
+            self._db.commit()
+            self._give(vlan)
+        self._log.debug("Released VLAN %d of network '%s'", vlan, str(name))
+        return True
+
+    def get(self, name):
+        """
+        Gets the VLAN allocated to a network.
+
+        :param str name: Name of the network
+        :return: The VLAN tag, or None if the network doesn't have one
+        :rtype: int or None
+        """
+        return self._allocated.get(str(name))
+
+    def names(self):
+        """
+        Gets the networks that have VLANs allocated.
+
+        :return: Names of the networks
+        :rtype: list(str)
+        """
+        with self._lock:
+            return list(self._allocated)
+
+    def available(self):
+        """
+        Gets the number of VLANs that are free to allocate.
+
+        :return: Number of free VLANs
+        :rtype: int
+        """
+        with self._lock:
+            return sum(end - start + 1 for start, end in self._free)
+
+    def close(self):
+        """ Closes the allocator's database. """
+        with self._lock:
+            self._db.close()
+
+    def _take(self, vlan):
+        """ Removes a VLAN from the free ranges, if it's free. """
+        i = bisect_right(self._free, [vlan, self.end + 1]) - 1
+        if i < 0 or not self._free[i][0] <= vlan <= self._free[i][1]:
+            return False
+        start, end = self._free[i]
+        if start == end:
+            self._free.pop(i)
+        elif vlan == start:
+            self._free[i][0] += 1
+        elif vlan == end:
+            self._free[i][1] -= 1
+        else:  # Split the range around the VLAN
+            self._free[i][1] = vlan - 1
+            self._free.insert(i + 1, [vlan + 1, end])
+        return True
+
+    def _give(self, vlan):
+        """ Returns a VLAN to the free ranges, merging adjacent ranges. """
+        if not self.start <= vlan <= self.end:
+            return
+        i = bisect_right(self._free, [vlan, self.end + 1])
+        if i > 0 and self._free[i - 1][1] >= vlan:
+            return  # Already free
+        joins_prev = i > 0 and self._free[i - 1][1] == vlan - 1
+        joins_next = i < len(self._free) and self._free[i][0] == vlan + 1
+        if joins_prev and joins_next:
+            self._free[i - 1][1] = self._free.pop(i)[1]
+        elif joins_prev:
+            self._free[i - 1][1] = vlan
+        elif joins_next:
+            self._free[i][0] = vlan
+        else:
+            insort(self._free, [vlan, vlan])
+
+    def __contains__(self, name):
+        return str(name) in self._allocated
+
+    def __len__(self):
+        return len(self._allocated)
+
+    def __str__(self):
+        return "VlanAllocator(%s, %d allocated, %d free)" % \
+               (self.exercise, len(self), self.available())
@@ -7,6 +7,16 @@ from adles.vsphere import network_utils
 from .vsphere_class import Vsphere
 from .vm import VM
 from .host import Host
+from .inventory import Inventory
+from .catalogue import TemplateCatalogue
+from .name_index import NameIndex
+from .placement import Placement
+from .simulator import Simulator
+from .profiler import Profiler
 
 __all__ = ['network_utils', 'vsphere_utils', 'folder_utils',
-           'vsphere_class', 'vm', 'host']
+           'vsphere_class', 'vm', 'host', 'inventory', 'catalogue',
+           'name_index', 'placement', 'simulator', 'profiler']
+
+# NOTE: adles.vsphere.aio uses async/await syntax (Python 3.5+),
+# so it isn't imported here and has to be imported explicitly
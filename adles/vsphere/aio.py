@@ -0,0 +1,574 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pyVmomi import vim, vmodl
+
+from adles.vsphere.inventory import Inventory, get_inventory
+from adles.vsphere.vm import VM, _POWER_STATES
+from adles.vsphere.vsphere_utils import LONG_SLEEP, log_task_fault
+
+
+class TaskMonitor:
+    """ Waits for any number of vim.Tasks using a single thread.
+
+    Each task being waited for has a filter on one PropertyCollector,
+    and one thread blocks in WaitForUpdatesEx until any of them finish.
+    The future of a finished task is then resolved on the event loop
+    waiting for it. The thread only runs while there are tasks to wait for.
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, content):
+        """
+        :param content: Content of the vCenter server the tasks are on
+        :type content: vim.ServiceInstanceContent
+        """
+        self._log = logging.getLogger('TaskMonitor')
+        self.content = content
+        self._collector = None
+        self._lock = threading.Lock()
+        self._waiting = {}  # Task moId -> [future, loop, filter]
+        self._thread = None
+
+    def watch(self, task, future, loop):
+        """
+        Starts waiting for a task. This makes calls to the server,
+        so it's run by an executor rather than on the event loop.
+
+        :param task: The task to wait for
+        :type task: vim.Task
+        :param future: Future to resolve with the info of the task
+        once it finishes
+        :type future: asyncio.Future
+        :param loop: Event loop the future belongs to
+        :type loop: asyncio.AbstractEventLoop
+        """
+        pc = vmodl.query.PropertyCollector
+        with self._lock:
+            if self._collector is None:
+                self._collector = self.content.propertyCollector\
+                    .CreatePropertyCollector()
+            collector = self._collector
+            # Registered before the filter exists, so the thread can't
+            # see the task finish before it knows what future to resolve
+            entry = [future, loop, None]
+            self._waiting[task._moId] = entry
+        filter_mo = collector.CreateFilter(pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=task)],
+            propSet=[pc.PropertySpec(type=vim.Task, pathSet=["info"])]),
+            partialUpdates=False)
+        with self._lock:
+            entry[2] = filter_mo
+            finished = self._waiting.get(task._moId) is not entry
+            if not finished and self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="TaskMonitor")
+                self._thread.daemon = True
+                self._thread.start()
+        if finished:  # The task finished while the filter was being created
+            _destroy_filter(filter_mo)
+
+    def close(self):
+        """ Stops waiting for tasks and destroys the PropertyCollector. """
+        with self._lock:
+            waiting, self._waiting = self._waiting, {}
+            collector, self._collector = self._collector, None
+        for future, loop, _ in waiting.values():
+            _call_soon(loop, future.cancel)
+        if collector is not None:
+            try:
+                collector.DestroyPropertyCollector()
+            except vmodl.MethodFault as e:
+                self._log.debug("Could not destroy collector: %s", str(e))
+
+    def _run(self):
+        """ Reports the tasks that finish until there aren't any left. """
+        options = vmodl.query.PropertyCollector.WaitOptions(
+            maxWaitSeconds=int(LONG_SLEEP))
+        version = ""
+        while True:
+            with self._lock:
+                if not self._waiting or self._collector is None:
+                    self._thread = None
+                    return
+                collector = self._collector
+            try:
+                update = collector.WaitForUpdatesEx(version, options)
+            except vmodl.MethodFault as e:
+                self._log.error("Stopped waiting for tasks: %s", str(e))
+                with self._lock:
+                    waiting, self._waiting = self._waiting, {}
+                    self._thread = None
+                for future, loop, _ in waiting.values():
+                    _call_soon(loop, _set_exception, future, e)
+                return
+            if update is None:  # Nothing finished before the wait expired
+                continue
+            version = update.version
+            for filter_update in update.filterSet:
+                for obj_update in filter_update.objectSet:
+                    for change in obj_update.changeSet:
+                        if change.name == "info" and change.val is not None \
+                                and change.val.state in ("success", "error"):
+                            self._finish(obj_update.obj._moId, change.val)
+
+    def _finish(self, mo_id, info):
+        """ Resolves the future of a task that finished. """
+        with self._lock:
+            entry = self._waiting.pop(mo_id, None)
+        if entry is None:
+            return
+        future, loop, filter_mo = entry
+        if filter_mo is not None:
+            _destroy_filter(filter_mo)
+        _call_soon(loop, _set_result, future, info)
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def __str__(self):
+        return "TaskMonitor(%d tasks)" % len(self)
+
+
+class AsyncVsphere:
+    """ asyncio facade over a :class:`Vsphere` server.
+
+    Calls to the server are made by a bounded pool of threads, and tasks
+    are waited for by a :class:`TaskMonitor`, so no thread is held while
+    a task runs. This lets one event loop drive hundreds of operations,
+    such as clones, at the same time.
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, server, max_workers=32):
+        """
+        :param server: The server to use
+        :type server: :class:`Vsphere`
+        :param int max_workers: Maximum number of calls to the server
+        to make at the same time
+        """
+        self._log = logging.getLogger('AsyncVsphere')
+        self.server = server
+        self.max_workers = int(max_workers)
+        self.monitor = TaskMonitor(server.content)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Calls a blocking function using the executor.
+
+        :param func: The function to call
+        :return: What the function returned
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    async def wait_for_task(self, task, timeout=60.0):
+        """
+        Waits for a vim.Task to finish.
+
+        :param task: The task to wait for
+        :type task: vim.Task
+        :param float timeout: Seconds to wait before cancelling the task
+        :return: Result of the task (task.info.result),
+        or None if it failed or timed out
+        """
+        return (await self.wait_for_tasks([task], timeout))[0][0]
+
+    async def wait_for_tasks(self, tasks, timeout=60.0):
+        """
+        Waits for multiple vim.Tasks to finish.
+
+        :param tasks: The tasks to wait for
+        :type tasks: list(vim.Task)
+        :param float timeout: Seconds to wait before cancelling a task
+        :return: Result of each task (task.info.result), and the outcome of
+        each task: 'success', 'timeout', 'invalid' if there was no task,
+        or the name of the fault that caused it to fail
+        :rtype: tuple(list, list(str))
+        """
+        outcomes = await asyncio.gather(*[self._outcome(t, timeout)
+                                          for t in tasks])
+        return [r for r, _ in outcomes], [o for _, o in outcomes]
+
+    async def start_task(self, func, *args, **kwargs):
+        """
+        Starts a task using the executor and waits for it to finish.
+
+        :param func: Method that starts the task, e.g vm.PowerOnVM_Task
+        :return: The result and outcome of the task,
+        as returned by :meth:`wait_for_tasks`
+        :rtype: tuple(object, str)
+        """
+        timeout = kwargs.pop("timeout", 60.0)
+        try:
+            task = await self.run(func, *args, **kwargs)
+        except vmodl.MethodFault as e:
+            log_task_fault(e, str(func), str(func))
+            return None, type(e).__name__.split('.')[-1]
+        return await self._outcome(task, timeout)
+
+    async def _outcome(self, task, timeout):
+        """ Waits for a task and gets it's result and outcome. """
+        if not isinstance(task, vim.Task):
+            self._log.error("No task was specified to wait for")
+            return None, "invalid"
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        await self.run(self.monitor.watch, task, future, loop)
+        try:
+            info = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._log.error("Task %s timed out after %s seconds",
+                            task._moId, str(timeout))
+            try:
+                await self.run(task.CancelTask)
+            except vmodl.MethodFault as e:
+                self._log.debug("Could not cancel task %s: %s",
+                                task._moId, str(e))
+            return None, "timeout"
+        except vmodl.MethodFault as e:
+            log_task_fault(e, str(task), str(task))
+            return None, type(e).__name__.split('.')[-1]
+        if info.state == "success":
+            return info.result, "success"
+        log_task_fault(info.error, str(info.descriptionId),
+                       str(info.entityName))
+        return None, type(info.error).__name__.split('.')[-1]
+
+    async def gather(self, coroutines, limit=None):
+        """
+        Runs coroutines at the same time, with at most limit running at once.
+
+        :param coroutines: The coroutines to run
+        :param int limit: Maximum number to run at once [default: all]
+        :return: What each coroutine returned, in the same order
+        :rtype: list
+        """
+        if not limit:
+            return await asyncio.gather(*coroutines)
+        semaphore = asyncio.Semaphore(int(limit))
+
+        async def bounded(coroutine):
+            async with semaphore:
+                return await coroutine
+        return await asyncio.gather(*[bounded(c) for c in coroutines])
+
+    async def get_vm(self, vm_name):
+        """
+        Finds a VM by name.
+
+        :param str vm_name: Name of the VM
+        :return: The VM found
+        :rtype: vim.VirtualMachine or None
+        """
+        return await self.run(self.server.get_vm, vm_name)
+
+    async def get_folder(self, folder_name=None):
+        """
+        Finds a folder by name.
+
+        :param str folder_name: Name of the folder [default: Datacenter vmFolder]
+        :return: The folder found
+        :rtype: vim.Folder
+        """
+        return await self.run(self.server.get_folder, folder_name)
+
+    async def get_item(self, vimtype, name=None, container=None,
+                       recursive=True):
+        """
+        Finds an item of a type, see :meth:`Vsphere.get_item`.
+
+        :param vimtype: Type of item to find
+        :param str name: Name of the item [default: first item found]
+        :param container: Container to search in
+        :param bool recursive: Recursively search the container
+        :return: The item found
+        :rtype: vimtype or None
+        """
+        return await self.run(self.server.get_item, vimtype, name,
+                              container, recursive)
+
+    async def get_objs(self, container, vimtypes, recursive=True):
+        """
+        Gets all the objects of the given types in a container.
+
+        :param container: Container to search in
+        :param list vimtypes: Types of objects to get
+        :param bool recursive: Recursively search the container
+        :return: The objects found
+        :rtype: list(vimtype)
+        """
+        return await self.run(self.server.get_objs, container, vimtypes,
+                              recursive)
+
+    async def retrieve(self, vimtypes=None, properties=None, container=None):
+        """
+        Takes a snapshot of the inventory, see :meth:`Inventory.retrieve`.
+
+        :param list vimtypes: Types of objects to include in the snapshot
+        :param dict properties: Additional properties to retrieve by type
+        :param container: Container to snapshot [default: content.rootFolder]
+        :return: The inventory snapshot
+        :rtype: :class:`Inventory`
+        """
+        return await self.run(Inventory.retrieve, self.server.content,
+                              vimtypes, properties, container)
+
+    def new_vm(self, **kwargs):
+        """
+        Gets the asyncio version of a VM that will be created
+        with :meth:`AsyncVM.create`.
+
+        :param kwargs: Name, folder, resource_pool, datastore and host
+        of the VM, as for :class:`VM`
+        :return: The VM
+        :rtype: :class:`AsyncVM`
+        """
+        return AsyncVM(self, VM(**kwargs))
+
+    async def wrap_vm(self, vm):
+        """
+        Gets the asyncio version of an existing VM.
+
+        :param vm: The VM
+        :type vm: :class:`VM` or vim.VirtualMachine
+        :return: The VM
+        :rtype: :class:`AsyncVM`
+        """
+        if not isinstance(vm, VM):  # Getting the VM's properties blocks
+            vm = await self.run(VM, vm=vm)
+        return AsyncVM(self, vm)
+
+    def close(self):
+        """ Stops waiting for tasks and shuts down the executor. """
+        self.monitor.close()
+        self._executor.shutdown(wait=False)
+
+    def __str__(self):
+        return "AsyncVsphere(%s, %d workers)" % (str(self.server),
+                                                 self.max_workers)
+
+
+class AsyncVM:
+    """ asyncio version of the operations of a :class:`VM`
+    that run as tasks. """
+    __version__ = "0.1.0"
+
+    def __init__(self, aio, vm):
+        """
+        :param aio: The server the VM is on
+        :type aio: :class:`AsyncVsphere`
+        :param vm: The VM
+        :type vm: :class:`VM`
+        """
+        self.aio = aio
+        self.vm = vm
+        self.name = vm.name
+
+    async def create(self, template=None, timeout=120.0, **kwargs):
+        """
+        Creates the VM, see :meth:`VM.create`.
+
+        :param template: Template VM to clone
+        :type template: vim.VirtualMachine
+        :param float timeout: Seconds to wait for the VM to be created
+        :param kwargs: Other parameters of :meth:`VM.create`
+        :return: If the creation was successful
+        :rtype: bool
+        """
+        started = await self.aio.run(self.vm._start_create,
+                                     template=template, **kwargs)
+        if started is None:
+            return False
+        task, config = started
+        created = await self.aio.wait_for_task(task, timeout)
+        return await self.aio.run(self.vm._finish_create, created,
+                                  template, config)
+
+    async def change_state(self, state, attempt_guest=False):
+        """
+        Changes the power state of the VM, see :meth:`VM.change_state`.
+
+        Guest operations aren't tasks, so they hold a thread of the executor
+        until they're done, and unlike :meth:`VM.change_state` they're only
+        used if asked for.
+
+        :param str state: State to change to (on | off | reset | suspend)
+        :param bool attempt_guest: Attempt to use guest operations
+        :return: If state change succeeded
+        :rtype: bool
+        """
+        state = state.lower()
+        methods = {"on": "PowerOnVM_Task", "off": "PowerOffVM_Task",
+                   "reset": "ResetVM_Task", "suspend": "SuspendVM_Task"}
+        if state not in methods or (attempt_guest and state != "on"):
+            # Guest operations aren't tasks, so they're made by the executor
+            result = await self.aio.run(self.vm.change_state, state,
+                                        attempt_guest)
+            return bool(result)
+        if await self.aio.run(self.vm.is_template):
+            self.vm._log.error("VM '%s' is a Template, so state cannot be "
+                               "changed to '%s'", self.name, state)
+            return False
+        self.vm._log.debug("Changing power state of VM %s to: '%s'",
+                           self.name, state)
+        _, outcome = await self.aio.start_task(
+            getattr(self.vm.get_vim_vm(), methods[state]))
+        if outcome != "success":
+            self.vm._changed()
+            return False
+        self.vm._changed(power_state=_POWER_STATES[state])
+        return True
+
+    async def destroy(self):
+        """
+        Destroys the VM, see :meth:`VM.destroy`.
+
+        :return: If the VM was destroyed
+        :rtype: bool
+        """
+        self.vm._log.debug("Destroying VM %s", self.name)
+        if await self.aio.run(self.vm.powered_on):
+            await self.change_state("off")
+        vim_vm = self.vm.get_vim_vm()
+        _, outcome = await self.aio.start_task(vim_vm.Destroy_Task)
+        inventory = get_inventory(vim_vm)
+        if inventory is not None and outcome == "success":
+            inventory.remove(vim_vm)
+        return outcome == "success"
+
+    async def create_snapshot(self, name, description='', memory=False,
+                              quiesce=True):
+        """
+        Creates a snapshot of the VM, see :meth:`VM.create_snapshot`.
+
+        :param str name: Name of the snapshot
+        :param str description: Text description of the snapshot
+        :param bool memory: Memory dump of the VM is included in the snapshot
+        :param bool quiesce: Quiesce VM disks (Requires VMware Tools)
+        :return: If the snapshot was created
+        :rtype: bool
+        """
+        self.vm._log.info("Creating snapshot '%s' of VM '%s'",
+                          name, self.name)
+        _, outcome = await self.aio.start_task(
+            self.vm.get_vim_vm().CreateSnapshot_Task, name=name,
+            description=description, memory=bool(memory), quiesce=quiesce)
+        if outcome != "success":
+            self.vm._log.error("Failed to take snapshot of VM %s", self.name)
+        return outcome == "success"
+
+    async def revert_to_snapshot(self, snapshot):
+        """
+        Reverts the VM to the named snapshot.
+
+        :param str snapshot: Name of the snapshot to revert to
+        :return: If the VM was reverted
+        :rtype: bool
+        """
+        self.vm._log.info("Reverting '%s' to the snapshot '%s'",
+                          self.name, snapshot)
+        snap = await self.aio.run(self.vm.get_snapshot, snapshot)
+        if snap is None:
+            self.vm._log.error("Could not find snapshot '%s' of VM '%s'",
+                               snapshot, self.name)
+            return False
+        _, outcome = await self.aio.start_task(snap.RevertToSnapshot_Task)
+        return outcome == "success"
+
+    async def revert_to_current_snapshot(self):
+        """
+        Reverts the VM to the most recent snapshot.
+
+        :return: If the VM was reverted
+        :rtype: bool
+        """
+        self.vm._log.info("Reverting '%s' to the current snapshot", self.name)
+        _, outcome = await self.aio.start_task(
+            self.vm.get_vim_vm().RevertToCurrentSnapshot_Task)
+        return outcome == "success"
+
+    async def remove_snapshot(self, snapshot, remove_children=True,
+                              consolidate_disks=True):
+        """
+        Removes the named snapshot from the VM.
+
+        :param str snapshot: Name of the snapshot to remove
+        :param bool remove_children: Removal of the entire snapshot subtree
+        :param bool consolidate_disks: Virtual disks of deleted snapshot
+        will be merged with other disks if possible
+        :return: If the snapshot was removed
+        :rtype: bool
+        """
+        self.vm._log.info("Removing snapshot '%s' from '%s'",
+                          snapshot, self.name)
+        snap = await self.aio.run(self.vm.get_snapshot, snapshot)
+        if snap is None:
+            self.vm._log.error("Could not find snapshot '%s' of VM '%s'",
+                               snapshot, self.name)
+            return False
+        _, outcome = await self.aio.start_task(
+            snap.RemoveSnapshot_Task, remove_children, consolidate_disks)
+        return outcome == "success"
+
+    async def remove_all_snapshots(self, consolidate_disks=True):
+        """
+        Removes all snapshots associated with the VM.
+
+        :param bool consolidate_disks: Virtual disks of the deleted snapshot
+        will be merged with other disks if possible
+        :return: If the snapshots were removed
+        :rtype: bool
+        """
+        self.vm._log.info("Removing ALL snapshots for %s", self.name)
+        _, outcome = await self.aio.start_task(
+            self.vm.get_vim_vm().RemoveAllSnapshots_Task, consolidate_disks)
+        return outcome == "success"
+
+    def __str__(self):
+        return "AsyncVM(%s)" % self.name
+
+
+def _destroy_filter(filter_mo):
+    """ Destroys a PropertyCollector filter, ignoring faults. """
+    try:
+        filter_mo.DestroyPropertyFilter()
+    except vmodl.MethodFault as e:
+        logging.debug("Could not destroy filter: %s", str(e))
+
+
+def _call_soon(loop, callback, *args):
+    """ Schedules a callback on an event loop from another thread. """
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:  # The loop was closed
+        logging.debug("Event loop closed before a task finished")
+
+
+def _set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future, exception):
+    if not future.done():
+        future.set_exception(exception)
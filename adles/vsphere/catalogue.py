@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+
+from pyVmomi import vim
+
+from adles.vsphere.inventory import Inventory, CONTAINER_TYPES
+
+
+class TemplateCatalogue:
+    """ Catalogue of the VMs and templates in a folder by their path.
+
+    Paths are relative to the folder and case-insensitive, such as
+    "linux/ubuntu", and every lookup is a single dictionary lookup.
+    The folder is followed using a property collector change feed,
+    so :meth:`refresh` checks for changes with one call to the server and
+    the catalogue is only rebuilt if something in the folder changed.
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, server, folder):
+        """
+        :param server: Vsphere instance the folder is on
+        :type server: :class:`Vsphere`
+        :param folder: Folder containing the templates
+        :type folder: vim.Folder
+        """
+        self._log = logging.getLogger('TemplateCatalogue')
+        self.server = server
+        self.folder = folder
+        self.name = str(folder.name)
+        self._lock = threading.Lock()
+        self._paths = {}   # Normalized path -> VM
+        self._folders = {}  # Normalized path -> folder
+        self._inventory = Inventory([vim.VirtualMachine] + CONTAINER_TYPES,
+                                    [], container=folder)
+        self._inventory.track(server.content)  # Retrieves the folder
+        self._build()
+
+    def get(self, path):
+        """
+        Gets a template by it's path in the folder.
+
+        :param str path: Path of the template, relative to the folder
+        (e.g "linux/ubuntu"). It may start with the name of the folder.
+        :return: The template
+        :rtype: vim.VirtualMachine or None
+        """
+        key = normalize_path(path)
+        with self._lock:
+            found = self._paths.get(key)
+            if found is None and key.split("/")[0] == self.name.lower():
+                found = self._paths.get(key[len(self.name) + 1:])
+        return found
+
+    def get_folder(self, path=""):
+        """
+        Gets a folder by it's path in the catalogue.
+
+        :param str path: Path of the folder, relative to the catalogue folder
+        :return: The folder
+        :rtype: vim.Folder or None
+        """
+        key = normalize_path(path)
+        if key == "":
+            return self.folder
+        with self._lock:
+            return self._folders.get(key)
+
+    def templates(self, path="", recursive=False):
+        """
+        Gets the templates in a folder of the catalogue.
+
+        :param str path: Path of the folder, relative to the catalogue folder
+        :param bool recursive: Include templates in sub-folders
+        :return: Path -> template of the templates, sorted by path
+        :rtype: list(tuple(str, vim.VirtualMachine))
+        """
+        prefix = normalize_path(path)
+        prefix = prefix + "/" if prefix else ""
+        with self._lock:
+            items = sorted(self._paths.items())
+        return [(p, vm) for p, vm in items if p.startswith(prefix)
+                and (recursive or "/" not in p[len(prefix):])]
+
+    def refresh(self):
+        """
+        Applies any changes made to the folder on the server,
+        rebuilding the catalogue if there were any.
+
+        :return: If the catalogue changed
+        :rtype: bool
+        """
+        if not self._inventory.update():
+            return False
+        self._log.debug("Folder '%s' changed, rebuilding catalogue", self.name)
+        self._build()
+        return True
+
+    def close(self):
+        """ Stops following changes to the folder. """
+        self._inventory.untrack()
+
+    def _build(self):
+        """ Maps the path of every VM and folder in the catalogue. """
+        inventory = self._inventory
+        paths = {}
+        folders = {}
+        for obj in inventory:
+            if not isinstance(obj, (vim.VirtualMachine, vim.Folder)) \
+                    or obj == self.folder:
+                continue
+            parts = []
+            current = obj
+            while current is not None and current != self.folder:
+                parts.append(str(inventory.get(current, "name", "")))
+                current = inventory.get(current, "parent")
+            if current is None:
+                continue  # Not in the folder
+            key = normalize_path("/".join(reversed(parts)))
+            if isinstance(obj, vim.Folder):
+                folders[key] = obj
+            else:
+                paths.setdefault(key, obj)  # First one found like traversal
+        with self._lock:
+            self._paths = paths
+            self._folders = folders
+        self._log.debug("Catalogue of folder '%s' has %d templates "
+                        "in %d folders", self.name, len(paths), len(folders))
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __str__(self):
+        return "TemplateCatalogue(%s, %d templates)" % (self.name, len(self))
+
+
+def normalize_path(path):
+    """
+    Normalizes a path in a template catalogue, so paths that refer to the
+    same template are the same (e.g "/Linux//Ubuntu/" -> "linux/ubuntu").
+
+    :param str path: The path
+    :return: The normalized path
+    :rtype: str
+    """
+    return "/".join(p for p in str(path).strip().lower().split("/") if p)
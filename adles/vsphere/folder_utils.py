@@ -12,11 +12,47 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import logging
+from collections import namedtuple
 
 from pyVmomi import vim
 
 from adles.utils import split_path, is_folder, is_vm
+from adles.vsphere.inventory import PAGE_SIZE, folder_filter_spec, \
+    get_inventory, retrieve_properties
+from adles.vsphere.name_index import NameIndex
+from adles.vsphere.vsphere_utils import get_content, wait_for_tasks
+
+
+def get_children(folder):
+    """
+    Gets the items in a folder, using the inventory index if available.
+
+    :param folder: The folder
+    :type folder: vim.Folder
+    :return: The items in the folder
+    :rtype: list(vim.ManagedEntity)
+    """
+    inventory = get_inventory(folder)
+    if inventory is not None:
+        return inventory.children(folder)
+    return list(folder.childEntity)
+
+
+def get_name(item):
+    """
+    Gets the name of an item, using the inventory index if available.
+
+    :param item: The item
+    :type item: vim.ManagedEntity
+    :return: Name of the item
+    :rtype: str
+    """
+    inventory = get_inventory(item)
+    if inventory is not None:
+        return str(inventory.get(item, "name", ""))
+    return str(item.name)
 
 
 def create_folder(folder, folder_name):
@@ -33,14 +69,18 @@ def create_folder(folder, folder_name):
     exists = find_in_folder(folder, folder_name)
     if exists:
         logging.warning("Folder '%s' already exists in folder '%s'",
-                        folder_name, folder.name)
+                        folder_name, get_name(folder))
         return exists  # Return the folder that already existed
     else:
         logging.debug("Creating folder '%s' in folder '%s'",
-                      folder_name, folder.name)
+                      folder_name, get_name(folder))
         try:
             # Create the folder and return it
-            return folder.CreateFolder(folder_name)
+            new_folder = folder.CreateFolder(folder_name)
+            inventory = get_inventory(folder)
+            if inventory is not None:
+                inventory.add(new_folder, folder_name, folder)
+            return new_folder
         except vim.fault.DuplicateName as dupe:
             logging.error("Could not create folder '%s' in '%s': "
                           "folder already exists as '%s'",
@@ -52,11 +92,73 @@ def create_folder(folder, folder_name):
     return None
 
 
+# VMs and folders selected to be destroyed by cleanup,
+# with the index of the folder they were found in
+CleanupItems = namedtuple("CleanupItems", ["vms", "folders", "index"])
+
+
+def select_cleanup(folder, vm_prefix='', folder_prefix='', recursive=False,
+                   destroy_folders=False, destroy_self=False, exclude=None):
+    """
+    Selects the VMs and folders that :func:`cleanup` would destroy,
+    using a name index of the folder built from one property retrieval.
+    The parameters are the same as :func:`cleanup`.
+
+    :return: The VMs, the depth and folder of each of the folders
+    (sorted by depth), and the index
+    :rtype: :class:`CleanupItems`
+    """
+    index = NameIndex.retrieve(
+        folder, properties={vim.VirtualMachine: ["runtime.powerState"]})
+    excluded = set(f._moId for f in (exclude if exclude else []))
+
+    def included(item):  # Not excluded and not in an excluded folder
+        return all(f._moId not in excluded
+                   for f in [item] + index.ancestors(item))
+
+    searched = [folder]  # Folders to destroy matching VMs in
+    wiped = []  # Folders to destroy along with everything in them
+    if destroy_folders:
+        wiped = [f for f in index.find(vim.Folder, folder_prefix,
+                                       container=folder, recursive=False)
+                 if included(f)]
+    elif recursive:  # Search the matching folders in matching folders
+        searched.extend(f for f in index.find(vim.Folder, folder_prefix,
+                                              container=folder)
+                        if included(f) and all(
+                            index.name(a).startswith(folder_prefix)
+                            for a in index.ancestors(f)[:-1]))
+    searched_ids = set(f._moId for f in searched)
+    vms = [v for v in index.find(vim.VirtualMachine, vm_prefix,
+                                 container=folder, recursive=recursive)
+           if index.inventory.get(v, "parent")._moId in searched_ids
+           and included(v)]
+    folders = []
+    for top in wiped:
+        vms.extend(v for v in index.contents(top, vim.VirtualMachine)
+                   if included(v))
+        folders.extend(f for f in [top] + index.contents(top, vim.Folder)
+                       if included(f))
+    vms.sort(key=index.position)
+    folders = sorted(((index.depth(f), f) for f in folders),
+                     key=lambda item: item[0])
+    if destroy_self:
+        folders.insert(0, (0, folder))
+    return CleanupItems(vms, folders, index)
+
+
 def cleanup(folder, vm_prefix='', folder_prefix='', recursive=False,
-            destroy_folders=False, destroy_self=False):
+            destroy_folders=False, destroy_self=False, concurrency=10,
+            exclude=None, items=None):
     """
     Cleans a folder by selectively destroying any VMs and folders it contains.
 
+    The VMs and folders to destroy are found using a single property
+    retrieval. The VMs are then powered off and destroyed in parallel,
+    and finally the folders are destroyed bottom-up. Folders that still
+    contain something, such as a VM that failed to be destroyed,
+    are not destroyed.
+
     :param folder: Folder to cleanup
     :type folder: vim.Folder
     :param str vm_prefix: Only destroy VMs with names starting with the prefix 
@@ -65,28 +167,68 @@ def cleanup(folder, vm_prefix='', folder_prefix='', recursive=False,
     :param bool recursive: Recursively descend into any sub-folders 
     :param bool destroy_folders: Destroy folders in addition to VMs 
     :param bool destroy_self: Destroy the folder specified
+    :param int concurrency: Maximum number of VMs or folders
+    to power off or destroy at once
+    :param exclude: Folders to leave alone, along with their contents
+    :type exclude: list(vim.Folder)
+    :param items: What to destroy, as selected by :func:`select_cleanup`,
+    instead of selecting it using the other parameters
+    :type items: :class:`CleanupItems`
+    :return: If everything that matched was destroyed
+    :rtype: bool
     """
-    logging.debug("Cleaning folder '%s'", folder.name)
-    from adles.vsphere.vm import VM
-
-    for item in folder.childEntity:
-        # Handle VMs
-        if is_vm(item) and str(item.name).startswith(vm_prefix):
-            VM(vm=item).destroy()  # Delete the VM from the Datastore
-
-        # Handle folders
-        elif is_folder(item) and str(item.name).startswith(folder_prefix):
-            if destroy_folders:  # Destroys folder and ALL of it's sub-objects
-                cleanup(item, destroy_folders=True, destroy_self=True)
-            elif recursive:  # Simply recurses to find more items
-                cleanup(item, vm_prefix=vm_prefix,
-                        folder_prefix=folder_prefix, recursive=True)
-
+    logging.debug("Cleaning folder '%s'", get_name(folder))
+    if items is None:
+        items = select_cleanup(folder, vm_prefix, folder_prefix, recursive,
+                               destroy_folders, destroy_self, exclude)
+    vms = list(items.vms)
+    folders = list(items.folders)  # Tuples of (depth, folder)
+    snapshot = items.index.inventory
+    destroyed = set()
+
+    # Power off and delete the VMs from the Datastore, in parallel
+    if vms:
+        logging.debug("Destroying %d VMs in folder '%s'",
+                      len(vms), get_name(folder))
+        wait_for_tasks([vm.PowerOffVM_Task for vm in vms
+                        if snapshot.get(vm, "runtime.powerState") ==
+                        vim.VirtualMachine.PowerState.poweredOn],
+                       concurrency=concurrency)
+        _, outcomes = wait_for_tasks([vm.Destroy_Task for vm in vms],
+                                     concurrency=concurrency)
+        destroyed.update(vm._moId for vm, outcome in zip(vms, outcomes)
+                         if outcome == "success")
+
+    # Destroy the folders bottom-up, so each folder is empty when destroyed
     # Note: UnregisterAndDestroy does NOT delete VM files off the datastore
-    # Only use if folder is already empty!
-    if destroy_self:
-        logging.debug("Destroying folder: '%s'", folder.name)
-        folder.UnregisterAndDestroy_Task().wait()
+    for depth in sorted(set(d for d, _ in folders), reverse=True):
+        level = []
+        for f in (f for d, f in folders if d == depth):
+            if all(c._moId in destroyed for c in snapshot.children(f)):
+                level.append(f)
+            else:
+                logging.warning("Not destroying folder '%s' since it "
+                                "still contains items",
+                                snapshot.get(f, "name", get_name(f)))
+        logging.debug("Destroying %d folders", len(level))
+        _, outcomes = wait_for_tasks([f.UnregisterAndDestroy_Task
+                                      for f in level],
+                                     concurrency=concurrency)
+        destroyed.update(f._moId for f, outcome in zip(level, outcomes)
+                         if outcome == "success")
+
+    # Update the registered inventory with what was destroyed
+    inventory = get_inventory(folder)
+    if inventory is not None:
+        for item in vms + [f for _, f in folders]:
+            if item._moId in destroyed:
+                inventory.remove(item)
+
+    num_folders = len([f for _, f in folders if f._moId in destroyed])
+    logging.info("Destroyed %d of %d VMs and %d of %d folders",
+                 len([v for v in vms if v._moId in destroyed]), len(vms),
+                 num_folders, len(folders))
+    return len(destroyed) == len(vms) + len(folders)
 
 
 def get_in_folder(folder, name, recursive=False, vimtype=None):
@@ -108,16 +250,17 @@ def get_in_folder(folder, name, recursive=False, vimtype=None):
 
     # Get first found of type if can't find in folder or name isn't specified
     if item is None:
-        if len(folder.childEntity) > 0 and vimtype is None:
-            return folder.childEntity[0]
-        elif len(folder.childEntity) > 0:
-            for i in folder.childEntity:
+        children = get_children(folder)
+        if len(children) > 0 and vimtype is None:
+            return children[0]
+        elif len(children) > 0:
+            for i in children:
                 if isinstance(i, vimtype):
                     return i
             logging.error("Could not find item of type '%s' in folder '%s'",
-                          vimtype.__name__, folder.name)
+                          vimtype.__name__, get_name(folder))
         else:
-            logging.error("There are no items in folder %s", folder.name)
+            logging.error("There are no items in folder %s", get_name(folder))
     return item
 
 
@@ -133,6 +276,13 @@ def find_in_folder(folder, name, recursive=False, vimtype=None):
     :return: The object found
     :rtype: vimtype or None
     """
+    inventory = get_inventory(folder)
+    if inventory is not None:  # Lookup in the index before the server
+        vimtypes = [vimtype] if vimtype is not None else None
+        found = _find_indexed(inventory, folder, name, recursive, vimtypes)
+        if found is not None:
+            return found
+
     # NOTE: Convert to lowercase for case-insensitive comparisons
     item_name = name.lower()
     found = None
@@ -150,6 +300,17 @@ def find_in_folder(folder, name, recursive=False, vimtype=None):
     return None
 
 
+def _find_indexed(inventory, folder, name, recursive, vimtypes):
+    """ Finds an object in a folder using an inventory. """
+    found = inventory.child(folder, name, vimtypes)
+    if found is None and recursive:
+        for item in inventory.children(folder, [vim.Folder]):
+            found = _find_indexed(inventory, item, name, recursive, vimtypes)
+            if found is not None:
+                break
+    return found
+
+
 def traverse_path(folder, path, lookup_root=None, generate=False):
     """
     Traverses a folder path to find a object with a specific name.
@@ -165,37 +326,29 @@ def traverse_path(folder, path, lookup_root=None, generate=False):
     :return: Object at the end of the path
     :rtype: vimtype or None
     """
-    logging.debug("Traversing path '%s' from folder '%s'", path, folder.name)
+    logging.debug("Traversing path '%s' from folder '%s'",
+                  path, get_name(folder))
     folder_path, name = split_path(path)
 
     # Check if root of the path is in the folder
     # This is to allow relative paths to be used if lookup_root is defined
-    folder_items = [x.name.lower() for x in folder.childEntity
-                    if hasattr(x, 'name')]
+    folder_items = [get_name(x).lower() for x in get_children(folder)]
     if len(folder_path) > 0 and folder_path[0] not in folder_items:
         if lookup_root is not None:
             logging.debug("Root %s not in folder %s, looking up...",
-                          folder_path[0], folder.name)
+                          folder_path[0], get_name(folder))
             # Lookup the path root on server
             folder = lookup_root.get_folder(folder_path.pop(0))
         else:
             logging.error("Could not find root '%s' "
                           "of path '%s' in folder '%s'",
-                          folder_path[0], path, folder.name)
+                          folder_path[0], path, get_name(folder))
             return None
 
     current = folder  # Start with the defined folder
     for f in folder_path:  # Try each folder name in the path
-        found = None
-
-        # Iterate through items in the current folder
-        for item in current.childEntity:
-            # If Folder is part of path
-            if is_folder(item) and item.name.lower() == f:
-                found = item  # This is the next folder in the path
-                # Break to outer loop to check this folder
-                # for the next part of the path
-                break
+        # The next folder in the path
+        found = find_in_folder(current, f, vimtype=vim.Folder)
         if generate and found is None:  # Can't find the folder, so create it
             logging.warning("Generating folder %s in path", f)
             create_folder(folder, f)  # Generate the folder
@@ -211,41 +364,77 @@ def traverse_path(folder, path, lookup_root=None, generate=False):
 
 def enumerate_folder(folder, recursive=True, power_status=False):
     """
-    Enumerates a folder structure and returns the result.
+    Enumerates a folder structure and returns the result
+    as a python object with the same structure.
+
+    The whole structure is retrieved with a single property
+    retrieval that traverses the folders, and is then built locally.
 
-    as a python object with the same structure
     :param folder: Folder to enumerate
     :type folder: vim.Folder
     :param bool recursive: Whether to recurse into any sub-folders 
     :param bool power_status: Display the power state of the VMs in the folder
     :return: The nested python object with the enumerated folder structure
-    :rtype: list(list, str)
+    :rtype: tuple(str, list)
     """
-    children = []
-    for item in folder.childEntity:
+    properties = {vim.VirtualMachine: ["runtime.powerState"]} \
+        if power_status else None
+    spec = folder_filter_spec(folder, properties, recursive)
+    props = {}     # moId -> dict of properties
+    children = {}  # parent moId -> list of objects
+    for content in retrieve_properties(
+            get_content(folder._stub).propertyCollector, spec):
+        values = dict((p.name, p.val) for p in content.propSet)
+        props[content.obj._moId] = values
+        parent = values.get("parent")
+        if content.obj._moId != folder._moId and parent is not None:
+            children.setdefault(parent._moId, []).append(content.obj)
+    return _build_structure(folder, props, children, recursive, power_status)
+
+
+# Power state of a VM -> Label used for it when enumerating a folder
+_POWER_LABELS = {
+    vim.VirtualMachine.PowerState.poweredOn: '* ON  ',
+    vim.VirtualMachine.PowerState.poweredOff: '* OFF ',
+    vim.VirtualMachine.PowerState.suspended: '* SUS '
+}
+
+
+def _build_structure(folder, props, children, recursive, power_status):
+    """
+    Builds the nested structure of a folder from retrieved properties.
+
+    :param folder: The folder
+    :type folder: vim.Folder
+    :param dict props: moId -> properties of each object retrieved
+    :param dict children: Parent moId -> objects in the parent
+    :param bool recursive: Whether to recurse into any sub-folders
+    :param bool power_status: Display the power state of the VMs
+    :return: The nested structure of the folder
+    :rtype: tuple(str, list)
+    """
+    items = []
+    for item in children.get(folder._moId, []):
+        name = str(props[item._moId].get("name", ""))
         if is_folder(item):
             if recursive:  # Recurse into sub-folders and append the sub-tree
-                children.append(enumerate_folder(item, recursive))
+                items.append(_build_structure(item, props, children,
+                                              recursive, power_status))
             else:  # Don't recurse, just append the folder
-                children.append('- ' + item.name)
+                items.append('- ' + name)
         elif is_vm(item):
             if power_status:
-                if item.runtime.powerState == \
-                        vim.VirtualMachine.PowerState.poweredOn:
-                    children.append('* ON  ' + item.name)
-                elif item.runtime.powerState == \
-                        vim.VirtualMachine.PowerState.poweredOff:
-                    children.append('* OFF ' + item.name)
-                elif item.runtime.powerState == \
-                        vim.VirtualMachine.PowerState.suspended:
-                    children.append('* SUS ' + item.name)
+                state = props[item._moId].get("runtime.powerState")
+                if state in _POWER_LABELS:
+                    items.append(_POWER_LABELS[state] + name)
                 else:
-                    logging.error("Invalid power state for VM: %s", item.name)
+                    logging.error("Invalid power state for VM: %s", name)
             else:
-                children.append('* ' + item.name)
+                items.append('* ' + name)
         else:
-            children.append("UNKNOWN ITEM: %s" % str(item))
-    return '+ ' + folder.name, children  # Return tuple of parent and children
+            items.append("UNKNOWN ITEM: %s" % str(item))
+    name = props.get(folder._moId, {}).get("name", "")
+    return '+ ' + str(name), items  # Return tuple of parent and children
 
 
 # Similar to: https://docs.python.org/3/library/pprint.html
@@ -260,21 +449,119 @@ def format_structure(structure, indent=4, _depth=0):
     :return: Formatted string of the folder structure
     :rtype: str
     """
-    fmat = ""
-    newline = '\n' + str(_depth * str(indent * ' '))
+    return ''.join(_format_lines(structure, indent, _depth))
 
+
+def _format_lines(structure, indent, depth):
+    """ Generates the lines of a formatted folder structure. """
+    newline = '\n' + str(depth * str(indent * ' '))
     if isinstance(structure, tuple):
-        fmat += newline + str(structure[0])
-        fmat += format_structure(structure[1], indent, _depth + 1)
+        yield newline + str(structure[0])
+        for line in _format_lines(structure[1], indent, depth + 1):
+            yield line
     elif isinstance(structure, list):
         for item in structure:
-            fmat += format_structure(item, indent, _depth)
+            for line in _format_lines(item, indent, depth):
+                yield line
     elif isinstance(structure, str):
-        fmat += newline + structure
+        yield newline + structure
     else:
         logging.error("Unexpected type in folder structure for item '%s': %s",
                       str(structure), type(structure))
-    return fmat
+
+
+# An item in a folder tree, as generated by walk_folder
+TreeItem = namedtuple("TreeItem", ["depth", "kind", "name",
+                                   "path", "power_state"])
+
+
+def walk_folder(folder, max_depth=None, power_status=False, vm_prefix='',
+                folder_prefix='', power_states=None, page_size=PAGE_SIZE):
+    """
+    Walks a folder tree depth-first, generating the items in it.
+
+    Each folder's contents are retrieved with one paged call, and only
+    the sub-folders that have yet to be walked are kept, so the memory
+    used doesn't grow with the number of VMs in the tree.
+    The VMs in a folder are generated before it's sub-folders.
+
+    :param folder: Folder to walk
+    :type folder: vim.Folder
+    :param int max_depth: Don't walk into folders at this depth
+    [default: walk the whole tree]
+    :param bool power_status: Include the power state of VMs
+    :param str vm_prefix: Only include VMs with names starting with the prefix
+    :param str folder_prefix: Only include and walk into folders with names
+    starting with the prefix
+    :param power_states: Only include VMs in one of these power states
+    :type power_states: list(str)
+    :param int page_size: Maximum number of items to retrieve per call
+    :return: Generator of the items, starting with the folder at depth 0
+    :rtype: generator(:class:`TreeItem`)
+    """
+    collector = get_content(folder._stub).propertyCollector
+    properties = {vim.VirtualMachine: ["runtime.powerState"]} \
+        if power_status or power_states else None
+    name = get_name(folder)
+    stack = [(folder, name, name, 0)]  # Folders that have yet to be walked
+    while stack:
+        current, name, path, depth = stack.pop()
+        yield TreeItem(depth, "folder", name, path, None)
+        if max_depth is not None and depth >= max_depth:
+            continue
+        spec = folder_filter_spec(current, properties, recursive=False)
+        spec.objectSet[0].skip = True  # Only retrieve the contents
+        folders = []
+        for content in retrieve_properties(collector, spec, page_size):
+            item = content.obj
+            values = dict((p.name, p.val) for p in content.propSet)
+            item_name = str(values.get("name", ""))
+            item_path = path + '/' + item_name
+            if is_folder(item):
+                if item_name.startswith(folder_prefix):
+                    folders.append((item, item_name, item_path, depth + 1))
+            elif is_vm(item):
+                state = values.get("runtime.powerState")
+                if not item_name.startswith(vm_prefix) or \
+                        (power_states and state not in power_states):
+                    continue
+                if not power_status or state is None:
+                    state = None
+                yield TreeItem(depth + 1, "vm", item_name, item_path,
+                               None if state is None else str(state))
+            else:
+                yield TreeItem(depth + 1, "unknown", item_name,
+                               item_path, None)
+        stack.extend(reversed(folders))  # Walk them in the order retrieved
+
+
+def render_tree(items, stream, indent=4, json_lines=False):
+    """
+    Writes the items of a folder tree to a stream as they're generated.
+
+    :param items: Items of the tree, as generated by :func:`walk_folder`
+    :type items: iterable(:class:`TreeItem`)
+    :param stream: File-like object to write to
+    :param int indent: Number of spaces to indent each level of nesting
+    :param bool json_lines: Write each item as a line of JSON
+    instead of as indented text in the format of :func:`format_structure`
+    :return: Number of items written
+    :rtype: int
+    """
+    count = 0
+    for item in items:
+        if json_lines:
+            stream.write(json.dumps(item._asdict()) + '\n')
+        else:
+            if item.kind == "folder":
+                label = '+ ' + item.name
+            elif item.kind == "vm":
+                label = _POWER_LABELS.get(item.power_state, '* ') + item.name
+            else:
+                label = "UNKNOWN ITEM: " + item.name
+            stream.write(item.depth * indent * ' ' + label + '\n')
+        count += 1
+    return count
 
 
 def retrieve_items(folder, vm_prefix='', folder_prefix='', recursive=False):
@@ -293,20 +580,9 @@ def retrieve_items(folder, vm_prefix='', folder_prefix='', recursive=False):
     :return: The VMs and folders found in the folder
     :rtype: tuple(list(vim.VirtualMachine), list(vim.Folder))
     """
-    vms = []
-    folders = []
-
-    for item in folder.childEntity:  # Iterate through all items in the folder
-        if is_vm(item) and str(item.name).startswith(vm_prefix):
-            vms.append(item)  # Add matching vm to the list
-        elif is_folder(item):
-            if str(item.name).startswith(folder_prefix):
-                folders.append(item)  # Add matching folder to the list
-            if recursive:  # Recurse into sub-folders
-                v, f = retrieve_items(item, vm_prefix, folder_prefix, recursive)
-                vms.extend(v)
-                folders.extend(f)
-    return vms, folders
+    index = NameIndex.of(folder)
+    return (index.find(vim.VirtualMachine, vm_prefix, recursive=recursive),
+            index.find(vim.Folder, folder_prefix, recursive=recursive))
 
 
 def move_into(folder, entity_list):
@@ -319,8 +595,12 @@ def move_into(folder, entity_list):
     :type entity_list: list(vim.ManagedEntity)
     """
     logging.debug("Moving a list of %d entities into folder %s",
-                  len(entity_list), folder.name)
-    folder.MoveIntoFolder_Task(entity_list).wait()
+                  len(entity_list), get_name(folder))
+    _, outcomes = wait_for_tasks([folder.MoveIntoFolder_Task(entity_list)])
+    inventory = get_inventory(folder)
+    if inventory is not None and outcomes[0] == "success":
+        for entity in entity_list:
+            inventory.move(entity, folder)
 
 
 def rename(folder, name):
@@ -331,8 +611,11 @@ def rename(folder, name):
     :type folder: vim.Folder
     :param str name: New name for the folder
     """
-    logging.debug("Renaming %s to %s", folder.name, name)
-    folder.Rename_Task(newName=str(name)).wait()
+    logging.debug("Renaming %s to %s", get_name(folder), name)
+    _, outcomes = wait_for_tasks([folder.Rename_Task(newName=str(name))])
+    inventory = get_inventory(folder)
+    if inventory is not None and outcomes[0] == "success":
+        inventory.rename(folder, str(name))
 
 
 # Injection of methods into vim.Folder pyVmomi class
@@ -345,10 +628,12 @@ def rename(folder, name):
 #
 vim.Folder.create = create_folder
 vim.Folder.cleanup = cleanup
+vim.Folder.select_cleanup = select_cleanup
 vim.Folder.get = get_in_folder
 vim.Folder.find_in = find_in_folder
 vim.Folder.traverse_path = traverse_path
 vim.Folder.enumerate = enumerate_folder
+vim.Folder.walk = walk_folder
 vim.Folder.retrieve_items = retrieve_items
 vim.Folder.move_into = move_into
 vim.Folder.rename = rename
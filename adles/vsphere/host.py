@@ -13,23 +13,42 @@
 # limitations under the License.
 
 import logging
+from time import time
 
 from pyVmomi import vim
 
 
 class Host:
-    """ Represents an ESXi host in a VMware vSphere environment. """
-    __version__ = "0.3.0"
+    """ Represents an ESXi host in a VMware vSphere environment.
+
+    The configuration of the host is fetched when it's used,
+    and reused for :attr:`ttl` seconds.
+    """
+    __version__ = "0.4.0"
+    __slots__ = ("host", "name", "_config")
+    _log = logging.getLogger('Host')
+    ttl = 30.0  # Seconds that the configuration is reused for
 
     def __init__(self, host):
         """
         :param host: The host to use
         :type host: vim.HostSystem
         """
-        self._log = logging.getLogger('Host')
         self.host = host
         self.name = str(host.name)
-        self.config = host.config
+        self._config = None  # (When retrieved, vim.host.ConfigInfo)
+
+    @property
+    def config(self):
+        """ Configuration of the host (vim.host.ConfigInfo) """
+        if self._config is None or time() - self._config[0] >= self.ttl:
+            self._config = (time(), self.host.config)
+        return self._config[1]
+
+    def refresh(self):
+        """ Retrieves the name of the host and forgets its configuration. """
+        self.name = str(self.host.name)
+        self._config = None
 
     def reboot(self, force=False):
         """
@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+from weakref import WeakKeyDictionary
+
+from pyVmomi import vim, vmodl
+
+# Types included in every snapshot, so the parent chain
+# of an object can be followed to check what contains it
+CONTAINER_TYPES = [vim.Folder, vim.Datacenter,
+                   vim.ComputeResource, vim.ResourcePool]
+
+# Types snapshotted if none are specified
+DEFAULT_TYPES = [vim.VirtualMachine, vim.Network, vim.HostSystem,
+                 vim.Datastore] + CONTAINER_TYPES
+
+PAGE_SIZE = 1000
+
+# Connection stub -> Inventory used to answer lookups for that connection
+_registry = WeakKeyDictionary()
+
+
+def retrieve_properties(collector, filter_spec, page_size=PAGE_SIZE):
+    """
+    Retrieves properties using a PropertyCollector, paging through results.
+
+    :param collector: The PropertyCollector to use
+    :type collector: vmodl.query.PropertyCollector
+    :param filter_spec: What objects and properties to retrieve
+    :type filter_spec: vmodl.query.PropertyCollector.FilterSpec
+    :param int page_size: Maximum number of objects to retrieve per call
+    :return: Generator of the objects and properties retrieved
+    :rtype: generator(vmodl.query.PropertyCollector.ObjectContent)
+    """
+    options = vmodl.query.PropertyCollector.RetrieveOptions(
+        maxObjects=int(page_size))
+    result = collector.RetrievePropertiesEx(specSet=[filter_spec],
+                                            options=options)
+    while result is not None:
+        for content in result.objects:
+            yield content
+        if not result.token:
+            break
+        result = collector.ContinueRetrievePropertiesEx(token=result.token)
+
+
+def container_filter_spec(view, vimtypes, properties=None):
+    """
+    Creates a FilterSpec that selects every object in a ContainerView.
+
+    :param view: The view to select objects from
+    :type view: vim.view.ContainerView
+    :param list vimtypes: Types of objects to select
+    :param dict properties: Additional properties to retrieve by type,
+    in addition to name and parent
+    :return: The filter specification
+    :rtype: vmodl.query.PropertyCollector.FilterSpec
+    """
+    pc = vmodl.query.PropertyCollector
+    properties = properties if properties is not None else {}
+    prop_set = []
+    for vimtype in vimtypes:
+        paths = set(["name", "parent"])
+        for prop_type, prop_paths in properties.items():
+            if issubclass(vimtype, prop_type):
+                paths.update(prop_paths)
+        prop_set.append(pc.PropertySpec(type=vimtype, all=False,
+                                        pathSet=sorted(paths)))
+    traversal = pc.TraversalSpec(name="traverseView", path="view", skip=False,
+                                 type=vim.view.ContainerView)
+    obj_spec = pc.ObjectSpec(obj=view, skip=True, selectSet=[traversal])
+    return pc.FilterSpec(objectSet=[obj_spec], propSet=prop_set)
+
+
+def folder_filter_spec(folder, properties=None, recursive=True):
+    """
+    Creates a FilterSpec that selects a folder and
+    everything in it by traversing Folder.childEntity.
+
+    :param folder: The folder to select objects from
+    :type folder: vim.Folder
+    :param dict properties: Additional properties to retrieve by type,
+    in addition to name and parent
+    :param bool recursive: Include the contents of sub-folders
+    :return: The filter specification
+    :rtype: vmodl.query.PropertyCollector.FilterSpec
+    """
+    pc = vmodl.query.PropertyCollector
+    properties = properties if properties is not None else {}
+    prop_set = [pc.PropertySpec(type=vim.ManagedEntity, all=False,
+                                pathSet=["name", "parent"])]
+    for prop_type, prop_paths in properties.items():
+        prop_set.append(pc.PropertySpec(
+            type=prop_type, all=False,
+            pathSet=sorted(set(["name", "parent"] + list(prop_paths)))))
+    traversal = pc.TraversalSpec(name="traverseChildren", path="childEntity",
+                                 skip=False, type=vim.Folder)
+    if recursive:  # Follow childEntity of every folder that is found
+        traversal.selectSet = [pc.SelectionSpec(name="traverseChildren")]
+    obj_spec = pc.ObjectSpec(obj=folder, skip=False, selectSet=[traversal])
+    return pc.FilterSpec(objectSet=[obj_spec], propSet=prop_set)
+
+
+def register(stub, inventory):
+    """
+    Registers the inventory used to answer lookups for a connection.
+
+    :param stub: The stub of a connection to a server
+    :param inventory: The inventory of the server
+    :type inventory: :class:`Inventory`
+    """
+    _registry[stub] = inventory
+
+
+def unregister(stub):
+    """
+    Stops using an inventory to answer lookups for a connection.
+
+    :param stub: The stub of a connection to a server
+    """
+    _registry.pop(stub, None)
+
+
+def get_inventory(obj):
+    """
+    Gets the registered inventory that includes an object.
+
+    :param obj: The object
+    :type obj: vim.ManagedEntity
+    :return: The inventory, or None if the object isn't in an inventory
+    :rtype: :class:`Inventory` or None
+    """
+    try:
+        inventory = _registry.get(obj._stub)
+    except (AttributeError, TypeError):  # Not a managed object
+        return None
+    if inventory is not None and obj in inventory:
+        return inventory
+    return None
+
+
+class Inventory:
+    """ Index of the vSphere inventory taken using one property retrieval.
+
+    Holds the name, parent, type and any other requested properties
+    of every object of the indexed types, and answers lookups
+    by name without any calls to the server. Objects are indexed by
+    their parent and lowercased name, so finding an object in a folder
+    is a single dictionary lookup.
+
+    The index is kept current by recording the objects ADLES creates,
+    destroys, renames and moves, and can optionally follow changes made
+    by others using a property collector change feed (:meth:`track`).
+    """
+
+    def __init__(self, vimtypes, contents, properties=None, container=None):
+        """
+        :param list vimtypes: Types of objects included in the snapshot
+        :param contents: Objects and properties retrieved from the server
+        :type contents: list(vmodl.query.PropertyCollector.ObjectContent)
+        :param dict properties: Additional properties retrieved by type
+        :param container: Container the snapshot was taken of
+        """
+        self._log = logging.getLogger('Inventory')
+        self.vimtypes = list(vimtypes)
+        self.properties = properties if properties is not None else {}
+        self.container = container
+        self._lock = threading.RLock()
+        self._objects = {}   # moId -> object, in the order they were added
+        self._props = {}     # moId -> dict of properties
+        self._names = {}     # lowercase name -> list of objects
+        self._children = {}  # parent moId -> list of objects
+        self._index = {}     # (parent moId, lowercase name) -> list of objects
+        self._collector = None  # Used to track changes, see track()
+        self._view = None
+        self._version = ""
+        for content in contents:
+            self._add(content.obj, dict((p.name, p.val)
+                                        for p in content.propSet))
+        self._log.debug("Inventory snapshot with %d objects",
+                        len(self._objects))
+
+    @classmethod
+    def retrieve(cls, content, vimtypes=None, properties=None, container=None,
+                 page_size=PAGE_SIZE):
+        """
+        Takes a snapshot of the inventory.
+
+        :param content: Content of the vCenter server
+        :type content: vim.ServiceInstanceContent
+        :param list vimtypes: Types of objects to include in the snapshot
+        [default: VMs, networks, hosts, datastores and containers]
+        :param dict properties: Additional properties to retrieve by type
+        :param container: Container to snapshot [default: content.rootFolder]
+        :param int page_size: Maximum number of objects to retrieve per call
+        :return: The inventory snapshot
+        :rtype: :class:`Inventory`
+        """
+        types = list(DEFAULT_TYPES if vimtypes is None else vimtypes)
+        types.extend(t for t in CONTAINER_TYPES if t not in types)
+        if container is None:
+            container = content.rootFolder
+        view = content.viewManager.CreateContainerView(container, types, True)
+        try:
+            spec = container_filter_spec(view, types, properties)
+            contents = list(retrieve_properties(content.propertyCollector,
+                                                spec, page_size))
+        finally:
+            view.Destroy()
+        inventory = cls(types, contents, properties, container)
+        if container not in inventory:  # The container is not in its view
+            inventory._props[container._moId] = {}
+        return inventory
+
+    def covers(self, vimtypes):
+        """
+        Checks if all objects of the given types are in the snapshot.
+
+        :param list vimtypes: Types to check
+        :return: If the snapshot includes every one of the types
+        :rtype: bool
+        """
+        return all(any(issubclass(v, t) for t in self.vimtypes)
+                   for v in vimtypes)
+
+    def find(self, vimtypes, name, container=None, recursive=True):
+        """
+        Finds a object by it's name. Names are case-insensitive.
+
+        :param list vimtypes: Types of object to find
+        :param str name: Name of the object
+        :param container: Only find objects in this container
+        :param bool recursive: Include objects in sub-containers
+        :return: The first object found
+        :rtype: vimtype or None
+        """
+        if container is not None and not recursive:
+            return self.child(container, name, vimtypes)
+        for obj in list(self._names.get(str(name).lower(), [])):
+            if self._matches(obj, vimtypes, container, recursive):
+                return obj
+        return None
+
+    def child(self, parent, name, vimtypes=None):
+        """
+        Finds a object in a container by it's name. Names are case-insensitive.
+
+        :param parent: The container
+        :type parent: vim.ManagedEntity
+        :param str name: Name of the object
+        :param list vimtypes: Types of object to find [default: any type]
+        :return: The first object found
+        :rtype: vimtype or None
+        """
+        key = (parent._moId, str(name).lower())
+        for obj in list(self._index.get(key, [])):
+            if vimtypes is None or any(isinstance(obj, t) for t in vimtypes):
+                return obj
+        return None
+
+    def children(self, parent, vimtypes=None):
+        """
+        Gets the objects in a container.
+
+        :param parent: The container
+        :type parent: vim.ManagedEntity
+        :param list vimtypes: Types of objects to get [default: any type]
+        :return: The objects in the container, in the order they were added
+        :rtype: list(vimtype)
+        """
+        with self._lock:
+            objs = list(self._children.get(parent._moId, []))
+        if vimtypes is None:
+            return objs
+        return [o for o in objs if any(isinstance(o, t) for t in vimtypes)]
+
+    def find_all(self, vimtypes, container=None, recursive=True):
+        """
+        Finds all objects of the given types.
+
+        :param list vimtypes: Types of objects to find
+        :param container: Only find objects in this container
+        :param bool recursive: Include objects in sub-containers
+        :return: The objects found, in the order they were retrieved
+        :rtype: list(vimtype)
+        """
+        return [obj for obj in list(self._objects.values())
+                if self._matches(obj, vimtypes, container, recursive)]
+
+    def get(self, obj, prop, default=None):
+        """
+        Gets a property of an object from the snapshot.
+
+        :param obj: The object
+        :type obj: vim.ManagedEntity
+        :param str prop: Name of the property
+        :param default: Value to return if the property was not retrieved
+        :return: The value of the property
+        """
+        return self._props.get(obj._moId, {}).get(prop, default)
+
+    def is_within(self, obj, container, recursive=True):
+        """
+        Checks if an object is inside a container using the snapshot parents.
+
+        :param obj: The object
+        :type obj: vim.ManagedEntity
+        :param container: The container
+        :type container: vim.ManagedEntity
+        :param bool recursive: Check all ancestors instead of just the parent
+        :return: If the object is in the container
+        :rtype: bool
+        """
+        parent = self.get(obj, "parent")
+        while parent is not None:
+            if parent == container:
+                return True
+            if not recursive or parent not in self:
+                return False
+            parent = self.get(parent, "parent")
+        return False
+
+    def add(self, obj, name, parent, **props):
+        """
+        Records a object that was created.
+
+        :param obj: The new object
+        :type obj: vim.ManagedEntity
+        :param str name: Name of the object
+        :param parent: Container of the object
+        :type parent: vim.ManagedEntity
+        :param props: Other properties of the object
+        """
+        props.update(name=name, parent=parent)
+        self._add(obj, props)
+
+    def remove(self, obj):
+        """
+        Records that a object was destroyed, along with anything it contained.
+
+        :param obj: The destroyed object
+        :type obj: vim.ManagedEntity
+        """
+        with self._lock:
+            for child in self.children(obj):
+                self.remove(child)
+            self._discard(obj)
+
+    def rename(self, obj, name):
+        """
+        Records that a object was renamed.
+
+        :param obj: The renamed object
+        :type obj: vim.ManagedEntity
+        :param str name: New name of the object
+        """
+        self._update(obj, {"name": name})
+
+    def move(self, obj, parent):
+        """
+        Records that a object was moved to a different container.
+
+        :param obj: The moved object
+        :type obj: vim.ManagedEntity
+        :param parent: New container of the object
+        :type parent: vim.ManagedEntity
+        """
+        self._update(obj, {"parent": parent})
+
+    def track(self, content):
+        """
+        Follows changes made to the inventory on the server,
+        including changes made by others. Changes are applied
+        when :meth:`update` is called.
+
+        :param content: Content of the vCenter server
+        :type content: vim.ServiceInstanceContent
+        """
+        if self._collector is not None:
+            return
+        container = self.container if self.container is not None \
+            else content.rootFolder
+        self._view = content.viewManager.CreateContainerView(
+            container, self.vimtypes, True)
+        self._collector = content.propertyCollector.CreatePropertyCollector()
+        self._collector.CreateFilter(
+            container_filter_spec(self._view, self.vimtypes, self.properties),
+            partialUpdates=False)
+        self._version = ""
+        self.update()  # The first update is the current state of every object
+
+    def update(self, timeout=0):
+        """
+        Applies changes made on the server since the last update.
+
+        :param int timeout: Seconds to wait for a change if there are none
+        :return: Number of objects that changed
+        :rtype: int
+        """
+        if self._collector is None:
+            return 0
+        options = vmodl.query.PropertyCollector.WaitOptions(
+            maxWaitSeconds=int(timeout))
+        changed = 0
+        while True:
+            update_set = self._collector.WaitForUpdatesEx(
+                version=self._version, options=options)
+            if update_set is None:
+                break
+            self._version = update_set.version
+            for filter_update in update_set.filterSet:
+                for obj_update in filter_update.objectSet:
+                    self._apply(obj_update)
+                    changed += 1
+            if not update_set.truncated:
+                break
+        if changed:
+            self._log.debug("Applied changes to %d objects", changed)
+        return changed
+
+    def is_tracking(self):
+        """
+        Checks if changes made on the server are being followed.
+
+        :return: If changes are being tracked
+        :rtype: bool
+        """
+        return self._collector is not None
+
+    def untrack(self):
+        """ Stops following changes made to the inventory on the server. """
+        if self._collector is not None:
+            self._collector.DestroyPropertyCollector()
+            self._view.Destroy()
+        self._collector = self._view = None
+
+    def _apply(self, obj_update):
+        values = dict((c.name, c.val) for c in obj_update.changeSet
+                      if c.op == "assign")
+        if obj_update.kind == "leave":
+            self._discard(obj_update.obj)
+        elif obj_update.kind == "enter" and obj_update.obj not in self:
+            self._add(obj_update.obj, values)
+        else:
+            self._update(obj_update.obj, values)
+
+    def _add(self, obj, props):
+        with self._lock:
+            if obj._moId in self._objects:
+                self._discard(obj)
+            self._objects[obj._moId] = obj
+            self._props[obj._moId] = props
+            self._link(obj, props)
+
+    def _discard(self, obj):
+        with self._lock:
+            if self._objects.pop(obj._moId, None) is not None:
+                self._unlink(obj, self._props[obj._moId])
+            self._props.pop(obj._moId, None)
+
+    def _update(self, obj, values):
+        with self._lock:
+            if obj._moId not in self._objects:
+                return
+            props = self._props[obj._moId]
+            self._unlink(obj, props)
+            props.update(values)
+            self._link(obj, props)
+
+    def _link(self, obj, props):
+        """ Adds a object to the name, parent and (parent, name) index """
+        name = str(props.get("name", "")).lower()
+        parent = props.get("parent")
+        self._names.setdefault(name, []).append(obj)
+        if parent is not None:
+            self._children.setdefault(parent._moId, []).append(obj)
+            self._index.setdefault((parent._moId, name), []).append(obj)
+
+    def _unlink(self, obj, props):
+        """ Removes a object from the name, parent and (parent, name) index """
+        name = str(props.get("name", "")).lower()
+        parent = props.get("parent")
+        _remove_from(self._names, name, obj)
+        if parent is not None:
+            _remove_from(self._children, parent._moId, obj)
+            _remove_from(self._index, (parent._moId, name), obj)
+
+    def _matches(self, obj, vimtypes, container, recursive):
+        if not any(isinstance(obj, t) for t in vimtypes):
+            return False
+        if container is None:
+            return True
+        return self.is_within(obj, container, recursive)
+
+    def __contains__(self, obj):
+        return hasattr(obj, "_moId") and obj._moId in self._props
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __iter__(self):
+        return iter(list(self._objects.values()))
+
+
+def _remove_from(index, key, obj):
+    """ Removes an object from the list of objects for a key in an index. """
+    objs = index.get(key)
+    if objs is not None and obj in objs:
+        objs.remove(obj)
+        if not objs:
+            del index[key]
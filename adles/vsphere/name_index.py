@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fnmatch
+import logging
+import re
+from bisect import bisect_left
+
+from pyVmomi import vim
+
+from adles.vsphere.inventory import Inventory, get_inventory
+from adles.vsphere.vsphere_utils import get_content
+
+# Types of the objects in the index
+INDEXED_TYPES = [vim.VirtualMachine, vim.Folder]
+
+# Characters that end the literal prefix of a glob or regular expression
+_GLOB_SPECIAL = "*?["
+_REGEX_SPECIAL = ".^$*+?{}[]\\|()"
+
+
+class NameIndex:
+    """ Sorted index of the names of the VMs and folders in a folder.
+
+    The names of each type are kept sorted, so the items with names
+    starting with a prefix are found with a binary search. Every item
+    is numbered in a depth-first walk of the folder, so the contents
+    of a sub-folder are the items numbered between the sub-folder and
+    it's last item, and checking if an item is in a sub-folder is a
+    comparison. Globs and regular expressions are only matched against
+    the names that start with their literal prefix.
+
+    Names are case-sensitive. The index is built from an inventory
+    snapshot and isn't updated, so build a new one after making changes.
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, inventory, folder):
+        """
+        :param inventory: Inventory that includes the folder and its contents
+        :type inventory: :class:`Inventory`
+        :param folder: The folder to index
+        :type folder: vim.Folder
+        """
+        self._log = logging.getLogger('NameIndex')
+        self.inventory = inventory
+        self.folder = folder
+        self._items = []     # Position in the walk -> object
+        self._position = {}  # moId -> position in the walk
+        self._last = {}      # moId -> position of the last item in it
+        self._depth = {}     # moId -> depth below the folder
+        self._names = {}     # vimtype -> sorted list of names
+        self._positions = {}  # vimtype -> positions, in the order of names
+        self._build()
+
+    @classmethod
+    def retrieve(cls, folder, properties=None):
+        """
+        Indexes a folder using a single property retrieval.
+
+        :param folder: The folder to index
+        :type folder: vim.Folder
+        :param dict properties: Additional properties to retrieve by type
+        :return: The index
+        :rtype: :class:`NameIndex`
+        """
+        inventory = Inventory.retrieve(get_content(folder._stub),
+                                       vimtypes=INDEXED_TYPES,
+                                       properties=properties,
+                                       container=folder)
+        return cls(inventory, folder)
+
+    @classmethod
+    def of(cls, folder):
+        """
+        Indexes a folder using the registered inventory if it includes
+        the VMs and folders in it, otherwise by retrieving the folder.
+
+        :param folder: The folder to index
+        :type folder: vim.Folder
+        :return: The index
+        :rtype: :class:`NameIndex`
+        """
+        inventory = get_inventory(folder)
+        if inventory is not None and inventory.covers(INDEXED_TYPES):
+            return cls(inventory, folder)
+        return cls.retrieve(folder)
+
+    def find(self, vimtype, prefix='', glob=None, regex=None,
+             container=None, recursive=True):
+        """
+        Finds the VMs or folders with matching names.
+
+        :param vimtype: Type of items to find (vim.VirtualMachine | vim.Folder)
+        :param str prefix: Only find items with names starting with the prefix
+        :param str glob: Only find items with names matching the glob
+        :param str regex: Only find items with names that the regular
+        expression matches from the start of the name [glob is used instead
+        if both are given]
+        :param container: Folder to find items in [default: the indexed folder]
+        :type container: vim.Folder
+        :param bool recursive: Include items in sub-folders of the container
+        :return: The items found, in the order of a depth-first walk
+        :rtype: list(vimtype)
+        """
+        container = self.folder if container is None else container
+        start = self._position.get(container._moId)
+        if start is None or vimtype not in self._names:
+            return []
+        last = self._last[container._moId]
+        depth = self._depth[container._moId] + 1
+        prefix = str(prefix)
+        pattern = None
+        if glob is not None or regex is not None:
+            if glob is not None:
+                pattern = re.compile(fnmatch.translate(glob))
+                literal = _literal_prefix(glob, _GLOB_SPECIAL)
+            else:
+                pattern = re.compile(regex)
+                literal = _regex_prefix(regex)
+            # Names have to start with both prefixes, so the longer one
+            if literal.startswith(prefix):
+                prefix = literal
+            elif not prefix.startswith(literal):
+                return []
+        names = self._names[vimtype]
+        positions = self._positions[vimtype]
+        lo, hi = _prefix_range(names, prefix)
+        found = []
+        for i in range(lo, hi):
+            position = positions[i]
+            if not start < position <= last:
+                continue  # Not in the container
+            obj = self._items[position]
+            if not recursive and self._depth[obj._moId] != depth:
+                continue
+            if pattern is not None and not pattern.match(names[i]):
+                continue
+            found.append(position)
+        return [self._items[p] for p in sorted(found)]
+
+    def contents(self, container, vimtype=None):
+        """
+        Gets everything in a folder and its sub-folders.
+
+        :param container: The folder
+        :type container: vim.Folder
+        :param vimtype: Type of items to get [default: VMs and folders]
+        :return: The items, in the order of a depth-first walk
+        :rtype: list
+        """
+        start = self._position.get(container._moId)
+        if start is None:
+            return []
+        items = self._items[start + 1:self._last[container._moId] + 1]
+        if vimtype is None:
+            return items
+        return [obj for obj in items if isinstance(obj, vimtype)]
+
+    def depth(self, obj):
+        """
+        Gets how far below the indexed folder an item is.
+
+        :param obj: The item
+        :return: The depth, 0 for the indexed folder, or None if not indexed
+        :rtype: int or None
+        """
+        return self._depth.get(obj._moId)
+
+    def position(self, obj):
+        """
+        Gets the position of an item in a depth-first walk of the folder.
+
+        :param obj: The item
+        :return: The position, or None if the item isn't indexed
+        :rtype: int or None
+        """
+        return self._position.get(obj._moId)
+
+    def name(self, obj):
+        """
+        Gets the name of an item.
+
+        :param obj: The item
+        :return: The name
+        :rtype: str
+        """
+        return str(self.inventory.get(obj, "name", ""))
+
+    def ancestors(self, obj):
+        """
+        Gets the folders an item is in, up to and including the indexed folder.
+
+        :param obj: The item
+        :return: The folders, starting with the parent of the item
+        :rtype: list(vim.Folder)
+        """
+        found = []
+        current = obj
+        while current is not None and current != self.folder:
+            current = self.inventory.get(current, "parent")
+            if current is not None:
+                found.append(current)
+        return found
+
+    def _build(self):
+        """ Numbers the items in a walk of the folder and sorts the names. """
+        entries = dict((t, []) for t in INDEXED_TYPES)
+        stack = [(self.folder, 0)]
+        while stack:
+            obj, depth = stack.pop()
+            if depth < 0:  # Every item in the folder obj has been walked
+                self._last[obj._moId] = len(self._items) - 1
+                continue
+            position = len(self._items)
+            self._items.append(obj)
+            self._position[obj._moId] = position
+            self._depth[obj._moId] = depth
+            if depth > 0:
+                for vimtype in INDEXED_TYPES:
+                    if isinstance(obj, vimtype):
+                        entries[vimtype].append((self.name(obj), position))
+            stack.append((obj, -1))
+            children = self.inventory.children(obj, INDEXED_TYPES) \
+                if isinstance(obj, vim.Folder) else []
+            stack.extend((c, depth + 1) for c in reversed(children))
+        for vimtype, items in entries.items():
+            items.sort()
+            self._names[vimtype] = [n for n, _ in items]
+            self._positions[vimtype] = [p for _, p in items]
+        self._log.debug("Indexed %d VMs and %d folders in folder '%s'",
+                        len(entries[vim.VirtualMachine]),
+                        len(entries[vim.Folder]), self.name(self.folder))
+
+    def __contains__(self, obj):
+        return hasattr(obj, "_moId") and obj._moId in self._position
+
+    def __len__(self):
+        return len(self._items) - 1  # The folder isn't counted
+
+
+def _prefix_range(names, prefix):
+    """
+    Finds the range of sorted names that start with a prefix.
+
+    :param list(str) names: The sorted names
+    :param str prefix: The prefix
+    :return: Start and end (exclusive) of the range
+    :rtype: tuple(int, int)
+    """
+    if not prefix:
+        return 0, len(names)
+    after = prefix[:-1] + chr(ord(prefix[-1]) + 1)  # First string after them
+    return bisect_left(names, prefix), bisect_left(names, after)
+
+
+def _literal_prefix(pattern, special):
+    """
+    Gets the characters at the start of a pattern that match only themselves.
+
+    :param str pattern: The pattern
+    :param str special: Characters with a special meaning in the pattern
+    :return: The literal prefix
+    :rtype: str
+    """
+    for i, char in enumerate(pattern):
+        if char in special:
+            return pattern[:i]
+    return pattern
+
+
+def _regex_prefix(regex):
+    """
+    Gets the literal prefix of a regular expression,
+    which every name it matches from the start must begin with.
+
+    :param str regex: The regular expression
+    :return: The literal prefix
+    :rtype: str
+    """
+    if '|' in regex:  # Any of the alternatives could match
+        return ''
+    prefix = _literal_prefix(regex, _REGEX_SPECIAL)
+    rest = regex[len(prefix):]
+    if rest and rest[0] in "*?{":  # The last character is optional
+        prefix = prefix[:-1]
+    return prefix
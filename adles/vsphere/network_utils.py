@@ -13,8 +13,11 @@
 # limitations under the License.
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
+
+from adles.vsphere.inventory import retrieve_properties
 
 
 def create_portgroup(name, host, vswitch_name, vlan=0, promiscuous=False):
@@ -26,6 +29,8 @@ def create_portgroup(name, host, vswitch_name, vlan=0, promiscuous=False):
     :param vswitch_name: Name of vSwitch on which to create the port group
     :param vlan: VLAN ID of the port group
     :param promiscuous: Put portgroup in promiscuous mode
+    :return: If the portgroup was created
+    :rtype: bool
     """
     logging.debug("Creating PortGroup %s on vSwitch %s on host %s; "
                   "VLAN: %d; Promiscuous: %s",
@@ -46,3 +51,104 @@ def create_portgroup(name, host, vswitch_name, vlan=0, promiscuous=False):
     except vim.fault.NotFound:
         logging.error("vSwitch %s does not exist on host %s",
                       vswitch_name, host.name)
+    else:
+        return True
+    return False
+
+
+def get_portgroups(hosts, collector):
+    """
+    Gets the portgroups on ESXi hosts and their VLANs,
+    using a single retrieval for all of the hosts.
+
+    :param hosts: Hosts to get the portgroups of
+    :type hosts: list(vim.HostSystem)
+    :param collector: PropertyCollector to retrieve the portgroups with
+    :type collector: vmodl.query.PropertyCollector
+    :return: Host moId -> name -> VLAN ID of the portgroups on the host
+    :rtype: dict(str, dict(str, int))
+    """
+    pc = vmodl.query.PropertyCollector
+    spec = pc.FilterSpec(
+        objectSet=[pc.ObjectSpec(obj=h) for h in hosts],
+        propSet=[pc.PropertySpec(type=vim.HostSystem,
+                                 pathSet=["config.network.portgroup"])])
+    portgroups = dict((h._moId, {}) for h in hosts)
+    for content in retrieve_properties(collector, spec):
+        for prop in content.propSet:
+            portgroups[content.obj._moId].update(
+                (p.spec.name, p.spec.vlanId) for p in (prop.val or []))
+    return portgroups
+
+
+def create_portgroups(portgroups, hosts, collector, max_workers=8,
+                      existing=None):
+    """
+    Creates portgroups on every host that doesn't already have them.
+    The portgroups on the hosts are read once, then the missing
+    portgroups are created concurrently.
+
+    :param dict portgroups: Name -> (VLAN ID, vSwitch name)
+    of the portgroups to create
+    :param hosts: Hosts to create the portgroups on
+    :type hosts: list(vim.HostSystem)
+    :param collector: PropertyCollector to retrieve the portgroups with
+    :type collector: vmodl.query.PropertyCollector
+    :param int max_workers: Maximum number of portgroups
+    to create at the same time
+    :param dict existing: Portgroups already on the hosts,
+    as returned by :func:`get_portgroups`, so they aren't read again
+    :return: Number of portgroups that were created
+    :rtype: int
+    """
+    if existing is None:
+        existing = get_portgroups(hosts, collector)
+    missing = [(name, host) for host in hosts for name in portgroups
+               if name not in existing[host._moId]]
+    if not missing:
+        return 0
+    logging.info("Creating %d portgroups on %d hosts",
+                 len(missing), len(hosts))
+
+    def create(item):
+        name, host = item
+        vlan, vswitch_name = portgroups[name]
+        return create_portgroup(name=name, host=host,
+                                vswitch_name=vswitch_name, vlan=vlan)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        return sum(1 for created in pool.map(create, missing) if created)
+
+
+def remove_portgroups(names, hosts, max_workers=8):
+    """
+    Removes portgroups from every host concurrently.
+
+    :param list names: Names of the portgroups to remove
+    :param hosts: Hosts to remove the portgroups from
+    :type hosts: list(vim.HostSystem)
+    :param int max_workers: Maximum number of portgroups
+    to remove at the same time
+    :return: Number of portgroups that were removed
+    :rtype: int
+    """
+    def remove(item):
+        name, host = item
+        try:
+            host.configManager.networkSystem.RemovePortGroup(name)
+        except vim.fault.NotFound:
+            logging.error("PortGroup %s does not exist on host %s",
+                          name, host.name)
+        except vim.fault.ResourceInUse:
+            logging.error("PortGroup %s can't be removed from host %s "
+                          "because there are vNICs associated with it",
+                          name, host.name)
+        else:
+            return True
+        return False
+
+    items = [(name, host) for host in hosts for name in names]
+    if not items:
+        return 0
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        return sum(1 for removed in pool.map(remove, items) if removed)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+
+from pyVmomi import vim, vmodl
+
+from adles.vsphere.inventory import retrieve_properties
+
+STRATEGIES = ["round-robin", "least-loaded", "affinity"]
+
+
+class Placement:
+    """ Chooses the ESXi host and Datastore each new VM is put on.
+
+    Strategies:
+
+    - round-robin: Hosts and datastores are used in turn
+    - least-loaded: The host with the lowest memory usage and the datastore
+      with the most free space, counting the VMs already placed
+    - affinity: VMs with the same key (e.g. the folder they're in) are put
+      on the same host and datastore, which are chosen by least-loaded
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, server, hosts, datastores, strategy="round-robin"):
+        """
+        :param server: Vsphere instance the hosts and datastores are from
+        :type server: :class:`Vsphere`
+        :param hosts: Hosts to place VMs on
+        :type hosts: list(vim.HostSystem)
+        :param datastores: Datastores to place VMs on
+        :type datastores: list(vim.Datastore)
+        :param str strategy: How to choose a host and datastore
+        (round-robin | least-loaded | affinity)
+        :raises ValueError: if the strategy is invalid or there are
+        no hosts or datastores
+        """
+        self._log = logging.getLogger('Placement')
+        if strategy not in STRATEGIES:
+            raise ValueError("Invalid placement strategy: %s" % str(strategy))
+        if not hosts or not datastores:
+            raise ValueError("Placement requires at least one host "
+                             "and one datastore")
+        self.server = server
+        self.hosts = list(hosts)
+        self.datastores = list(datastores)
+        self.strategy = strategy
+        self._lock = threading.Lock()
+        self._next_host = 0
+        self._next_datastore = 0
+        self._affinity = {}     # Key -> (host, datastore)
+        self._memory_used = {}  # Host moId -> MB of memory used
+        self._memory_size = {}  # Host moId -> MB of memory
+        self._free_space = {}   # Datastore moId -> bytes of free space
+        self._mounts = {}       # Host moId -> datastores it can access
+        self._pools = {}        # Host moId -> root resource pool of host
+        self._retrieve_stats()
+
+    def place(self, key=None, memory=0, storage=0):
+        """
+        Chooses the host and datastore for a new VM.
+
+        :param str key: Key that groups VMs for affinity placement,
+        such as the path of the folder the VM is in
+        :param int memory: MB of memory the VM will use
+        :param int storage: Bytes of storage the VM will use
+        :return: The host, datastore and resource pool for the VM
+        :rtype: tuple(vim.HostSystem, vim.Datastore, vim.ResourcePool)
+        """
+        with self._lock:
+            if self.strategy == "affinity" and key in self._affinity:
+                host, datastore = self._affinity[key]
+            elif self.strategy == "round-robin":
+                host, datastore = self._round_robin()
+            else:
+                host, datastore = self._least_loaded()
+            if self.strategy == "affinity":
+                self._affinity.setdefault(key, (host, datastore))
+            # Account for the VM so the next placement sees it's load
+            self._memory_used[host._moId] += int(memory)
+            self._free_space[datastore._moId] -= int(storage)
+        self._log.debug("Placed VM on host %s, datastore %s",
+                        host._moId, datastore._moId)
+        return host, datastore, self._pools.get(host._moId)
+
+    def _round_robin(self):
+        host = self.hosts[self._next_host % len(self.hosts)]
+        self._next_host += 1
+        mounted = self._mounts[host._moId]
+        datastore = mounted[self._next_datastore % len(mounted)]
+        self._next_datastore += 1
+        return host, datastore
+
+    def _least_loaded(self):
+        host = min(self.hosts, key=lambda h: (float(self._memory_used[h._moId])
+                                              / self._memory_size[h._moId]))
+        datastore = max(self._mounts[host._moId],
+                        key=lambda d: self._free_space[d._moId])
+        return host, datastore
+
+    def _retrieve_stats(self):
+        """ Retrieves the load of the hosts and datastores in one call. """
+        pc = vmodl.query.PropertyCollector
+        spec = pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=o)
+                       for o in self.hosts + self.datastores],
+            propSet=[pc.PropertySpec(
+                type=vim.HostSystem, pathSet=[
+                    "datastore", "parent",
+                    "summary.hardware.memorySize",
+                    "summary.quickStats.overallMemoryUsage"]),
+                pc.PropertySpec(type=vim.Datastore,
+                                pathSet=["summary.freeSpace"])])
+        props = {}
+        for content in retrieve_properties(
+                self.server.content.propertyCollector, spec):
+            props[content.obj._moId] = dict((p.name, p.val)
+                                            for p in content.propSet)
+
+        for datastore in self.datastores:
+            values = props.get(datastore._moId, {})
+            self._free_space[datastore._moId] = int(
+                values.get("summary.freeSpace") or 0)
+        parents = {}
+        for host in self.hosts:
+            values = props.get(host._moId, {})
+            self._memory_used[host._moId] = int(
+                values.get("summary.quickStats.overallMemoryUsage") or 0)
+            size = int(values.get("summary.hardware.memorySize") or 0)
+            self._memory_size[host._moId] = max(size // (1024 * 1024), 1)
+            mounted = [d for d in self.datastores
+                       if d in (values.get("datastore") or [])]
+            if not mounted:
+                self._log.warning("None of the placement datastores are "
+                                  "mounted on host %s, using all of them",
+                                  host._moId)
+                mounted = list(self.datastores)
+            self._mounts[host._moId] = mounted
+            if values.get("parent") is not None:
+                parents[host._moId] = values["parent"]
+
+        # The root resource pool of each host's cluster or compute resource
+        if parents:
+            spec = pc.FilterSpec(
+                objectSet=[pc.ObjectSpec(obj=p)
+                           for p in set(parents.values())],
+                propSet=[pc.PropertySpec(type=vim.ComputeResource,
+                                         pathSet=["resourcePool"])])
+            pools = {}
+            for content in retrieve_properties(
+                    self.server.content.propertyCollector, spec):
+                for prop in content.propSet:
+                    pools[content.obj._moId] = prop.val
+            for host_id, parent in parents.items():
+                self._pools[host_id] = pools.get(parent._moId)
+
+    def __str__(self):
+        return "Placement(%s, %d hosts, %d datastores)" % \
+               (self.strategy, len(self.hosts), len(self.datastores))
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+
+try:
+    from time import perf_counter
+except ImportError:  # Python 2.7
+    from time import time as perf_counter
+
+
+class Profiler:
+    """ Counts and times the calls made to a vCenter server.
+
+    The profiler wraps the methods of the pyVmomi stub adapter that every
+    managed method invocation and property fetch goes through, so calls
+    are accounted for regardless of where in ADLES they're made. Calls are
+    grouped by the phase being run (setup, masters, deploy or cleanup),
+    the type of managed object, and the name of the method or property.
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, keep_calls=False):
+        """
+        :param bool keep_calls: Keep the timing of every call,
+        so they can be saved with :meth:`save`
+        """
+        self._log = logging.getLogger('Profiler')
+        self.keep_calls = keep_calls
+        self.calls = []  # (phase, type, name, kind, start, seconds, error)
+        self.stats = {}  # (phase, type, name, kind) -> [count, seconds, max]
+        self._phase = "setup"
+        self._lock = threading.Lock()
+        self._stubs = []  # Stubs that are attached
+        self._start = perf_counter()
+
+    def attach(self, stub):
+        """
+        Starts accounting for the calls made through a stub adapter.
+
+        :param stub: pyVmomi stub adapter, such as the _stub of a
+        ServiceInstance or a :class:`Simulator`
+        """
+        if stub in self._stubs:
+            return
+        invoke_method = stub.InvokeMethod
+        invoke_accessor = stub.InvokeAccessor
+
+        def method(mo, info, args):
+            return self._time(invoke_method, (mo, info, args),
+                              mo, info.wsdlName, "method")
+
+        def accessor(mo, info):
+            return self._time(invoke_accessor, (mo, info),
+                              mo, info.name, "property")
+
+        stub.InvokeMethod = method
+        stub.InvokeAccessor = accessor
+        self._stubs.append(stub)
+        self._log.debug("Profiling calls made through %s", str(stub))
+
+    def detach(self):
+        """ Stops accounting for calls. """
+        for stub in self._stubs:
+            del stub.InvokeMethod  # Uncovers the methods of the stub's class
+            del stub.InvokeAccessor
+        self._stubs = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager that attributes the calls made in it to a phase.
+
+        :param str name: Name of the phase (masters | deploy | cleanup)
+        """
+        previous = self._phase
+        self._phase = str(name)
+        try:
+            yield self
+        finally:
+            self._phase = previous
+
+    def _time(self, func, args, mo, name, kind):
+        phase = self._phase
+        start = perf_counter()
+        error = ""
+        try:
+            return func(*args)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = perf_counter() - start
+            key = (phase, type(mo).__name__, name, kind)
+            with self._lock:
+                stats = self.stats.setdefault(key, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+                if self.keep_calls:
+                    self.calls.append(key + (start - self._start,
+                                             seconds, error))
+
+    def totals(self):
+        """
+        Gets the number of calls made and the seconds spent in them
+        during each phase.
+
+        :return: Phase -> (number of calls, seconds)
+        :rtype: dict(str, tuple(int, float))
+        """
+        totals = {}
+        with self._lock:
+            for (phase, _, _, _), (count, seconds, _) in self.stats.items():
+                calls, total = totals.get(phase, (0, 0.0))
+                totals[phase] = (calls + count, total + seconds)
+        return totals
+
+    def format(self, limit=20):
+        """
+        Formats a summary of the calls that took the most time.
+
+        :param int limit: Maximum number of calls to list for each phase
+        :return: The summary table
+        :rtype: str
+        """
+        with self._lock:
+            stats = sorted(self.stats.items(), key=lambda s: -s[1][1])
+        lines = ["%-8s %-44s %-8s %7s %10s %9s %9s"
+                 % ("Phase", "Call", "Kind", "Count", "Total",
+                    "Mean", "Max")]
+        for phase, (count, seconds) in sorted(self.totals().items()):
+            listed = 0
+            for (p, mo_type, name, kind), (num, total, slowest) in stats:
+                if p != phase:
+                    continue
+                elif listed == limit:
+                    lines.append("%-8s ..." % phase)
+                    break
+                call = "%s.%s" % (mo_type.split(".")[-1], name)
+                lines.append("%-8s %-44s %-8s %7d %9.3fs %8.1fms %8.1fms"
+                             % (phase, call[:44], kind, num, total,
+                                total / num * 1000.0, slowest * 1000.0))
+                listed += 1
+            lines.append("%-8s %-44s %-8s %7d %9.3fs"
+                         % (phase, "Total", "", count, seconds))
+        return "\n".join(lines)
+
+    def save(self, filename):
+        """
+        Saves the timing of every call to a CSV file.
+
+        :param str filename: Name of the file to save to
+        :return: If the calls were saved
+        :rtype: bool
+        """
+        if not self.keep_calls:
+            self._log.error("Calls were not kept, so they can't be saved")
+            return False
+        try:
+            if sys.version_info[0] < 3:  # The csv module writes bytes
+                f = open(filename, "wb")
+            else:
+                f = open(filename, "w", newline="")
+            with f:
+                writer = csv.writer(f)
+                writer.writerow(["phase", "type", "name", "kind",
+                                 "start", "seconds", "error"])
+                with self._lock:
+                    writer.writerows(self.calls)
+        except (IOError, OSError) as e:
+            self._log.error("Could not save profile to %s: %s",
+                            filename, str(e))
+            return False
+        self._log.info("Saved the timing of %d calls to %s",
+                       len(self.calls), filename)
+        return True
+
+    def __len__(self):
+        return sum(s[0] for s in self.stats.values())
+
+    def __str__(self):
+        return "Profiler(%d calls, %d stubs)" % (len(self), len(self._stubs))
@@ -0,0 +1,1081 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+from collections import Counter
+from copy import deepcopy
+from datetime import datetime
+from itertools import count
+from time import sleep, time
+from uuid import uuid4
+
+from pyVmomi import vim, vmodl
+from pyVmomi.VmomiSupport import DataObject, ManagedObject
+
+PowerState = vim.VirtualMachine.PowerState
+
+
+class Simulator:
+    """ In-process stand-in for a vCenter server.
+
+    The simulator acts as the pyVmomi stub adapter for the managed objects
+    it creates, so the real pyVmomi classes (and the methods ADLES injects
+    into them) are used unchanged. Every managed method invocation and
+    property fetch counts as one SOAP round trip.
+
+    Example::
+
+        sim = Simulator(latency=0.01, task_duration=0.5)
+        server = Vsphere(service_instance=sim.connect())
+        server.create_folder("test")
+        print(sim.round_trips(), sim.calls.most_common(5))
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, latency=0.0, task_duration=0.0, datacenter="datacenter",
+                 datastore="Datastore", hosts=("esxi-01",)):
+        """
+        :param float latency: Seconds each call to the server takes
+        :param float task_duration: Seconds each task takes to complete
+        :param str datacenter: Name of the Datacenter to create
+        :param str datastore: Name of the Datastore to create
+        :param hosts: Names of the ESXi hosts to create
+        :type hosts: list(str)
+        """
+        self._log = logging.getLogger('Simulator')
+        self.latency = float(latency)
+        self.task_duration = float(task_duration)
+        self.calls = Counter()  # "Type.Method" -> number of invocations
+
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._ids = count(1)
+        self._objs = {}     # moId -> managed object
+        self._props = {}    # moId -> dict of property values
+        self._tasks = {}    # moId -> pending task state
+        self._collectors = {}   # moId -> list of filter moIds
+        self._filters = {}  # moId -> filter state
+        self._results = {}  # token -> remaining ObjectContent
+        self._version = count(1)
+
+        self.service_instance = vim.ServiceInstance("ServiceInstance", self)
+        self._objs["ServiceInstance"] = self.service_instance
+        self._props["ServiceInstance"] = {}
+
+        root = self._new(vim.Folder, "group-d", name="Datacenters",
+                         childEntity=[], parent=None,
+                         childType=["Folder", "Datacenter"])
+        collector = self._new(vmodl.query.PropertyCollector,
+                              "propertyCollector")
+        self._collectors[collector._moId] = []
+        self.content = vim.ServiceInstanceContent(
+            rootFolder=root,
+            propertyCollector=collector,
+            viewManager=self._new(vim.view.ViewManager, "ViewManager"),
+            searchIndex=self._new(vim.SearchIndex, "SearchIndex"),
+            sessionManager=self._new(vim.SessionManager, "SessionManager"),
+            authorizationManager=self._new(vim.AuthorizationManager,
+                                           "AuthorizationManager"),
+            userDirectory=self._new(vim.UserDirectory, "UserDirectory",
+                                    domainList=[]),
+            about=vim.AboutInfo(fullName="ADLES vSphere Simulator",
+                                vendor="ADLES", version="6.5.0",
+                                apiType="VirtualCenter", apiVersion="6.5",
+                                osType="simulated"))
+
+        self.datacenter = self._new(vim.Datacenter, "datacenter",
+                                    name=datacenter, parent=root)
+        self._props[root._moId]["childEntity"].append(self.datacenter)
+        for attr, prefix, kinds in (
+                ("vmFolder", "group-v", ["Folder", "VirtualMachine"]),
+                ("hostFolder", "group-h", ["Folder", "ComputeResource"]),
+                ("datastoreFolder", "group-s", ["Folder", "Datastore"]),
+                ("networkFolder", "group-n", ["Folder", "Network"])):
+            folder = self._new(vim.Folder, prefix, name=attr[:-6],
+                               childEntity=[], parent=self.datacenter,
+                               childType=kinds)
+            self._props[self.datacenter._moId][attr] = folder
+
+        self.hosts = []
+        self.datastores = []
+        self.datastore = self.add_datastore(datastore)
+        self.cluster = self._new(vim.ClusterComputeResource, "domain-c",
+                                 name="cluster", host=[], parent=None)
+        self._adopt(self._get(self.datacenter, "hostFolder"), self.cluster)
+        self.pool = self._new(vim.ResourcePool, "resgroup", name="Resources",
+                              parent=self.cluster, resourcePool=[], vm=[])
+        self._props[self.cluster._moId]["resourcePool"] = self.pool
+        for host in hosts:
+            self.add_host(host)
+        self.add_network("VM Network")
+
+    # ---- Inventory construction ----
+
+    def connect(self):
+        """
+        Gets the ServiceInstance of the simulator.
+
+        :return: The ServiceInstance, for use with :class:`Vsphere`
+        :rtype: vim.ServiceInstance
+        """
+        return self.service_instance
+
+    def add_folder(self, parent, name):
+        """
+        Adds a VM folder to the inventory without counting any calls.
+
+        :param parent: Folder to create the folder in [default: vmFolder]
+        :type parent: vim.Folder or None
+        :param str name: Name of the folder
+        :return: The new folder
+        :rtype: vim.Folder
+        """
+        with self._lock:
+            if parent is None:
+                parent = self._get(self.datacenter, "vmFolder")
+            folder = self._new(vim.Folder, "group-v", name=name,
+                               childEntity=[], parent=None,
+                               childType=["Folder", "VirtualMachine"])
+            self._adopt(parent, folder)
+            return folder
+
+    def add_vm(self, folder, name, template=False, num_nics=1,
+               powered_on=False, network=None):
+        """
+        Adds a Virtual Machine to the inventory without counting any calls.
+
+        :param folder: Folder to create the VM in [default: vmFolder]
+        :type folder: vim.Folder or None
+        :param str name: Name of the VM
+        :param bool template: If the VM is a Template
+        :param int num_nics: Number of vNICs the VM has
+        :param bool powered_on: If the VM is powered on
+        :param network: Network the vNICs are attached to
+        [default: first network]
+        :type network: vim.Network
+        :return: The new VM
+        :rtype: vim.VirtualMachine
+        """
+        with self._lock:
+            if folder is None:
+                folder = self._get(self.datacenter, "vmFolder")
+            if network is None:
+                network = self._get(self._get(self.datacenter,
+                                              "networkFolder"),
+                                    "childEntity")[0]
+            devices = [self._make_nic(i, network)
+                       for i in range(1, num_nics + 1)]
+            config = vim.vm.ConfigInfo(
+                name=name, template=bool(template), guestId="otherGuest",
+                version="vmx-13", annotation="",
+                hardware=vim.vm.VirtualHardware(numCPU=1, memoryMB=512,
+                                                device=devices),
+                instanceUuid=str(uuid4()), uuid=str(uuid4()))
+            state = PowerState.poweredOn if powered_on \
+                else PowerState.poweredOff
+            return self._new_vm(folder, name, config, state, self.pool,
+                                self.hosts[0], self.datastore)
+
+    def add_host(self, name):
+        """
+        Adds an ESXi host to the cluster without counting any calls.
+
+        :param str name: Name of the host
+        :return: The new host
+        :rtype: vim.HostSystem
+        """
+        with self._lock:
+            net_system = self._new(vim.host.NetworkSystem, "networkSystem",
+                                   networkInfo=vim.host.NetworkInfo(
+                                       portgroup=[], vswitch=[
+                                           vim.host.VirtualSwitch(
+                                               name="vSwitch0")]))
+            host = self._new(vim.HostSystem, "host", name=name,
+                             parent=self.cluster, vm=[], network=[],
+                             datastore=list(self.datastores),
+                             configManager=vim.host.ConfigManager(
+                                 networkSystem=net_system))
+            self._props[net_system._moId]["host"] = host
+            self._props[self.cluster._moId]["host"].append(host)
+            for datastore in self.datastores:  # Mount every datastore
+                self._props[datastore._moId]["host"].append(host)
+            self.hosts.append(host)
+            return host
+
+    def add_datastore(self, name, capacity=2 ** 42, free_space=2 ** 41):
+        """
+        Adds a Datastore to the inventory without counting any calls.
+
+        :param str name: Name of the datastore
+        :param int capacity: Capacity of the datastore in bytes
+        :param int free_space: Free space on the datastore in bytes
+        :return: The new datastore
+        :rtype: vim.Datastore
+        """
+        with self._lock:
+            datastore = self._new(vim.Datastore, "datastore", name=name,
+                                  parent=None, vm=[], host=[],
+                                  capacity=capacity, freeSpace=free_space)
+            self._adopt(self._get(self.datacenter, "datastoreFolder"),
+                        datastore)
+            for host in self.hosts:  # Mount the datastore on every host
+                self._props[host._moId]["datastore"].append(datastore)
+                self._props[datastore._moId]["host"].append(host)
+            self.datastores.append(datastore)
+            return datastore
+
+    def add_network(self, name, vlan=0, vswitch_name="vSwitch0"):
+        """
+        Adds a portgroup to every host without counting any calls.
+
+        :param str name: Name of the portgroup
+        :param int vlan: VLAN ID of the portgroup
+        :param str vswitch_name: Name of the vSwitch of the portgroup
+        :return: The network for the portgroup
+        :rtype: vim.Network
+        """
+        with self._lock:
+            spec = vim.host.PortGroup.Specification(
+                name=name, vlanId=int(vlan), vswitchName=vswitch_name,
+                policy=vim.host.NetworkPolicy())
+            network = None
+            for host in self.hosts:
+                network = self._add_portgroup(host, spec)
+            if network is None:
+                network = self._new(vim.Network, "network", name=name,
+                                    parent=None, host=[], vm=[])
+                self._adopt(self._get(self.datacenter, "networkFolder"),
+                            network)
+            return network
+
+    # ---- Statistics ----
+
+    def round_trips(self):
+        """
+        Gets the total number of calls made to the simulator.
+
+        :return: Number of calls
+        :rtype: int
+        """
+        return sum(self.calls.values())
+
+    def reset_stats(self):
+        """ Clears the call counters. """
+        with self._lock:
+            self.calls.clear()
+
+    def __len__(self):
+        return len(self._objs)
+
+    def __str__(self):
+        return "Simulator(%d objects)" % len(self)
+
+    def __deepcopy__(self, memo):
+        return self  # Copied data objects keep referring to this server
+
+    # ---- pyVmomi stub adapter interface ----
+
+    def InvokeMethod(self, mo, info, args):
+        """ Invokes a managed method (pyVmomi stub adapter interface). """
+        self._call(mo, info.wsdlName)
+        handler = getattr(self, "_" + info.wsdlName, None)
+        if handler is None:
+            raise vmodl.fault.NotSupported(
+                msg="%s is not simulated" % info.wsdlName)
+        kwargs = dict((p.name, a) for p, a in zip(info.params, args))
+        with self._lock:
+            self._tick()
+            return handler(mo, **kwargs)
+
+    def InvokeAccessor(self, mo, info):
+        """ Fetches a managed property (pyVmomi stub adapter interface). """
+        self._call(mo, info.name)
+        with self._lock:
+            self._tick()
+            value = self._get(mo, info.name)
+            # Like a real server, changes to what's returned aren't saved
+            return deepcopy(value) if isinstance(value, DataObject) else value
+
+    def _call(self, mo, name):
+        with self._lock:
+            self.calls["%s.%s" % (type(mo).__name__.split('.')[-1],
+                                  name)] += 1
+        if self.latency > 0:
+            sleep(self.latency)
+
+    # ---- Internal state ----
+
+    def _new(self, vimtype, prefix, **props):
+        mo_id = prefix if prefix in ("ViewManager", "SearchIndex",
+                                     "SessionManager", "AuthorizationManager",
+                                     "UserDirectory") \
+            else "%s-%d" % (prefix, next(self._ids))
+        mo = vimtype(mo_id, self)
+        self._objs[mo_id] = mo
+        self._props[mo_id] = props
+        return mo
+
+    def _get(self, mo, name):
+        """ Resolves a property, which may be a dotted path. """
+        parts = name.split('.')
+        props = self._props.get(mo._moId)
+        if props is None:
+            raise vmodl.fault.ManagedObjectNotFound(obj=mo)
+        builder = getattr(self, "_build_%s_%s" % (
+            type(mo).__name__.split('.')[-1], parts[0]), None)
+        value = builder(mo) if builder else props.get(parts[0])
+        for part in parts[1:]:
+            value = getattr(value, part, None) if value is not None else None
+        return value
+
+    def _adopt(self, parent, child):
+        """ Moves a managed entity into a folder. """
+        with self._lock:
+            old = self._props[child._moId].get("parent")
+            if old is not None and "childEntity" in self._props[old._moId]:
+                self._props[old._moId]["childEntity"].remove(child)
+            self._props[parent._moId]["childEntity"].append(child)
+            self._props[child._moId]["parent"] = parent
+            self._changed.notify_all()
+
+    def _remove(self, entity):
+        """ Removes a managed entity and everything it contains. """
+        props = self._props.pop(entity._moId)
+        self._objs.pop(entity._moId, None)
+        for child in props.get("childEntity", []):
+            self._remove(child)
+        parent = props.get("parent")
+        if parent is not None and parent._moId in self._props:
+            siblings = self._props[parent._moId].get("childEntity")
+            if siblings is not None and entity in siblings:
+                siblings.remove(entity)
+        if isinstance(entity, vim.VirtualMachine):
+            for holder in (props.get("resourcePool"), props["runtime"].host):
+                if holder is not None and holder._moId in self._props:
+                    self._props[holder._moId]["vm"].remove(entity)
+            for datastore in props.get("datastore", []):
+                self._props[datastore._moId]["vm"].remove(entity)
+        self._changed.notify_all()
+
+    def _find_child(self, folder, name):
+        for child in self._props[folder._moId]["childEntity"]:
+            if self._props[child._moId]["name"].lower() == name.lower():
+                return child
+        return None
+
+    def _make_nic(self, number, network):
+        nic = vim.vm.device.VirtualE1000(key=4000 + number)
+        nic.deviceInfo = vim.Description(label="Network adapter %d" % number,
+                                         summary=network.name)
+        nic.backing = vim.vm.device.VirtualEthernetCard.NetworkBackingInfo(
+            network=network, deviceName=network.name)
+        return nic
+
+    def _new_vm(self, folder, name, config, power_state, pool, host,
+                datastore):
+        vm = self._new(vim.VirtualMachine, "vm", name=name, parent=None,
+                       config=config, resourcePool=pool, snapshot=None,
+                       datastore=[datastore], guest=None,
+                       runtime=vim.vm.RuntimeInfo(powerState=power_state,
+                                                  host=host))
+        self._adopt(folder, vm)
+        self._props[pool._moId]["vm"].append(vm)
+        self._props[host._moId]["vm"].append(vm)
+        self._props[datastore._moId]["vm"].append(vm)
+        return vm
+
+    def _add_portgroup(self, host, spec):
+        net_system = self._props[host._moId]["configManager"].networkSystem
+        info = self._props[net_system._moId]["networkInfo"]
+        if any(p.spec.name == spec.name for p in info.portgroup):
+            raise vim.fault.AlreadyExists(name=spec.name)
+        if not any(v.name == spec.vswitchName for v in info.vswitch):
+            raise vim.fault.NotFound(msg=spec.vswitchName)
+        info.portgroup.append(vim.host.PortGroup(
+            key="key-vim.host.PortGroup-" + spec.name, spec=spec))
+        network = self._find_child(self._get(self.datacenter,
+                                             "networkFolder"), spec.name)
+        if network is None:
+            network = self._new(vim.Network, "network", name=spec.name,
+                                parent=None, host=[], vm=[])
+            self._adopt(self._get(self.datacenter, "networkFolder"),
+                        network)
+        self._props[network._moId]["host"].append(host)
+        self._props[host._moId]["network"].append(network)
+        self._changed.notify_all()
+        return network
+
+    # ---- Computed properties ----
+
+    def _build_VirtualMachine_summary(self, vm):
+        props = self._props[vm._moId]
+        config = props["config"]
+        nics = [d for d in config.hardware.device
+                if isinstance(d, vim.vm.device.VirtualEthernetCard)]
+        datastore = self._get(props["datastore"][0], "name")
+        return vim.vm.Summary(
+            vm=vm, runtime=props["runtime"],
+            guest=vim.vm.Summary.GuestSummary(
+                toolsStatus="toolsNotInstalled"),
+            config=vim.vm.Summary.ConfigSummary(
+                name=props["name"], template=config.template,
+                vmPathName="[%s] %s/%s.vmx" % (datastore, props["name"],
+                                               props["name"]),
+                memorySizeMB=config.hardware.memoryMB,
+                numCpu=config.hardware.numCPU, numEthernetCards=len(nics),
+                numVirtualDisks=0, uuid=config.uuid,
+                instanceUuid=config.instanceUuid, guestId=config.guestId,
+                annotation=config.annotation),
+            overallStatus="green")
+
+    def _build_VirtualMachine_network(self, vm):
+        networks = []
+        for dev in self._props[vm._moId]["config"].hardware.device:
+            if isinstance(dev, vim.vm.device.VirtualEthernetCard) and \
+                    dev.backing.network not in networks:
+                networks.append(dev.backing.network)
+        return networks
+
+    def _build_HostSystem_summary(self, host):
+        vms = self._props[host._moId]["vm"]
+        running = [v for v in vms if self._props[v._moId]["runtime"]
+                   .powerState == PowerState.poweredOn]
+        return vim.host.Summary(
+            host=host, quickStats=vim.host.Summary.QuickStats(
+                overallCpuUsage=500 * len(running),
+                overallMemoryUsage=512 * len(running)),
+            hardware=vim.host.Summary.HardwareSummary(
+                cpuMhz=2400, numCpuCores=16, memorySize=2 ** 37))
+
+    def _build_HostSystem_config(self, host):
+        net_system = self._props[host._moId]["configManager"].networkSystem
+        return vim.host.ConfigInfo(
+            host=host, network=self._props[net_system._moId]["networkInfo"])
+
+    def _build_Datastore_summary(self, datastore):
+        props = self._props[datastore._moId]
+        used = 2 ** 30 * len(props["vm"])
+        return vim.Datastore.Summary(
+            datastore=datastore, name=props["name"],
+            url="ds:///vmfs/volumes/%s/" % datastore._moId,
+            capacity=props["capacity"], uncommitted=0,
+            freeSpace=max(props["freeSpace"] - used, 0),
+            accessible=True, type="VMFS")
+
+    def _build_ContainerView_view(self, view):
+        props = self._props[view._moId]
+        found = []
+        for child in self._children(props["container"], props["recursive"]):
+            if not props["type"] or any(isinstance(child, t)
+                                        for t in props["type"]):
+                found.append(child)
+        return found
+
+    def _build_Task_info(self, task):
+        return self._props[task._moId]["info"]
+
+    def _children(self, entity, recursive):
+        props = self._props[entity._moId]
+        if isinstance(entity, vim.Datacenter):
+            kids = [props[a] for a in ("vmFolder", "hostFolder",
+                                       "datastoreFolder", "networkFolder")]
+        elif isinstance(entity, vim.ComputeResource):
+            kids = list(props["host"]) + [props["resourcePool"]]
+        elif isinstance(entity, vim.ResourcePool):
+            kids = list(props["resourcePool"])
+        else:
+            kids = list(props.get("childEntity", []))
+        for kid in kids:
+            yield kid
+            if recursive:
+                for sub in self._children(kid, recursive):
+                    yield sub
+
+    # ---- Tasks ----
+
+    def _task(self, entity, description, func, *args):
+        """ Creates a task that calls func once it's duration has passed. """
+        task = self._new(vim.Task, "task")
+        info = vim.TaskInfo(key=task._moId, task=task,
+                            descriptionId=description, entity=entity,
+                            entityName=self._props[entity._moId].get("name"),
+                            state="running", cancelable=True, cancelled=False,
+                            queueTime=datetime.now())
+        self._props[task._moId]["info"] = info
+        self._tasks[task._moId] = (time() + self.task_duration, func, args)
+        self._tick()
+        return task
+
+    def _tick(self):
+        """ Completes every task whose duration has passed. """
+        now = time()
+        for mo_id, (deadline, func, args) in list(self._tasks.items()):
+            if deadline <= now:
+                del self._tasks[mo_id]
+                info = self._props[mo_id]["info"]
+                try:
+                    info.result = func(*args)
+                    info.state = "success"
+                except vmodl.MethodFault as fault:
+                    info.error = fault
+                    info.state = "error"
+                info.completeTime = datetime.now()
+                self._changed.notify_all()
+
+    def _next_deadline(self):
+        if not self._tasks:
+            return None
+        return min(d for d, _, _ in self._tasks.values())
+
+    def _CancelTask(self, task):
+        pending = self._tasks.pop(task._moId, None)
+        if pending is not None:
+            info = self._props[task._moId]["info"]
+            info.state = "error"
+            info.cancelled = True
+            info.error = vmodl.fault.RequestCanceled()
+            self._changed.notify_all()
+
+    # ---- ServiceInstance and managers ----
+
+    def _RetrieveServiceContent(self, mo):
+        return self.content
+
+    def _CurrentTime(self, mo):
+        return datetime.now()
+
+    def _UpdateServiceMessage(self, mo, message):
+        self._props[mo._moId]["message"] = message
+
+    def _RetrieveUserGroups(self, mo, **kwargs):
+        return []
+
+    def _CreateContainerView(self, mo, container, type, recursive):
+        return self._new(vim.view.ContainerView, "session[view]",
+                         container=container, type=list(type or []),
+                         recursive=bool(recursive))
+
+    def _DestroyView(self, mo):
+        self._props.pop(mo._moId, None)
+        self._objs.pop(mo._moId, None)
+
+    def _FindByInventoryPath(self, mo, inventoryPath):
+        parts = [p for p in inventoryPath.split('/') if p]
+        current = self.content.rootFolder
+        for part in parts:
+            if isinstance(current, vim.Datacenter):
+                current = self._props[current._moId].get(part + "Folder")
+            else:
+                current = self._find_child(current, part)
+            if current is None:
+                return None
+        return current
+
+    # ---- Folders ----
+
+    def _CreateFolder(self, folder, name):
+        existing = self._find_child(folder, name)
+        if existing is not None:
+            raise vim.fault.DuplicateName(name=name, object=existing)
+        return self.add_folder(folder, name)
+
+    def _MoveIntoFolder_Task(self, folder, list):
+        def move(entities):
+            for entity in entities:
+                self._adopt(folder, entity)
+        return self._task(folder, "Folder.moveInto", move, list)
+
+    def _UnregisterAndDestroy_Task(self, folder):
+        return self._task(folder, "Folder.unregisterAndDestroy",
+                          self._remove, folder)
+
+    def _Rename_Task(self, entity, newName):
+        def rename():
+            self._props[entity._moId]["name"] = newName
+            if isinstance(entity, vim.VirtualMachine):
+                self._props[entity._moId]["config"].name = newName
+            self._changed.notify_all()
+        return self._task(entity, "%s.rename" % type(entity).__name__
+                          .split('.')[-1], rename)
+
+    def _CreateVM_Task(self, folder, config, pool, host=None):
+        def create():
+            hardware = vim.vm.VirtualHardware(numCPU=config.numCPUs or 1,
+                                              memoryMB=config.memoryMB or 512,
+                                              device=[])
+            info = vim.vm.ConfigInfo(name=config.name, template=False,
+                                     guestId=config.guestId or "otherGuest",
+                                     version=config.version or "vmx-13",
+                                     annotation=config.annotation or "",
+                                     hardware=hardware,
+                                     instanceUuid=str(uuid4()),
+                                     uuid=str(uuid4()))
+            return self._new_vm(folder, config.name, info,
+                                PowerState.poweredOff, pool,
+                                host or self.hosts[0], self.datastore)
+        return self._task(folder, "Folder.createVm", create)
+
+    # ---- Virtual Machines ----
+
+    def _vm_state(self, vm):
+        return self._props[vm._moId]["runtime"].powerState
+
+    def _CloneVM_Task(self, vm, folder, name, spec):
+        def clone():
+            if self._find_child(folder, name) is not None:
+                raise vim.fault.DuplicateName(name=name, object=folder)
+            source = self._props[vm._moId]
+            location = spec.location or vim.vm.RelocateSpec()
+            if location.diskMoveType == "createNewChildDiskBacking" and \
+                    spec.snapshot is None:
+                raise vmodl.fault.InvalidArgument(invalidProperty="snapshot")
+            config = deepcopy(source["config"])
+            config.name = name
+            config.template = bool(spec.template)
+            config.instanceUuid = str(uuid4())
+            config.uuid = str(uuid4())
+            new = self._new_vm(folder, name, config,
+                               PowerState.poweredOff,
+                               location.pool or source["resourcePool"],
+                               location.host or source["runtime"].host,
+                               location.datastore or source["datastore"][0])
+            if spec.config is not None:
+                self._reconfigure(new, spec.config)
+            if spec.powerOn:
+                self._props[new._moId]["runtime"].powerState = \
+                    PowerState.poweredOn
+            return new
+        return self._task(vm, "VirtualMachine.clone", clone)
+
+    def _InstantClone_Task(self, vm, spec):
+        if self._vm_state(vm) != PowerState.poweredOn:
+            raise vim.fault.InvalidPowerState(
+                requestedState=PowerState.poweredOn,
+                existingState=self._vm_state(vm))
+
+        def clone():
+            source = self._props[vm._moId]
+            location = spec.location or vim.vm.RelocateSpec()
+            folder = location.folder or source["parent"]
+            if self._find_child(folder, spec.name) is not None:
+                raise vim.fault.DuplicateName(name=spec.name, object=folder)
+            config = deepcopy(source["config"])
+            config.name = spec.name
+            config.instanceUuid = str(uuid4())
+            config.uuid = str(uuid4())
+            new = self._new_vm(folder, spec.name, config,
+                               PowerState.poweredOn,
+                               location.pool or source["resourcePool"],
+                               source["runtime"].host,
+                               location.datastore or source["datastore"][0])
+            if location.deviceChange:
+                self._reconfigure(new, vim.vm.ConfigSpec(
+                    deviceChange=location.deviceChange))
+            return new
+        return self._task(vm, "VirtualMachine.instantClone", clone)
+
+    def _Destroy_Task(self, vm):
+        def destroy():
+            if isinstance(vm, vim.VirtualMachine) and \
+                    self._vm_state(vm) == PowerState.poweredOn:
+                raise vim.fault.InvalidPowerState(
+                    requestedState=PowerState.poweredOff,
+                    existingState=PowerState.poweredOn)
+            self._remove(vm)
+        return self._task(vm, "%s.destroy" % type(vm).__name__
+                          .split('.')[-1], destroy)
+
+    def _set_power(self, vm, state, description):
+        def change():
+            runtime = self._props[vm._moId]["runtime"]
+            if self._props[vm._moId]["config"].template:
+                raise vim.fault.InvalidState()
+            if runtime.powerState == state and \
+                    description != "VirtualMachine.reset":
+                raise vim.fault.InvalidPowerState(
+                    requestedState=state, existingState=runtime.powerState)
+            runtime.powerState = state
+            self._changed.notify_all()
+        return self._task(vm, description, change)
+
+    def _PowerOnVM_Task(self, vm, host=None):
+        return self._set_power(vm, PowerState.poweredOn,
+                               "VirtualMachine.powerOn")
+
+    def _PowerOffVM_Task(self, vm):
+        return self._set_power(vm, PowerState.poweredOff,
+                               "VirtualMachine.powerOff")
+
+    def _SuspendVM_Task(self, vm):
+        return self._set_power(vm, PowerState.suspended,
+                               "VirtualMachine.suspend")
+
+    def _ResetVM_Task(self, vm):
+        return self._set_power(vm, PowerState.poweredOn,
+                               "VirtualMachine.reset")
+
+    def _ShutdownGuest(self, vm):
+        raise vim.fault.ToolsUnavailable()
+
+    _RebootGuest = _StandbyGuest = _ShutdownGuest
+
+    def _MarkAsTemplate(self, vm):
+        if self._vm_state(vm) != PowerState.poweredOff:
+            raise vim.fault.InvalidPowerState(
+                requestedState=PowerState.poweredOff,
+                existingState=self._vm_state(vm))
+        self._props[vm._moId]["config"].template = True
+        self._changed.notify_all()
+
+    def _MarkAsVirtualMachine(self, vm, pool, host=None):
+        self._props[vm._moId]["config"].template = False
+        self._changed.notify_all()
+
+    def _ReconfigVM_Task(self, vm, spec):
+        return self._task(vm, "VirtualMachine.reconfigure",
+                          self._reconfigure, vm, spec)
+
+    def _reconfigure(self, vm, spec):
+        config = self._props[vm._moId]["config"]
+        if spec.annotation is not None:
+            config.annotation = spec.annotation
+        if spec.numCPUs is not None:
+            config.hardware.numCPU = spec.numCPUs
+        if spec.memoryMB is not None:
+            config.hardware.memoryMB = spec.memoryMB
+        devices = config.hardware.device
+        for change in spec.deviceChange or []:
+            device = change.device
+            if change.operation == "add":
+                device = deepcopy(device)
+                nics = [d for d in devices
+                        if isinstance(d, vim.vm.device.VirtualEthernetCard)]
+                device.key = 4000 + len(devices) + 1
+                if device.deviceInfo is None:
+                    device.deviceInfo = vim.Description()
+                device.deviceInfo.label = "Network adapter %d" \
+                                          % (len(nics) + 1)
+                devices.append(device)
+            elif change.operation == "edit":
+                for i, dev in enumerate(devices):
+                    if dev.key == device.key:
+                        devices[i] = deepcopy(device)
+            elif change.operation == "remove":
+                for dev in list(devices):
+                    if dev.key == device.key:
+                        devices.remove(dev)
+        self._changed.notify_all()
+
+    def _CreateSnapshot_Task(self, vm, name, description, memory, quiesce):
+        def snapshot():
+            snap = self._new(vim.vm.Snapshot, "snapshot", vm=vm,
+                             config=deepcopy(self._props[vm._moId]["config"]))
+            tree = vim.vm.SnapshotTree(snapshot=snap, vm=vm, name=name,
+                                       description=description,
+                                       id=next(self._ids),
+                                       createTime=datetime.now(),
+                                       state=self._vm_state(vm),
+                                       quiesced=bool(quiesce),
+                                       childSnapshotList=[])
+            info = self._props[vm._moId]["snapshot"]
+            if info is None:
+                info = vim.vm.SnapshotInfo(rootSnapshotList=[tree])
+                self._props[vm._moId]["snapshot"] = info
+            else:
+                parent = self._find_snapshot(info.rootSnapshotList,
+                                             info.currentSnapshot)
+                parent.childSnapshotList.append(tree)
+            info.currentSnapshot = snap
+            self._props[snap._moId]["tree"] = tree
+            self._changed.notify_all()
+            return snap
+        return self._task(vm, "VirtualMachine.createSnapshot", snapshot)
+
+    def _find_snapshot(self, trees, snap):
+        for tree in trees:
+            if tree.snapshot == snap:
+                return tree
+            found = self._find_snapshot(tree.childSnapshotList, snap)
+            if found is not None:
+                return found
+        return None
+
+    def _RevertToCurrentSnapshot_Task(self, vm, host=None,
+                                      suppressPowerOn=None):
+        return self._task(vm, "VirtualMachine.revertToCurrentSnapshot",
+                          lambda: None)
+
+    def _RevertToSnapshot_Task(self, snap, host=None, suppressPowerOn=None):
+        vm = self._props[snap._moId]["vm"]
+
+        def revert():
+            self._props[vm._moId]["snapshot"].currentSnapshot = snap
+        return self._task(vm, "vm.Snapshot.revert", revert)
+
+    def _RemoveAllSnapshots_Task(self, vm, consolidate=None, spec=None):
+        def remove():
+            self._props[vm._moId]["snapshot"] = None
+        return self._task(vm, "VirtualMachine.removeAllSnapshots", remove)
+
+    def _RemoveSnapshot_Task(self, snap, removeChildren, consolidate=None):
+        vm = self._props[snap._moId]["vm"]
+
+        def remove():
+            info = self._props[vm._moId]["snapshot"]
+            trees = [info.rootSnapshotList]
+            while trees:
+                level = trees.pop()
+                for tree in list(level):
+                    if tree.snapshot == snap:
+                        level.remove(tree)
+                        if not removeChildren:
+                            level.extend(tree.childSnapshotList)
+                    else:
+                        trees.append(tree.childSnapshotList)
+            if info.currentSnapshot == snap:
+                info.currentSnapshot = None
+        return self._task(vm, "vm.Snapshot.remove", remove)
+
+    # ---- Host networking ----
+
+    def _AddPortGroup(self, net_system, portgrp):
+        self._add_portgroup(self._props[net_system._moId]["host"], portgrp)
+
+    def _RemovePortGroup(self, net_system, pgName):
+        host = self._props[net_system._moId]["host"]
+        info = self._props[net_system._moId]["networkInfo"]
+        for portgroup in list(info.portgroup):
+            if portgroup.spec.name == pgName:
+                info.portgroup.remove(portgroup)
+                break
+        else:
+            raise vim.fault.NotFound(msg=pgName)
+        for network in list(self._props[host._moId]["network"]):
+            props = self._props[network._moId]
+            if props["name"] == pgName:
+                self._props[host._moId]["network"].remove(network)
+                props["host"].remove(host)
+                if not props["host"] and not props["vm"]:
+                    self._remove(network)
+        self._changed.notify_all()
+
+    def _RefreshNetworkSystem(self, net_system):
+        pass
+
+    # ---- Property Collector ----
+
+    def _CreatePropertyCollector(self, collector):
+        new = self._new(vmodl.query.PropertyCollector, "session[pc]")
+        self._collectors[new._moId] = []
+        return new
+
+    def _DestroyPropertyCollector(self, collector):
+        for filter_id in self._collectors.pop(collector._moId, []):
+            self._filters.pop(filter_id, None)
+
+    def _CreateFilter(self, collector, spec, partialUpdates):
+        filter_mo = self._new(vmodl.query.PropertyCollector.Filter, "filter")
+        self._filters[filter_mo._moId] = {"spec": spec, "reported": {},
+                                          "collector": collector}
+        self._collectors[collector._moId].append(filter_mo._moId)
+        self._changed.notify_all()  # Wake waiters to report the new filter
+        return filter_mo
+
+    def _DestroyPropertyFilter(self, filter_mo):
+        state = self._filters.pop(filter_mo._moId, None)
+        if state is not None:
+            self._collectors[state["collector"]._moId].remove(
+                filter_mo._moId)
+
+    def _RetrievePropertiesEx(self, collector, specSet, options=None):
+        contents = []
+        for spec in specSet:
+            contents.extend(self._collect(spec))
+        return self._page(contents, options)
+
+    def _ContinueRetrievePropertiesEx(self, collector, token):
+        if token not in self._results:
+            raise vmodl.fault.InvalidArgument(invalidProperty="token")
+        contents, max_objects = self._results.pop(token)
+        return self._page(contents, max_objects)
+
+    def _CancelRetrievePropertiesEx(self, collector, token):
+        self._results.pop(token, None)
+
+    def _page(self, contents, options):
+        if not contents:
+            return None
+        max_objects = options if isinstance(options, int) else \
+            (options.maxObjects if options is not None else None)
+        result = vmodl.query.PropertyCollector.RetrieveResult()
+        if max_objects and len(contents) > max_objects:
+            token = str(uuid4())
+            self._results[token] = (contents[max_objects:], max_objects)
+            result.token = token
+            contents = contents[:max_objects]
+        result.objects = contents
+        return result
+
+    def _collect(self, spec):
+        """ Evaluates a FilterSpec into a list of ObjectContent. """
+        named = {}
+        for obj_spec in spec.objectSet:
+            self._name_specs(obj_spec.selectSet or [], named)
+        found = []
+        for obj_spec in spec.objectSet:
+            if obj_spec.obj._moId not in self._props:
+                continue
+            if not obj_spec.skip:
+                found.append(obj_spec.obj)
+            self._traverse(obj_spec.obj, obj_spec.selectSet or [],
+                           named, found, set())
+        contents = []
+        seen = set()
+        for obj in found:
+            if obj._moId in seen:
+                continue
+            seen.add(obj._moId)
+            content = self._content(obj, spec.propSet)
+            if content is not None:
+                contents.append(content)
+        return contents
+
+    def _name_specs(self, select_set, named):
+        for sel in select_set:
+            if isinstance(sel, vmodl.query.PropertyCollector.TraversalSpec):
+                if sel.name:
+                    named[sel.name] = sel
+                self._name_specs(sel.selectSet or [], named)
+
+    def _traverse(self, obj, select_set, named, found, visited):
+        for sel in select_set:
+            if not isinstance(sel,
+                              vmodl.query.PropertyCollector.TraversalSpec):
+                sel = named.get(sel.name)
+                if sel is None:
+                    continue
+            if not isinstance(obj, sel.type):
+                continue
+            key = (obj._moId, sel.name or sel.path)
+            if key in visited:
+                continue
+            visited.add(key)
+            targets = self._get(obj, sel.path)
+            if targets is None:
+                continue
+            if not isinstance(targets, list):
+                targets = [targets]
+            for target in targets:
+                if not isinstance(target, ManagedObject) or \
+                        target._moId not in self._props:
+                    continue
+                if not sel.skip:
+                    found.append(target)
+                self._traverse(target, sel.selectSet or [], named,
+                               found, visited)
+
+    def _content(self, obj, prop_specs):
+        matched = [p for p in prop_specs if isinstance(obj, p.type)]
+        if not matched:
+            return None
+        content = vmodl.query.PropertyCollector.ObjectContent(obj=obj,
+                                                              propSet=[])
+        for prop_spec in matched:
+            for path in prop_spec.pathSet or []:
+                value = self._get(obj, path)
+                if isinstance(value, list):  # Arrays must be typed
+                    value = _typed_array(value)
+                if value is not None:
+                    content.propSet.append(
+                        vmodl.DynamicProperty(name=path, val=value))
+        return content
+
+    def _WaitForUpdatesEx(self, collector, version=None, options=None):
+        max_wait = options.maxWaitSeconds if options is not None else None
+        end = None if max_wait is None else time() + max_wait
+        while True:
+            self._tick()
+            update = self._updates(collector)
+            if update is not None:
+                return update
+            now = time()
+            if end is not None and now >= end:
+                return None
+            timeout = None if end is None else end - now
+            deadline = self._next_deadline()
+            if deadline is not None:
+                wait = max(deadline - now, 0.001)
+                timeout = wait if timeout is None else min(timeout, wait)
+            self._changed.wait(timeout)
+
+    def _updates(self, collector):
+        filter_set = []
+        for filter_id in self._collectors.get(collector._moId, []):
+            state = self._filters[filter_id]
+            reported = state["reported"]
+            current = {}
+            for content in self._collect(state["spec"]):
+                current[content.obj._moId] = (content.obj, dict(
+                    (p.name, p.val) for p in content.propSet))
+            object_set = []
+            for mo_id, (obj, values) in current.items():
+                old = reported.get(mo_id)
+                if old is None:
+                    kind = "enter"
+                    changed = values
+                else:
+                    kind = "modify"
+                    changed = dict((k, v) for k, v in values.items()
+                                   if not _same(old[1].get(k), v))
+                    changed.update((k, None) for k in old[1]
+                                   if k not in values)
+                    if not changed:
+                        continue
+                object_set.append(vmodl.query.PropertyCollector.ObjectUpdate(
+                    kind=kind, obj=obj, changeSet=[
+                        vmodl.query.PropertyCollector.Change(
+                            name=k, op="assign", val=v)
+                        for k, v in changed.items()]))
+            for mo_id, (obj, _) in reported.items():
+                if mo_id not in current:
+                    object_set.append(
+                        vmodl.query.PropertyCollector.ObjectUpdate(
+                            kind="leave", obj=obj, changeSet=[]))
+            state["reported"] = dict((k, (o, deepcopy(v)))
+                                     for k, (o, v) in current.items())
+            if object_set:
+                filter_set.append(vmodl.query.PropertyCollector.FilterUpdate(
+                    filter=self._objs[filter_id], objectSet=object_set))
+        if not filter_set:
+            return None
+        return vmodl.query.PropertyCollector.UpdateSet(
+            version=str(next(self._version)), filterSet=filter_set)
+
+
+def _typed_array(values):
+    """ Converts a list into the array type the property collector returns. """
+    if all(isinstance(v, ManagedObject) for v in values):
+        return ManagedObject.Array(values)
+    if values and all(type(v) is type(values[0]) for v in values):
+        return type(values[0]).Array(values)
+    return values
+
+
+def _same(old, new):
+    """ Compares property values as reported by the property collector. """
+    if isinstance(new, ManagedObject) or \
+            isinstance(old, ManagedObject):
+        return old == new
+    return str(old) == str(new)
@@ -14,11 +14,36 @@
 
 import logging
 import os
+from time import time
 
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
 
 import adles.utils as utils
 from adles.vsphere.folder_utils import find_in_folder
+from adles.vsphere.inventory import get_inventory, retrieve_properties
+from adles.vsphere.vsphere_utils import get_content, wait_for_tasks
+
+# Attribute of the wrapper -> Property of the VM it's cached from
+VM_FIELDS = {
+    "name": "name",
+    "folder": "parent",
+    "resource_pool": "resourcePool",
+    "datastore": "datastore",
+    "host": "runtime.host",
+    "power_state": "runtime.powerState",
+    "template": "config.template",
+    "uuid": "config.instanceUuid",
+    "memory": "summary.config.memorySizeMB",
+    "storage": "summary.storage.committed"
+}
+
+# Power state of a VM after a successful change_state, by the state given
+_POWER_STATES = {
+    "on": vim.VirtualMachine.PowerState.poweredOn,
+    "off": vim.VirtualMachine.PowerState.poweredOff,
+    "reset": vim.VirtualMachine.PowerState.poweredOn,
+    "suspend": vim.VirtualMachine.PowerState.suspended
+}
 
 
 # Docs:
@@ -27,10 +52,20 @@ from adles.vsphere.folder_utils import find_in_folder
 class VM:
     """ Represents a VMware vSphere Virtual Machine instance.
 
+    The wrapper keeps the VM and a few of its fields, as they were when it
+    was created or last refreshed with :meth:`refresh`. The summary,
+    runtime and networks of the VM are fetched when they're used,
+    and reused for :attr:`ttl` seconds.
+
     .. warning::    You must call :meth:`create` if a vim.VirtualMachine object
                     is not used to initialize the instance.
     """
-    __version__ = "0.7.2"
+    __version__ = "0.14.0"
+    __slots__ = ("_vm", "name", "folder", "resource_pool", "datastore",
+                 "host", "power_state", "template", "uuid", "memory",
+                 "storage", "refreshed", "_live")
+    _log = logging.getLogger('VM')
+    ttl = 5.0  # Seconds that live data is reused for
 
     def __init__(self, vm=None, name=None, folder=None, resource_pool=None,
                  datastore=None, host=None):
@@ -47,28 +82,129 @@ class VM:
         :param host: Host the VM runs on
         :type host: vim.HostSystem
         """
-        self._log = logging.getLogger('VM')
+        self._vm = None
+        self.name = name
+        self.folder = folder  # vim.Folder that will contain the VM
+        self.resource_pool = resource_pool  # vim.ResourcePool to use VM
+        self.datastore = datastore  # vim.Datastore object to store VM on
+        self.host = host  # vim.HostSystem
+        self.power_state = None
+        self.template = None
+        self.uuid = None  # Instance UUID
+        self.memory = None  # MB
+        self.storage = None  # Committed bytes
+        self.refreshed = None  # When the fields were retrieved
+        self._live = None  # Property -> (When retrieved, value)
         if vm is not None:
             self._vm = vm
-            self.name = vm.name
-            self.folder = vm.parent
-            self.resource_pool = vm.resourcePool
-            self.datastore = vm.datastore[0]
-            self.host = vm.summary.runtime.host
-            self.network = vm.network
-            self.runtime = vm.runtime
-            self.summary = vm.summary
-        else:
-            self._vm = None
-            self.name = name
-            self.folder = folder  # vim.Folder that will contain the VM
-            self.resource_pool = resource_pool  # vim.ResourcePool to use VM
-            self.datastore = datastore  # vim.Datastore object to store VM on
-            self.host = host  # vim.HostSystem
+            if not self.refresh():
+                self._log.error("Could not retrieve the properties of VM %s",
+                                str(vm._moId))
+
+    @classmethod
+    def from_many(cls, vms):
+        """
+        Creates wrappers for VMs, retrieving the fields
+        of all of them with a single call to the server.
+
+        :param vms: VMs to wrap
+        :type vms: list(vim.VirtualMachine)
+        :return: Wrappers of the VMs that exist, in the same order
+        :rtype: list(:class:`VM`)
+        """
+        vms = list(vms)
+        found = _retrieve_vm_properties(vms, list(VM_FIELDS.values()))
+        wrappers = []
+        for vm in vms:
+            props = found.get(vm._moId)
+            if props is None:
+                cls._log.warning("VM %s no longer exists, skipping it",
+                                 str(vm._moId))
+                continue
+            wrapper = cls()
+            wrapper._vm = vm
+            wrapper._fill(props)
+            wrappers.append(wrapper)
+        return wrappers
+
+    def refresh(self):
+        """
+        Retrieves the fields of the VM from the server,
+        and forgets the live data that was fetched.
+
+        :return: If the VM still exists
+        :rtype: bool
+        """
+        self._live = None
+        props = _retrieve_vm_properties(
+            [self._vm], list(VM_FIELDS.values())).get(self._vm._moId)
+        if props is None:
+            return False
+        self._fill(props)
+        return True
+
+    def _fill(self, props):
+        """
+        Sets the fields of the wrapper from the properties of the VM.
+
+        :param dict props: Path -> value of the properties in VM_FIELDS
+        """
+        for field, path in VM_FIELDS.items():
+            setattr(self, field, props.get(path))
+        self.datastore = self.datastore[0] if self.datastore else None
+        self.refreshed = time()
+
+    def _get_live(self, path):
+        """
+        Gets a property of the VM, fetching it
+        if it wasn't fetched in the last :attr:`ttl` seconds.
+
+        :param str path: Path of the property
+        :return: Value of the property
+        """
+        if self._live is None:
+            self._live = {}
+        cached = self._live.get(path)
+        if cached is not None and time() - cached[0] < self.ttl:
+            return cached[1]
+        props = _retrieve_vm_properties([self._vm],
+                                        [path]).get(self._vm._moId, {})
+        value = props.get(path)
+        self._live[path] = (time(), value)
+        return value
+
+    def _changed(self, **fields):
+        """
+        Forgets the live data after the VM was changed, so it's fetched
+        again when it's next used, and sets the fields that were changed.
+
+        :param fields: Field -> the value it was changed to
+        """
+        self._live = {}
+        now = time()
+        for field, value in fields.items():
+            setattr(self, field, value)
+            self._live[VM_FIELDS[field]] = (now, value)
+
+    @property
+    def summary(self):
+        """ Summary of the VM (vim.vm.Summary), fetched when used """
+        return self._get_live("summary")
+
+    @property
+    def runtime(self):
+        """ Runtime information of the VM (vim.vm.RuntimeInfo) """
+        return self._get_live("runtime")
+
+    @property
+    def network(self):
+        """ Networks the VM is connected to (list(vim.Network)) """
+        return self._get_live("network") or []
 
     def create(self, template=None, cpus=None, cores=None, memory=None,
                max_consoles=None, version=None, firmware='efi',
-               datastore_path=None):
+               datastore_path=None, clone_mode='full', snapshot=None,
+               device_changes=None, note=None):
         """
         Creates a Virtual Machine.
 
@@ -82,19 +218,89 @@ class VM:
         [default: highest host supports]
         :param str firmware: Firmware to emulate for the VM (efi | bios)
         :param str datastore_path: Path to existing VM files on datastore
+        :param str clone_mode: How to clone the template
+        (full | linked | instant). Linked clones share the disks of a
+        snapshot of the template, instant clones share the memory
+        and disks of the running template.
+        :param snapshot: Snapshot to create a linked clone from
+        [default: current snapshot of the template]
+        :type snapshot: vim.vm.Snapshot
+        :param device_changes: Changes to the devices of the template
+        to make to the clone as it's created
+        :type device_changes: :class:`DeviceChanges`
+        :param str note: Note to set on the VM
         :return: If the creation was successful
         :rtype: bool
         """
+        started = self._start_create(template, cpus, cores, memory,
+                                     max_consoles, version, firmware,
+                                     datastore_path, clone_mode, snapshot,
+                                     device_changes, note)
+        if started is None:
+            return False
+        task, config = started
+        return self._finish_create(task.wait(120), template, config)
+
+    def _start_create(self, template=None, cpus=None, cores=None, memory=None,
+                      max_consoles=None, version=None, firmware='efi',
+                      datastore_path=None, clone_mode='full', snapshot=None,
+                      device_changes=None, note=None):
+        """
+        Starts the task that creates the VM. The parameters are the same
+        as :meth:`create`, which waits for the task and then calls
+        :meth:`_finish_create`.
+
+        :return: The task, and the changes to make to the VM once it's
+        created, or None if the task couldn't be started
+        :rtype: tuple(vim.Task, vim.vm.ConfigSpec) or None
+        """
         if template is not None:  # Use a template to create the VM
-            self._log.debug("Creating VM '%s' by cloning %s",
-                            self.name, template.name)
-            clonespec = vim.vm.CloneSpec()
-            clonespec.location = vim.vm.RelocateSpec(pool=self.resource_pool,
-                                                     datastore=self.datastore)
-            if not template.CloneVM_Task(folder=self.folder, name=self.name,
-                                         spec=clonespec).wait(120):
-                self._log.error("Error cloning VM %s", self.name)
-                return False
+            self._log.debug("Creating VM '%s' by %s cloning %s",
+                            self.name, clone_mode, template.name)
+            location = vim.vm.RelocateSpec(pool=self.resource_pool,
+                                           datastore=self.datastore)
+            config = _resource_spec(cpus, cores, memory, max_consoles)
+            if note is not None:
+                config.annotation = str(note)
+            if device_changes is not None:
+                device_changes.config_spec(config)
+            if clone_mode == "instant":
+                location.folder = self.folder
+                # Instant clones can only change the network of devices
+                # as they're created, the rest is changed afterwards
+                edit = vim.vm.device.VirtualDeviceSpec.Operation.edit
+                location.deviceChange = [c for c in config.deviceChange
+                                         if c.operation == edit]
+                config.deviceChange = [c for c in config.deviceChange
+                                       if c.operation != edit]
+                spec = vim.vm.InstantCloneSpec(name=self.name,
+                                               location=location)
+                task = template.InstantClone_Task(spec=spec)
+            elif clone_mode in ("full", "linked"):
+                # Instant clones always run on the same host as the source,
+                # so only full and linked clones are put on the VM's host
+                location.host = self.host
+                clonespec = vim.vm.CloneSpec(location=location)
+                if _has_changes(config):
+                    clonespec.config = config
+                config = None  # The clone is created with the changes
+                if clone_mode == "linked":
+                    if snapshot is None and template.snapshot is not None:
+                        snapshot = template.snapshot.currentSnapshot
+                    if snapshot is None:
+                        self._log.error("Cannot create linked clone %s: "
+                                        "%s has no snapshot",
+                                        self.name, template.name)
+                        return None
+                    clonespec.snapshot = snapshot
+                    location.diskMoveType = "createNewChildDiskBacking"
+                task = template.CloneVM_Task(folder=self.folder,
+                                             name=self.name, spec=clonespec)
+            else:
+                self._log.error("Invalid clone mode '%s' for VM %s",
+                                clone_mode, self.name)
+                return None
+            return task, config
         else:  # Generate the specification for and create the new VM
             self._log.debug("Creating VM '%s' from scratch", self.name)
             spec = vim.vm.ConfigSpec()
@@ -109,6 +315,8 @@ class VM:
                 spec.version = "vmx-" + str(version)
             if max_consoles is not None:
                 spec.maxMksConnections = int(max_consoles)
+            if note is not None:
+                spec.annotation = str(note)
             vm_path = '[' + self.datastore.name + '] '
             if datastore_path:
                 vm_path += str(datastore_path)
@@ -116,22 +324,40 @@ class VM:
             spec.files = vim.vm.FileInfo(vmPathName=vm_path)
             self._log.debug("Creating VM '%s' in folder '%s'",
                             self.name, self.folder.name)
-            if not self.folder.CreateVM_Task(spec, self.resource_pool,
-                                             self.host).wait():
-                self._log.error("Error creating VM %s", self.name)
-                return False
+            return self.folder.CreateVM_Task(spec, self.resource_pool,
+                                             self.host), None
+
+    def _finish_create(self, created, template=None, config=None):
+        """
+        Finishes creating the VM once the task creating it is done.
 
-        self._vm = find_in_folder(self.folder, self.name,
-                                  vimtype=vim.VirtualMachine)
+        :param created: Result of the task started by :meth:`_start_create`
+        :param template: Template the VM was cloned from
+        :type template: vim.VirtualMachine
+        :param config: Changes to make to the VM that couldn't be made
+        when it was cloned
+        :type config: vim.vm.ConfigSpec
+        :return: If the creation was successful
+        :rtype: bool
+        """
+        if not created:
+            self._log.error("Error %s VM %s", "cloning" if template is not None
+                            else "creating", self.name)
+            return False
+        if isinstance(created, vim.VirtualMachine):  # Task result is the VM
+            self._vm = created
+            inventory = get_inventory(self.folder)
+            if inventory is not None:
+                inventory.add(self._vm, self.name, self.folder)
+        else:
+            self._vm = find_in_folder(self.folder, self.name,
+                                      vimtype=vim.VirtualMachine)
         if not self._vm:
             self._log.error("Failed to make VM %s", self.name)
             return False
-        self.network = self._vm.network
-        self.runtime = self._vm.runtime
-        self.summary = self._vm.summary
-        if template is not None:  # Edit resources for a clone if specified
-            self.edit_resources(cpus=cpus, cores=cores, memory=memory,
-                                max_consoles=max_consoles)
+        self.refresh()
+        if template is not None and _has_changes(config):
+            self._edit(config)  # Changes that couldn't be made when cloning
 
         self._log.debug("Created VM %s", self.name)
         return True
@@ -141,7 +367,10 @@ class VM:
         self._log.debug("Destroying VM %s", self.name)
         if self.powered_on():
             self.change_state("off")
-        self._vm.Destroy_Task().wait()
+        _, outcomes = wait_for_tasks([self._vm.Destroy_Task()])
+        inventory = get_inventory(self._vm)
+        if inventory is not None and outcomes[0] == "success":
+            inventory.remove(self._vm)
 
     def change_state(self, state, attempt_guest=True):
         """
@@ -158,8 +387,9 @@ class VM:
                             "cannot be changed to '%s'",
                             self.name, state)
         # Can't power on using guest ops
-        elif attempt_guest and self.has_tools() and state != "on":
-            if self._vm.summary.guest.toolsStatus == "toolsNotInstalled":
+        elif attempt_guest and state != "on" and self.has_tools():
+            if self._get_live("summary.guest.toolsStatus") == \
+                    "toolsNotInstalled":
                 self._log.error("Cannot change a VM's guest power state "
                                 "without VMware Tools!")
                 return False
@@ -179,6 +409,7 @@ class VM:
             except vim.fault.ToolsUnavailable:
                 self._log.error("Can't change guest state of '%s': "
                                 "Tools aren't running", self.name)
+            self._changed()  # The guest changes it's state in the background
         else:
             if state == "on":
                 task = self._vm.PowerOnVM_Task()
@@ -194,7 +425,12 @@ class VM:
                 return False
             self._log.debug("Changing power state of VM %s to: '%s'",
                             self.name, state)
-            return bool(task.wait())
+            _, outcomes = wait_for_tasks([task])
+            if outcomes[0] != "success":
+                self._changed()
+                return False
+            self._changed(power_state=_POWER_STATES[state])
+            return True
 
     def edit_resources(self, cpus=None, cores=None,
                        memory=None, max_consoles=None):
@@ -207,16 +443,7 @@ class VM:
         :param int max_consoles: Maximum number of simultaneous 
         Mouse-Keyboard-Screen (MKS) console connections
         """
-        spec = vim.vm.ConfigSpec()
-        if cpus is not None:
-            spec.numCPUs = int(cpus)
-        if cores is not None:
-            spec.numCoresPerSocket = int(cores)
-        if memory is not None:
-            spec.memoryMB = int(memory)
-        if max_consoles is not None:
-            spec.maxMksConnections = int(max_consoles)
-        self._edit(spec)
+        self._edit(_resource_spec(cpus, cores, memory, max_consoles))
 
     def rename(self, name):
         """
@@ -225,10 +452,14 @@ class VM:
         :param str name: New name for the VM
         """
         self._log.debug("Renaming VM %s to %s", self.name, name)
-        if not self._vm.Rename_Task(newName=str(name)).wait():
+        _, outcomes = wait_for_tasks([self._vm.Rename_Task(newName=str(name))])
+        if outcomes[0] != "success":
             self._log.error("Failed to rename VM %s to %s", self.name, name)
         else:
             self.name = str(name)
+            inventory = get_inventory(self._vm)
+            if inventory is not None:
+                inventory.rename(self._vm, self.name)
 
     def upgrade(self, version):
         """
@@ -250,11 +481,13 @@ class VM:
         else:
             self._log.debug("Converting '%s' to Template", self.name)
             self._vm.MarkAsTemplate()
+            self._changed(template=True)
 
     def convert_vm(self):
         """ Converts a Template to a Virtual Machine """
         self._log.debug("Converting '%s' to VM", self.name)
         self._vm.MarkAsVirtualMachine(self.resource_pool, self.host)
+        self._changed(template=False)
 
     def set_note(self, note):
         """
@@ -355,11 +588,13 @@ class VM:
         self._log.info("Reverting '%s' to the snapshot '%s'",
                        self.name, snapshot)
         self.get_snapshot(snapshot).RevertToSnapshot_Task().wait()
+        self._changed()  # The snapshot can have a different power state
 
     def revert_to_current_snapshot(self):
         """ Reverts the VM to the most recent snapshot """
         self._log.info("Reverting '%s' to the current snapshot", self.name)
         self._vm.RevertToCurrentSnapshot_Task().wait()
+        self._changed()
 
     def remove_snapshot(self, snapshot, remove_children=True,
                         consolidate_disks=True):
@@ -385,7 +620,16 @@ class VM:
         self._log.info("Removing ALL snapshots for %s", self.name)
         self._vm.RemoveAllSnapshots_Task(consolidate_disks).wait()
 
-    # Originally based on: add_nic_to_vm in pyvmomi-community-samples
+    def device_changes(self):
+        """
+        Starts a set of changes to the devices of the VM,
+        that are made in a single reconfiguration.
+
+        :return: The changes
+        :rtype: :class:`DeviceChanges`
+        """
+        return DeviceChanges(self)
+
     def add_nic(self, network, summary="default-summary", model="e1000"):
         """
         Add a NIC in the portgroup to the VM.
@@ -404,61 +648,9 @@ class VM:
         `Read this for more details: 
         <http://rickardnobel.se/vmxnet3-vs-e1000e-and-e1000-part-1/>`_
         """
-        if not isinstance(network, vim.Network):
-            self._log.error("Invalid network type when adding vNIC "
-                            "to VM '%s': %s", self.name, type(network).__name__)
-        self._log.debug("Adding NIC to VM '%s'\nNetwork: '%s'"
-                        "\tSummary: '%s'\tNIC Model: '%s'",
-                        self.name, network.name, summary, model)
-
-        # Create base object to add configurations to
-        spec = vim.vm.device.VirtualDeviceSpec()
-        spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.add
-
-        # Set the type of network adapter
-        if model == "e1000":
-            spec.device = vim.vm.device.VirtualE1000()
-        elif model == "e1000e":
-            spec.device = vim.vm.device.VirtualE1000e()
-        elif model == "vmxnet":
-            spec.device = vim.vm.device.VirtualVmxnet()
-        elif model == "vmxnet2":
-            spec.device = vim.vm.device.VirtualVmxnet2()
-        elif model == "vmxnet3":
-            spec.device = vim.vm.device.VirtualVmxnet3()
-        elif model == "pcnet32":
-            spec.device = vim.vm.device.VirtualPCNet32()
-        elif model == "sriov":
-            spec.device = vim.vm.device.VirtualSriovEthernetCard()
-        else:
-            self._log.error("Invalid NIC model: '%s'\n"
-                            "Defaulting to e1000...", model)
-            spec.device = vim.vm.device.VirtualE1000()
-
-        # Sets how MAC address is assigned
-        spec.device.addressType = 'generated'
-        # Disables Wake-on-lan capabilities
-        spec.device.wakeOnLanEnabled = False
-
-        spec.device.deviceInfo = vim.Description()
-        spec.device.deviceInfo.summary = summary
-
-        spec.device.backing = \
-            vim.vm.device.VirtualEthernetCard.NetworkBackingInfo()
-        spec.device.backing.useAutoDetect = False
-        # Sets port group to assign adapter to
-        spec.device.backing.network = network
-        # Sets name of device on host system
-        spec.device.backing.deviceName = network.name
-
-        spec.device.connectable = vim.vm.device.VirtualDevice.ConnectInfo()
-        # Ensures adapter is connected at boot
-        spec.device.connectable.startConnected = True
-        # Allows guest OS to control device
-        spec.device.connectable.allowGuestControl = True
-        spec.device.connectable.connected = True
-        spec.device.connectable.status = 'untried'
-        self._edit(vim.vm.ConfigSpec(deviceChange=[spec]))  # Apply change to VM
+        changes = self.device_changes()
+        changes.add_nic(network, summary=summary, model=model)
+        changes.apply()
 
     def edit_nic(self, nic_id, network=None, summary=None):
         """
@@ -469,26 +661,10 @@ class VM:
         :type network: vim.Network
         :param str summary: Human-readable device description
         """
-        nic_label = 'Network adapter ' + str(nic_id)
-        self._log.debug("Changing '%s' on VM '%s'", nic_label, self.name)
-        virtual_nic_device = self.get_nic_by_name(nic_label)
-        if not virtual_nic_device:
-            self._log.error('Virtual %s could not be found!', nic_label)
-            return
-        nic_spec = vim.vm.device.VirtualDeviceSpec()
-        nic_spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.edit
-        nic_spec.device = virtual_nic_device
-        if summary:
-            nic_spec.device.deviceInfo.summary = str(summary)
-        if network:
-            self._log.debug("Changing PortGroup to: '%s'", network.name)
-            nic_spec.device.backing.network = network
-            nic_spec.device.backing.deviceName = network.name
+        changes = self.device_changes()
+        if changes.edit_nic(nic_id, network=network, summary=summary):
+            changes.apply()
 
-        # Apply change to VM
-        self._edit(vim.vm.ConfigSpec(deviceChange=[nic_spec]))
-
-    # Originally based on: delete_nic_from_vm in pyvmomi-community-samples
     def remove_nic(self, nic_number):
         """
         Deletes a vNIC based on it's number.
@@ -497,22 +673,8 @@ class VM:
         :return: If removal succeeded
         :rtype: bool
         """
-        nic_label = "Network adapter " + str(nic_number)
-        self._log.debug("Removing Virtual %s from '%s'", nic_label, self.name)
-        virtual_nic_device = self.get_nic_by_name(nic_label)
-        if virtual_nic_device is not None:
-            virtual_nic_spec = vim.vm.device.VirtualDeviceSpec()
-            virtual_nic_spec.operation = \
-                vim.vm.device.VirtualDeviceSpec.Operation.remove
-            virtual_nic_spec.device = virtual_nic_device
-
-            # Apply change to VM
-            self._edit(vim.vm.ConfigSpec(deviceChange=[virtual_nic_spec]))
-            return True
-        else:
-            self._log.error("Virtual %s could not be found for '%s'",
-                            nic_label, self.name)
-            return False
+        changes = self.device_changes()
+        return changes.remove_nic(nic_number) and changes.apply()
 
     def remove_device(self, device_spec):
         """
@@ -521,10 +683,9 @@ class VM:
         :param device_spec: The specification of the device to remove
         :type device_spec: vim.vm.device.VirtualDeviceSpec
         """
-        self._log.debug("Removing device '%s' from '%s'",
-                        device_spec.name, self.name)
-        device_spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.remove
-        self._edit(vim.vm.ConfigSpec(deviceChange=[device_spec]))
+        changes = self.device_changes()
+        changes.remove_device(device_spec)
+        changes.apply()
 
     # From: delete_disk_from_vm.py in pyvmomi_community_samples
     def remove_hdd(self, disk_number):
@@ -865,7 +1026,7 @@ class VM:
         :return: If tools are installed and working
         :rtype: bool
         """
-        tools = self._vm.summary.guest.toolsStatus
+        tools = self._get_live("summary.guest.toolsStatus")
         return True if tools == "toolsOK" or tools == "toolsOld" else False
 
     def powered_on(self):
@@ -875,7 +1036,7 @@ class VM:
         :return: If VM is powered on
         :rtype: bool
         """
-        return self._vm.runtime.powerState == \
+        return self._get_live("runtime.powerState") == \
             vim.VirtualMachine.PowerState.poweredOn
 
     def is_template(self):
@@ -885,7 +1046,7 @@ class VM:
         :return: If the VM is a template
         :rtype: bool
         """
-        return bool(self._vm.summary.config.template)
+        return bool(self._get_live("config.template"))
 
     def is_windows(self):
         """
@@ -904,7 +1065,8 @@ class VM:
         :type config: vim.vm.ConfigSpec
         :return: If the edit was successful
         """
-        if not self._vm.ReconfigVM_Task(config).wait():
+        _, outcomes = wait_for_tasks([self._vm.ReconfigVM_Task(config)])
+        if outcomes[0] != "success":
             self._log.error("Failed to edit VM %s", self.name)
             return False
         else:
@@ -932,7 +1094,7 @@ class VM:
         return str(self.name)
 
     def __hash__(self):
-        return hash(self._vm.summary.config.instanceUuid)
+        return hash(self.uuid)
 
     def __eq__(self, other):
         return isinstance(other, self.__class__) and self.name == other.name \
@@ -942,6 +1104,285 @@ class VM:
         return not self.__eq__(other)
 
 
+class DeviceChanges:
+    """ Changes to the devices of a VM that are made all at once.
+
+    Each change made with :class:`VM` methods such as :meth:`VM.add_nic`
+    is a separate reconfiguration task. Changes collected here are
+    applied with a single task by :meth:`apply`, or are given to
+    :meth:`VM.create` so a clone is created with them.
+    """
+    __version__ = "0.1.0"
+
+    def __init__(self, vm):
+        """
+        :param vm: VM whose devices are changed, or the template of a clone
+        :type vm: :class:`VM`
+        """
+        self._log = logging.getLogger('DeviceChanges')
+        self.vm = vm
+        self.specs = []  # vim.vm.device.VirtualDeviceSpec of each change
+        self._devices = None
+        self._next_key = -1  # Temporary keys of the devices being added
+
+    def get_devices(self):
+        """
+        Gets the devices of the VM, which are only retrieved once.
+
+        :return: The devices
+        :rtype: list(vim.vm.device.VirtualDevice)
+        """
+        if self._devices is None:
+            self._devices = list(self.vm.get_vim_vm().config.hardware.device)
+        return self._devices
+
+    def get_nics(self):
+        """
+        Gets the vNICs of the VM, ordered by their number.
+
+        :return: The vNICs
+        :rtype: list(vim.vm.device.VirtualEthernetCard)
+        """
+        nics = [dev for dev in self.get_devices() if is_vnic(dev)]
+        return sorted(nics, key=lambda n: _nic_number(n.deviceInfo.label))
+
+    def get_nic(self, nic_id):
+        """
+        Gets a vNIC by it's number.
+
+        :param int nic_id: Number of the vNIC
+        :return: The vNIC found
+        :rtype: vim.vm.device.VirtualEthernetCard or None
+        """
+        label = "network adapter " + str(nic_id)
+        for dev in self.get_devices():
+            if is_vnic(dev) and dev.deviceInfo.label.lower() == label:
+                return dev
+        return None
+
+    def add_nic(self, network, summary="default-summary", model="e1000"):
+        """
+        Adds a NIC in the portgroup to the VM.
+
+        :param network: Network to attach NIC to
+        :type network: vim.Network
+        :param str summary: Human-readable device info
+        :param str model: Model of virtual network adapter
+        (e1000 | e1000e | vmxnet | vmxnet2 | vmxnet3 | pcnet32 | sriov)
+        """
+        if not isinstance(network, vim.Network):
+            self._log.error("Invalid network type when adding vNIC "
+                            "to VM '%s': %s", self.vm.name,
+                            type(network).__name__)
+        self._log.debug("Adding NIC to VM '%s'\nNetwork: '%s'"
+                        "\tSummary: '%s'\tNIC Model: '%s'",
+                        self.vm.name, network.name, summary, model)
+        spec = vim.vm.device.VirtualDeviceSpec()
+        spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.add
+        spec.device = _make_nic(network, summary, model)
+        # Devices added together need distinct keys until they're created
+        spec.device.key = self._next_key
+        self._next_key -= 1
+        self.specs.append(spec)
+
+    def edit_nic(self, nic_id, network=None, summary=None):
+        """
+        Edits a vNIC based on it's number.
+
+        :param int nic_id: Number of network adapter on VM
+        :param network: Network to assign the vNIC to
+        :type network: vim.Network
+        :param str summary: Human-readable device description
+        :return: If the vNIC was found
+        :rtype: bool
+        """
+        nic = self.get_nic(nic_id)
+        if nic is None:
+            self._log.error("Virtual Network adapter %s could not be found "
+                            "for '%s'", str(nic_id), self.vm.name)
+            return False
+        self._log.debug("Changing 'Network adapter %s' on VM '%s'",
+                        str(nic_id), self.vm.name)
+        spec = vim.vm.device.VirtualDeviceSpec()
+        spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.edit
+        spec.device = nic
+        if summary:
+            spec.device.deviceInfo.summary = str(summary)
+        if network:
+            self._log.debug("Changing PortGroup to: '%s'", network.name)
+            spec.device.backing.network = network
+            spec.device.backing.deviceName = network.name
+        self.specs.append(spec)
+        return True
+
+    def remove_nic(self, nic_number):
+        """
+        Deletes a vNIC based on it's number.
+
+        :param int nic_number: Number of the vNIC to delete
+        :return: If the vNIC was found
+        :rtype: bool
+        """
+        nic = self.get_nic(nic_number)
+        if nic is None:
+            self._log.error("Virtual Network adapter %s could not be found "
+                            "for '%s'", str(nic_number), self.vm.name)
+            return False
+        self._log.debug("Removing Virtual Network adapter %s from '%s'",
+                        str(nic_number), self.vm.name)
+        self.remove_device(vim.vm.device.VirtualDeviceSpec(device=nic))
+        return True
+
+    def remove_device(self, device_spec):
+        """
+        Removes a device from the VM.
+
+        :param device_spec: The specification of the device to remove
+        :type device_spec: vim.vm.device.VirtualDeviceSpec
+        """
+        device_spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.remove
+        self.specs.append(device_spec)
+
+    def config_spec(self, spec=None):
+        """
+        Gets a configuration specification that makes the changes.
+
+        :param spec: Specification to add the changes to
+        :type spec: vim.vm.ConfigSpec
+        :return: The specification
+        :rtype: vim.vm.ConfigSpec
+        """
+        if spec is None:
+            spec = vim.vm.ConfigSpec()
+        spec.deviceChange = list(spec.deviceChange or []) + self.specs
+        return spec
+
+    def apply(self):
+        """
+        Makes the changes to the VM with a single reconfiguration.
+
+        :return: If the changes were made
+        :rtype: bool
+        """
+        if not self.specs:
+            return True
+        self._log.debug("Making %d device changes to VM '%s'",
+                        len(self.specs), self.vm.name)
+        applied = self.vm._edit(self.config_spec())
+        self.specs = []
+        self._devices = None  # The devices changed
+        return applied
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __str__(self):
+        return "DeviceChanges(%s, %d changes)" % (self.vm.name,
+                                                  len(self.specs))
+
+
+def _make_nic(network, summary, model):
+    """
+    Makes a virtual network adapter attached to a network.
+
+    :param network: Network to attach NIC to
+    :type network: vim.Network
+    :param str summary: Human-readable device info
+    :param str model: Model of virtual network adapter
+    :return: The network adapter
+    :rtype: vim.vm.device.VirtualEthernetCard
+    """
+    # Set the type of network adapter
+    if model == "e1000":
+        nic = vim.vm.device.VirtualE1000()
+    elif model == "e1000e":
+        nic = vim.vm.device.VirtualE1000e()
+    elif model == "vmxnet":
+        nic = vim.vm.device.VirtualVmxnet()
+    elif model == "vmxnet2":
+        nic = vim.vm.device.VirtualVmxnet2()
+    elif model == "vmxnet3":
+        nic = vim.vm.device.VirtualVmxnet3()
+    elif model == "pcnet32":
+        nic = vim.vm.device.VirtualPCNet32()
+    elif model == "sriov":
+        nic = vim.vm.device.VirtualSriovEthernetCard()
+    else:
+        logging.error("Invalid NIC model: '%s'\nDefaulting to e1000...",
+                      model)
+        nic = vim.vm.device.VirtualE1000()
+
+    # Sets how MAC address is assigned
+    nic.addressType = 'generated'
+    # Disables Wake-on-lan capabilities
+    nic.wakeOnLanEnabled = False
+
+    nic.deviceInfo = vim.Description()
+    nic.deviceInfo.summary = summary
+
+    nic.backing = vim.vm.device.VirtualEthernetCard.NetworkBackingInfo()
+    nic.backing.useAutoDetect = False
+    # Sets port group to assign adapter to
+    nic.backing.network = network
+    # Sets name of device on host system
+    nic.backing.deviceName = network.name
+
+    nic.connectable = vim.vm.device.VirtualDevice.ConnectInfo()
+    # Ensures adapter is connected at boot
+    nic.connectable.startConnected = True
+    # Allows guest OS to control device
+    nic.connectable.allowGuestControl = True
+    nic.connectable.connected = True
+    nic.connectable.status = 'untried'
+    return nic
+
+
+def _nic_number(label):
+    """ Gets the number of a vNIC from it's label, e.g. Network adapter 2 """
+    number = str(label).rsplit(" ", 1)[-1]
+    return int(number) if number.isdigit() else 0
+
+
+def _resource_spec(cpus=None, cores=None, memory=None, max_consoles=None):
+    """
+    Makes a configuration specification that sets resource limits.
+
+    :param int cpus: Number of CPUs
+    :param int cores: Number of CPU cores
+    :param int memory: Amount of RAM in MB
+    :param int max_consoles: Maximum number of simultaneous
+    Mouse-Keyboard-Screen (MKS) console connections
+    :return: The specification
+    :rtype: vim.vm.ConfigSpec
+    """
+    spec = vim.vm.ConfigSpec()
+    if cpus is not None:
+        spec.numCPUs = int(cpus)
+    if cores is not None:
+        spec.numCoresPerSocket = int(cores)
+    if memory is not None:
+        spec.memoryMB = int(memory)
+    if max_consoles is not None:
+        spec.maxMksConnections = int(max_consoles)
+    return spec
+
+
+def _has_changes(spec):
+    """
+    Checks if a configuration specification changes anything.
+
+    :param spec: The specification
+    :type spec: vim.vm.ConfigSpec or None
+    :return: If it changes anything
+    :rtype: bool
+    """
+    return spec is not None and (
+        bool(spec.deviceChange) or any(
+            getattr(spec, name) is not None
+            for name in ("numCPUs", "numCoresPerSocket", "memoryMB",
+                         "maxMksConnections", "annotation")))
+
+
 def is_vnic(device):
     """
     Checks if the device is a VirtualEthernetCard.
@@ -951,3 +1392,32 @@ def is_vnic(device):
     :rtype: bool
     """
     return isinstance(device, vim.vm.device.VirtualEthernetCard)
+
+
+def _retrieve_vm_properties(vms, paths):
+    """
+    Retrieves properties of VMs using a single PropertyCollector call.
+
+    :param vms: VMs to retrieve the properties of
+    :type vms: list(vim.VirtualMachine)
+    :param list(str) paths: Paths of the properties to retrieve
+    :return: VM moId -> Property path -> value, of the VMs that exist
+    :rtype: dict
+    """
+    if not vms:
+        return {}
+    pc = vmodl.query.PropertyCollector
+    spec = pc.FilterSpec(
+        objectSet=[pc.ObjectSpec(obj=vm, skip=False) for vm in vms],
+        propSet=[pc.PropertySpec(type=vim.VirtualMachine,
+                                 pathSet=paths)])
+    collector = get_content(vms[0]._stub).propertyCollector
+    found = {}
+    for content in retrieve_properties(collector, spec):
+        if content.missingSet and any(
+                isinstance(m.fault, vmodl.fault.ManagedObjectNotFound)
+                for m in content.missingSet):
+            continue  # Deleted while retrieving
+        found[content.obj._moId] = dict((p.name, p.val)
+                                        for p in content.propSet)
+    return found
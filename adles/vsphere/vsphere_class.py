@@ -17,14 +17,17 @@ import logging
 from pyVim.connect import SmartConnect, SmartConnectNoSSL, Disconnect
 from pyVmomi import vim, vmodl
 
+from adles.vsphere.catalogue import TemplateCatalogue
+from adles.vsphere.inventory import Inventory, register, unregister
+
 
 class Vsphere:
     """ Maintains connection, logging, and constants for a vSphere instance """
-    __version__ = "1.0.2"
+    __version__ = "1.5.0"
 
     def __init__(self, username=None, password=None, hostname=None,
                  datacenter=None, datastore=None,
-                 port=443, use_ssl=False):
+                 port=443, use_ssl=False, service_instance=None):
         """
         Connects to a vCenter server and initializes a class instance.
 
@@ -40,6 +43,9 @@ class Vsphere:
         [default: First datacenter found on server]
         :param int port: Port used to connect to vCenter instance
         :param bool use_ssl: If SSL should be used to connect
+        :param service_instance: Use an existing connection instead of
+        connecting, such as the ServiceInstance of a :class:`Simulator`
+        :type service_instance: vim.ServiceInstance
         :raises LookupError: if a datacenter or datastore cannot be found
         """
         self._log = logging.getLogger('Vsphere')
@@ -47,6 +53,47 @@ class Vsphere:
                         "\tDatastore: %s\tSSL: %s",
                         Vsphere.__version__, datacenter, datastore, use_ssl)
 
+        if service_instance is not None:  # Use the existing connection
+            self._server = service_instance
+            if hostname is None:
+                hostname = str(service_instance._stub)
+        else:
+            username, hostname = self._connect(username, password, hostname,
+                                               port, use_ssl)
+        self._log.info("Connected to vSphere host %s:%d", hostname, port)
+        self._log.debug("Current server time: %s",
+                        str(self._server.CurrentTime()))
+
+        self.username = username
+        self.hostname = hostname
+        self.port = port
+        self.content = self._server.RetrieveContent()
+        self.auth = self.content.authorizationManager
+        self.user_dir = self.content.userDirectory
+        self.search_index = self.content.searchIndex
+        self.inventory = None  # Snapshot used to answer lookups by name
+        self._catalogues = {}  # Folder moId -> TemplateCatalogue
+
+        self.datacenter = self.get_item(vim.Datacenter, name=datacenter)
+        if not self.datacenter:
+            raise LookupError("Could not find a Datacenter to initialize with!")
+        self.datastore = self.get_datastore(datastore)
+        if not self.datastore:
+            raise LookupError("Could not find a Datastore to initialize with!")
+        self._log.debug("Finished initializing vSphere")
+
+    def _connect(self, username, password, hostname, port, use_ssl):
+        """
+        Connects to a vCenter server, prompting for any missing information.
+
+        :param str username: Username of account to login with
+        :param str password: Password of account to login with
+        :param str hostname: DNS hostname or IP address of vCenter instance
+        :param int port: Port used to connect to vCenter instance
+        :param bool use_ssl: If SSL should be used to connect
+        :return: The username and hostname used to connect
+        :rtype: tuple(str, str)
+        """
         if username is None:
             username = str(input("Enter username for vSphere: "))
         if password is None:
@@ -74,26 +121,7 @@ class Vsphere:
         # Ensure connection to server is closed on program exit
         from atexit import register
         register(Disconnect, self._server)
-
-        self._log.info("Connected to vSphere host %s:%d", hostname, port)
-        self._log.debug("Current server time: %s",
-                        str(self._server.CurrentTime()))
-
-        self.username = username
-        self.hostname = hostname
-        self.port = port
-        self.content = self._server.RetrieveContent()
-        self.auth = self.content.authorizationManager
-        self.user_dir = self.content.userDirectory
-        self.search_index = self.content.searchIndex
-
-        self.datacenter = self.get_item(vim.Datacenter, name=datacenter)
-        if not self.datacenter:
-            raise LookupError("Could not find a Datacenter to initialize with!")
-        self.datastore = self.get_datastore(datastore)
-        if not self.datastore:
-            raise LookupError("Could not find a Datastore to initialize with!")
-        self._log.debug("Finished initializing vSphere")
+        return username, hostname
 
     # From: create_folder_in_datacenter.py in pyvmomi-community-samples
     def create_folder(self, folder_name, create_in=None):
@@ -154,6 +182,104 @@ class Vsphere:
         con_view.Destroy()
         return returns
 
+    def snapshot_inventory(self, vimtypes=None, properties=None,
+                           container=None, track=False):
+        """
+        Takes a snapshot of the inventory that is used to answer lookups.
+
+        Retrieves the name and parent of all objects of the given types
+        using a single paged property retrieval. Lookups that don't find
+        an object in the snapshot fall back to searching the server.
+        The snapshot is also used by the folder utilities, and is updated
+        with the objects they create, destroy, rename and move.
+
+        :param list vimtypes: Types of objects to include in the snapshot
+        [default: VMs, networks, hosts, datastores and containers]
+        :param dict properties: Additional properties to retrieve,
+        as a dict of vimtype to list of property paths
+        :param container: Container to snapshot [default: content.rootFolder]
+        :param bool track: Follow changes made on the server by others,
+        which are applied by :meth:`refresh_inventory`
+        :return: The inventory snapshot
+        :rtype: :class:`Inventory`
+        """
+        self.clear_inventory()
+        self.inventory = Inventory.retrieve(self.content, vimtypes=vimtypes,
+                                            properties=properties,
+                                            container=container)
+        if track:
+            self.inventory.track(self.content)
+        register(self._server._stub, self.inventory)
+        self._log.debug("Took inventory snapshot of %d objects",
+                        len(self.inventory))
+        return self.inventory
+
+    def refresh_inventory(self):
+        """
+        Brings the inventory snapshot up to date. If changes are being
+        tracked they are applied, otherwise the snapshot is retaken.
+
+        :return: The inventory snapshot
+        :rtype: :class:`Inventory` or None
+        """
+        if self.inventory is None:
+            return None
+        elif self.inventory.is_tracking():
+            self.inventory.update()
+            return self.inventory
+        return self.snapshot_inventory(vimtypes=self.inventory.vimtypes,
+                                       properties=self.inventory.properties,
+                                       container=self.inventory.container)
+
+    def clear_inventory(self):
+        """ Discards the inventory snapshot, so lookups search the server. """
+        if self.inventory is not None:
+            self.inventory.untrack()
+            unregister(self._server._stub)
+        self.inventory = None
+
+    def get_template_catalogue(self, folder):
+        """
+        Gets the catalogue of the templates in a folder.
+        The catalogue is built the first time, and afterwards it's only
+        rebuilt if something in the folder changed.
+
+        :param folder: Folder containing the templates
+        :type folder: vim.Folder
+        :return: The catalogue
+        :rtype: :class:`TemplateCatalogue`
+        """
+        catalogue = self._catalogues.get(folder._moId)
+        if catalogue is None:
+            catalogue = TemplateCatalogue(self, folder)
+            self._catalogues[folder._moId] = catalogue
+        else:
+            catalogue.refresh()
+        return catalogue
+
+    def profile(self, profiler):
+        """
+        Accounts for the calls made to the server using a profiler.
+
+        :param profiler: The profiler to use
+        :type profiler: :class:`Profiler`
+        """
+        profiler.attach(self._server._stub)
+
+    def _snapshot_for(self, container, vimtypes):
+        """
+        Gets the inventory snapshot if it can answer a lookup.
+
+        :param container: Container being searched
+        :param list vimtypes: Types being searched for
+        :return: The inventory snapshot
+        :rtype: :class:`Inventory` or None
+        """
+        if self.inventory is not None and container in self.inventory \
+                and self.inventory.covers(vimtypes):
+            return self.inventory
+        return None
+
     def set_entity_permissions(self, entity, permission):
         """
         Defines or updates rule(s) for the given user or group on the entity.
@@ -402,6 +528,11 @@ class Vsphere:
         :return: Object found with the specified name
         :rtype: vimtype or None
         """
+        inventory = self._snapshot_for(container, vimtypes)
+        if inventory is not None:
+            obj = inventory.find(vimtypes, name, container, recursive)
+            if obj is not None:
+                return obj
         con_view = self.content.viewManager.CreateContainerView(container,
                                                                 vimtypes,
                                                                 recursive)
@@ -424,6 +555,11 @@ class Vsphere:
         :return: All vimtype objects found
         :rtype: list(vimtype) or None
         """
+        inventory = self._snapshot_for(container, vimtypes)
+        if inventory is not None:
+            objs = inventory.find_all(vimtypes, container, recursive)
+            if len(objs) > 0:
+                return objs
         objs = []
         con_view = self.content.viewManager.CreateContainerView(container,
                                                                 vimtypes,
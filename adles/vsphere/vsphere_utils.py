@@ -13,97 +13,338 @@
 # limitations under the License.
 
 import logging
-from time import sleep, time
+from math import ceil
+from time import time
+from weakref import WeakKeyDictionary
 
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
 
-SLEEP_INTERVAL = 0.05
-LONG_SLEEP = 1.0
+LONG_SLEEP = 1.0  # Seconds between checks by long-running task monitors
 
+# ServiceInstanceContent of each connection, so it's only retrieved once
+_content = WeakKeyDictionary()
 
-def wait_for_task(task, timeout=60.0, pause_timeout=True):
+
+def get_content(stub):
     """
-    Waits for a single vim.Task to finish and returns its result.
+    Gets the content of the server a stub is connected to.
 
-    :param task: The task to wait for
-    :type task: vim.Task
-    :param float timeout: Number of seconds to wait before terminating task 
-    :param bool pause_timeout: Pause timeout counter while task 
-    is queued on server
-    :return: Task result information (task.info.result)
-    :rtype: str or None
+    :param stub: The stub of a connection to a server
+    :return: Content of the server
+    :rtype: vim.ServiceInstanceContent
     """
-    if not task:  # Check if there's actually a task
-        logging.error("No task was specified to wait for")
-        return None
-    name = str(task.info.descriptionId)
-    obj = str(task.info.entityName)
-    wait_time = 0.0
-    end_time = time() + float(timeout)  # Set end time
-    try:
-        while True:
-            if task.info.state == 'success':  # It succeeded!
-                # Return the task result if it was successful
-                return task.info.result
-            elif task.info.state == 'error':  # It failed...
-                logging.error("Error during task %s on object '%s': %s",
-                              name, obj, str(task.info.error.msg))
-                return None
-            elif time() > end_time:  # Check if it has exceeded the timeout
-                logging.error("Task %s timed out after %s seconds",
-                              name, str(wait_time))
-                task.CancelTask()  # Cancel the task since we've timed out
-                return None
-            elif task.info.state == 'queued':
-                sleep(LONG_SLEEP)  # Sleep longer if it's queued up on system
-                # Don't count queue time against the timeout
-                if pause_timeout is True:
-                    end_time += LONG_SLEEP
-                wait_time += LONG_SLEEP
-            else:
-                # Wait a bit so we don't waste resources checking state
-                sleep(SLEEP_INTERVAL)
-                wait_time += SLEEP_INTERVAL
-    except vim.fault.NoPermission as e:
+    content = _content.get(stub)
+    if content is None:
+        instance = vim.ServiceInstance("ServiceInstance", stub)
+        content = instance.RetrieveContent()
+        _content[stub] = content
+    return content
+
+
+def log_task_fault(fault, name, obj):
+    """
+    Logs a fault that prevented a task from completing.
+
+    :param fault: The fault
+    :type fault: vmodl.MethodFault
+    :param str name: Name of the task
+    :param str obj: Name of the object the task was operating on
+    """
+    if isinstance(fault, vim.fault.NoPermission):
         logging.error("Permission denied for task %s on %s: need privilege %s",
-                      name, obj, e.privilegeId)
-    except vim.fault.TaskInProgress as e:
+                      name, obj, fault.privilegeId)
+    elif isinstance(fault, vim.fault.TaskInProgress):
         logging.error("Cannot complete task %s: "
                       "task %s is already in progress on %s",
-                      name, e.task.info.name, obj)
-    except vim.fault.InvalidPowerState as e:
+                      name, fault.task.info.name, obj)
+    elif isinstance(fault, vim.fault.InvalidPowerState):
         logging.error("Cannot complete task %s: "
                       "%s is in invalid power state %s",
-                      name, obj, e.existingState)
-    except vim.fault.InvalidState as e:
+                      name, obj, fault.existingState)
+    elif isinstance(fault, vim.fault.InvalidState):
         logging.error("Cannot complete task %s: "
-                      "invalid state for %s\n%s", name, obj, str(e))
-    except vim.fault.CustomizationFault:
+                      "invalid state for %s\n%s", name, obj, str(fault))
+    elif isinstance(fault, vim.fault.CustomizationFault):
         logging.error("Cannot complete task %s: "
                       "invalid customization for %s", name, obj)
-    except vim.fault.VmConfigFault:
+    elif isinstance(fault, vim.fault.VmConfigFault):
         logging.error("Cannot complete task %s: "
                       "invalid configuration for VM %s", name, obj)
-    except vim.fault.InvalidName as e:
+    elif isinstance(fault, vim.fault.InvalidName):
         logging.error("Cannot complete task %s for object %s: "
-                      "name '%s' is not valid", name, obj, e.name)
-    except vim.fault.DuplicateName as e:
+                      "name '%s' is not valid", name, obj, fault.name)
+    elif isinstance(fault, vim.fault.DuplicateName):
         logging.error("Cannot complete task %s for %s: "
-                      "there is a duplicate named %s", name, obj, e.name)
-    except vim.fault.InvalidDatastore as e:
+                      "there is a duplicate named %s", name, obj, fault.name)
+    elif isinstance(fault, vim.fault.InvalidDatastore):
         logging.error("Cannot complete task %s for %s: "
-                      "invalid Datastore '%s'", name, obj, e.datastore)
-    except vim.fault.AlreadyExists:
+                      "invalid Datastore '%s'", name, obj, fault.datastore)
+    elif isinstance(fault, vim.fault.AlreadyExists):
         logging.error("Cannot complete task %s: "
                       "%s already exists", name, obj)
-    except vim.fault.NotFound:
+    elif isinstance(fault, vim.fault.NotFound):
         logging.error("Cannot complete task %s: "
                       "%s does not exist", name, obj)
-    except vim.fault.ResourceInUse:
+    elif isinstance(fault, vim.fault.ResourceInUse):
         logging.error("Cannot complete task %s: "
                       "resource %s is in use", name, obj)
+    else:
+        logging.error("Error during task %s on object '%s': %s",
+                      name, obj, str(getattr(fault, "msg", fault)))
+
+
+class TaskWaiter:
+    """ Waits for vim.Tasks to finish using property collector updates.
+
+    Rather than polling the state of each task, a filter for the info
+    of all the tasks is created on a private PropertyCollector, and
+    WaitForUpdatesEx blocks until the server reports a change.
+    """
+
+    def __init__(self, tasks, timeout=60.0, pause_timeout=True):
+        """
+        :param tasks: Tasks to wait for
+        :type tasks: list(vim.Task)
+        :param float timeout: Number of seconds to wait for each task
+        before cancelling it
+        :param bool pause_timeout: Pause timeout counter while a task
+        is queued on server
+        """
+        self.tasks = list(tasks)
+        self.timeout = float(timeout)
+        self.pause_timeout = pause_timeout
+        self.infos = {}  # moId -> vim.TaskInfo
+        self.timed_out = set()  # moIds of tasks that were cancelled
+
+    def wait(self, start_next=None):
+        """
+        Waits for all of the tasks to finish.
+
+        :param start_next: Function called each time a task finishes that
+        returns another vim.Task to wait for, or None if there are no more
+        :type start_next: callable
+        :return: The info of each task, in the order they were waited for.
+        Tasks that timed out have a state of 'error'.
+        :rtype: list(vim.TaskInfo)
+        """
+        if not self.tasks:
+            return []
+        content = get_content(self.tasks[0]._stub)
+        collector = content.propertyCollector.CreatePropertyCollector()
+        try:
+            self._wait(collector, start_next)
+        finally:
+            collector.DestroyPropertyCollector()
+        return [self.infos.get(t._moId) for t in self.tasks]
+
+    def _wait(self, collector, start_next):
+        self._deadlines = {}  # moId -> time the task times out
+        self._pending = {}  # moId -> task
+        self._filters = []  # Tuples of (filter, moIds of it's tasks)
+        self._watch(collector, self.tasks)
+        now = time()
+        version = ""
+        while self._pending:
+            # Don't count time spent queued on the server against the timeout
+            last, now = now, time()
+            if self.pause_timeout:
+                for mo_id in self._pending:
+                    info = self.infos.get(mo_id)
+                    if info is not None and info.state == "queued":
+                        self._deadlines[mo_id] += now - last
+
+            finished = 0
+            for mo_id in [m for m in self._pending
+                          if self._deadlines[m] <= now]:
+                self._timed_out(self._pending.pop(mo_id))
+                finished += 1
+            if not finished:
+                remaining = min(self._deadlines[m]
+                                for m in self._pending) - now
+                # Block until a task changes or the next one times out
+                options = vmodl.query.PropertyCollector.WaitOptions(
+                    maxWaitSeconds=int(ceil(remaining)))
+                update = collector.WaitForUpdatesEx(version, options)
+                if update is None:  # Nothing changed before the wait expired
+                    continue
+                version = update.version
+                for filter_update in update.filterSet:
+                    for obj_update in filter_update.objectSet:
+                        self._update(obj_update)
+                for mo_id in list(self._pending):
+                    info = self.infos.get(mo_id)
+                    if info is not None and info.state in ("success",
+                                                           "error"):
+                        del self._pending[mo_id]
+                        finished += 1
+
+            # Start a task in the place of each one that finished
+            started = []
+            while start_next is not None and len(started) < finished:
+                task = start_next()
+                if task is None:  # There are no more tasks to start
+                    start_next = None
+                else:
+                    started.append(task)
+            if started:
+                self.tasks.extend(started)
+                self._watch(collector, started)
+            if self._pending:  # Filters are destroyed with the collector
+                self._unwatch()
+
+    def _watch(self, collector, tasks):
+        """ Creates a filter for the info of tasks and starts their timers. """
+        pc = vmodl.query.PropertyCollector
+        spec = pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=t) for t in tasks],
+            propSet=[pc.PropertySpec(type=vim.Task, pathSet=["info"])])
+        filter_mo = collector.CreateFilter(spec, partialUpdates=False)
+        self._filters.append((filter_mo, [t._moId for t in tasks]))
+        deadline = time() + self.timeout
+        for task in tasks:
+            self._deadlines[task._moId] = deadline
+            self._pending[task._moId] = task
+
+    def _unwatch(self):
+        """ Destroys the filters for tasks that have all finished. """
+        for filter_mo, mo_ids in list(self._filters):
+            if not any(m in self._pending for m in mo_ids):
+                self._filters.remove((filter_mo, mo_ids))
+                filter_mo.DestroyPropertyFilter()
+
+    def _update(self, obj_update):
+        """ Applies the changes reported for a task to its info. """
+        mo_id = obj_update.obj._moId
+        for change in obj_update.changeSet:
+            if change.name == "info":
+                self.infos[mo_id] = change.val
+            elif change.name.startswith("info.") and mo_id in self.infos:
+                # Server reported a change to part of the info
+                target = self.infos[mo_id]
+                path = change.name.split(".")[1:]
+                for attr in path[:-1]:
+                    target = getattr(target, attr)
+                setattr(target, path[-1], change.val)
+
+    def _timed_out(self, task):
+        """ Cancels a task that did not finish before the timeout. """
+        info = self.infos.get(task._moId)
+        name = str(info.descriptionId) if info is not None else str(task)
+        logging.error("Task %s timed out after %s seconds",
+                      name, str(self.timeout))
+        self.timed_out.add(task._moId)
+        try:
+            task.CancelTask()  # Cancel the task since we've timed out
+        except vmodl.MethodFault as e:
+            logging.debug("Could not cancel task %s: %s", name, str(e))
+        if info is None:
+            info = vim.TaskInfo(key=task._moId, task=task)
+            self.infos[task._moId] = info
+        info.state = "error"
+        info.error = vmodl.fault.RequestCanceled(msg="Timed out")
+
+
+def wait_for_task(task, timeout=60.0, pause_timeout=True):
+    """
+    Waits for a single vim.Task to finish and returns its result.
+
+    :param task: The task to wait for
+    :type task: vim.Task
+    :param float timeout: Number of seconds to wait before terminating task 
+    :param bool pause_timeout: Pause timeout counter while task 
+    is queued on server
+    :return: Task result information (task.info.result)
+    :rtype: str or None
+    """
+    if not task:  # Check if there's actually a task
+        logging.error("No task was specified to wait for")
+        return None
+    waiter = TaskWaiter([task], timeout, pause_timeout)
+    try:
+        info = waiter.wait()[0]
+    except vmodl.MethodFault as e:
+        log_task_fault(e, str(task), str(task))
+        return None
+    if info.state == "success":  # It succeeded!
+        return info.result
+    elif task._moId not in waiter.timed_out:  # It failed...
+        log_task_fault(info.error, str(info.descriptionId),
+                       str(info.entityName))
     return None
 
+
+def wait_for_tasks(tasks, concurrency=None, timeout=60.0, pause_timeout=True):
+    """
+    Waits for multiple vim.Tasks to finish and returns their results.
+
+    Tasks can be given as functions that start a task when called, in which
+    case no more than concurrency tasks are waited on at once, and the next
+    task is started as soon as any of them finishes.
+
+    :param tasks: The tasks to wait for
+    :type tasks: list(vim.Task or callable)
+    :param int concurrency: Maximum number of tasks to wait on at once
+    [default: all of them]
+    :param float timeout: Number of seconds to wait before terminating a task
+    :param bool pause_timeout: Pause timeout counter while a task
+    is queued on server
+    :return: Result of each task (task.info.result), and the outcome of each
+    task: 'success', 'timeout', 'invalid' if there was no task,
+    or the name of the fault that caused it to fail
+    :rtype: tuple(list, list(str))
+    """
+    tasks = list(tasks)
+    results = [None] * len(tasks)
+    outcomes = ["invalid"] * len(tasks)
+    indices = iter(range(len(tasks)))
+    started = []  # Index of each task that was started, in order
+
+    def start_next():
+        for i in indices:
+            task = tasks[i]
+            if callable(task):  # Start the task
+                try:
+                    task = task()
+                except vmodl.MethodFault as e:
+                    log_task_fault(e, str(tasks[i]), str(tasks[i]))
+                    outcomes[i] = type(e).__name__.split('.')[-1]
+                    continue
+            if not isinstance(task, vim.Task):
+                logging.error("No task was specified to wait for")
+                continue
+            started.append(i)
+            return task
+        return None
+
+    limit = len(tasks) if not concurrency else max(int(concurrency), 1)
+    first = []
+    while len(first) < limit:
+        task = start_next()
+        if task is None:
+            break
+        first.append(task)
+
+    waiter = TaskWaiter(first, timeout, pause_timeout)
+    try:
+        infos = waiter.wait(start_next)
+    except vmodl.MethodFault as e:
+        log_task_fault(e, str(waiter.tasks), str(waiter.tasks))
+        for i in started:
+            outcomes[i] = type(e).__name__.split('.')[-1]
+        return results, outcomes
+    for i, task, info in zip(started, waiter.tasks, infos):
+        if info.state == "success":
+            results[i] = info.result
+            outcomes[i] = "success"
+        elif task._moId in waiter.timed_out:
+            outcomes[i] = "timeout"
+        else:
+            log_task_fault(info.error, str(info.descriptionId),
+                           str(info.entityName))
+            outcomes[i] = type(info.error).__name__.split('.')[-1]
+    return results, outcomes
+
+
 # This line allows calling "<task>.wait(<params>)"
 # instead of "wait_for_task(task, params)"
 #
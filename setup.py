@@ -44,7 +44,8 @@ setup(
             'cleanup-vms = adles.scripts.cleanup_vms:main',
             'vm-power = adles.scripts.vm_power:main',
             'vsphere-info = adles.scripts.vsphere_info:main',
-            'vm-snapshots = adles.scripts.vm_snapshots:main'
+            'vm-snapshots = adles.scripts.vm_snapshots:main',
+            'adles-bench = adles.scripts.adles_bench:main'
         ]
     },
     install_requires=required,
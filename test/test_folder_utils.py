@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def make_tree():
+    """ Makes a simulator with an exercise-like tree of folders and VMs. """
+    from adles.vsphere.simulator import Simulator
+
+    sim = Simulator()
+    root = sim.add_folder(None, "exercise")
+    masters = sim.add_folder(root, "MASTER-FOLDERS")
+    sim.add_vm(masters, "(MASTER) web")
+    group = sim.add_folder(root, "group-1")
+    team = sim.add_folder(group, "group-team")
+    sim.add_vm(group, "web-1", powered_on=True)
+    sim.add_vm(group, "db-1")
+    sim.add_vm(team, "web-2")
+    sim.add_vm(root, "web-0")
+    return sim, root, masters, group, team
+
+
+def names(items):
+    from adles.vsphere.folder_utils import get_name
+
+    return sorted(get_name(item) for item in items)
+
+
+def test_select_cleanup():
+    from adles.vsphere.folder_utils import select_cleanup
+
+    sim, root, masters, group, team = make_tree()
+    items = select_cleanup(root, vm_prefix="web")
+    assert names(items.vms) == ["web-0"]
+    assert items.folders == []
+
+    items = select_cleanup(root, vm_prefix="web", folder_prefix="group",
+                           recursive=True)
+    assert names(items.vms) == ["web-0", "web-1", "web-2"]
+
+    # Everything in the destroyed folders, and the matching VMs in the root
+    items = select_cleanup(root, vm_prefix="db", folder_prefix="group",
+                           destroy_folders=True)
+    assert names(items.vms) == ["db-1", "web-1", "web-2"]
+    assert [(d, f) for d, f in items.folders] == [(1, group), (2, team)]
+
+    items = select_cleanup(root, destroy_folders=True, destroy_self=True,
+                           exclude=[masters])
+    assert names(items.vms) == ["db-1", "web-0", "web-1", "web-2"]
+    assert items.folders[0] == (0, root)
+    assert masters not in [f for _, f in items.folders]
+
+
+def test_cleanup():
+    from adles.vsphere.folder_utils import cleanup, select_cleanup
+
+    sim, root, masters, group, team = make_tree()
+    items = select_cleanup(root, vm_prefix="db", folder_prefix="group",
+                           destroy_folders=True)
+    assert cleanup(root, items=items, concurrency=2)
+    assert names(root.childEntity) == ["MASTER-FOLDERS", "web-0"]
+    assert sim.calls["VirtualMachine.PowerOffVM_Task"] == 1  # Only web-1
+
+    # The root isn't destroyed since the excluded Masters are still in it
+    assert not cleanup(root, destroy_folders=True, destroy_self=True,
+                       exclude=[masters])
+    assert names(root.childEntity) == ["MASTER-FOLDERS"]
+    assert names(masters.childEntity) == ["(MASTER) web"]
+    parent = root.parent
+    assert cleanup(root, destroy_folders=True, destroy_self=True)
+    assert names(parent.childEntity) == []
+
+
+def test_find_in_folder_falls_back_to_server():
+    from adles.vsphere.folder_utils import find_in_folder
+    from adles.vsphere.inventory import Inventory, register, unregister
+
+    sim, root, masters, group, team = make_tree()
+    web = team.childEntity[0]
+    register(root._stub, Inventory.retrieve(sim.content))
+    try:
+        sim.reset_stats()
+        assert find_in_folder(root, "web-2", recursive=True) == web
+        assert sim.round_trips() == 0  # Found in the inventory
+        new = sim.add_vm(team, "new")  # Not in the inventory
+        assert find_in_folder(root, "new", recursive=True) == new
+        assert find_in_folder(root, "missing", recursive=True) is None
+    finally:
+        unregister(root._stub)
+
+
+def test_walk_folder_and_render_tree():
+    import io
+    import json
+    from adles.vsphere.folder_utils import render_tree, walk_folder
+
+    sim, root, masters, group, team = make_tree()
+    items = list(walk_folder(root, power_status=True))
+    assert [(i.depth, i.kind, i.name) for i in items] == [
+        (0, "folder", "exercise"), (1, "vm", "web-0"),
+        (1, "folder", "MASTER-FOLDERS"), (2, "vm", "(MASTER) web"),
+        (1, "folder", "group-1"), (2, "vm", "web-1"), (2, "vm", "db-1"),
+        (2, "folder", "group-team"), (3, "vm", "web-2")]
+    assert items[-1].path == "exercise/group-1/group-team/web-2"
+    assert items[5].power_state == "poweredOn"
+
+    assert [i.name for i in walk_folder(root, max_depth=1)] == \
+        ["exercise", "web-0", "MASTER-FOLDERS", "group-1"]
+    assert [i.name for i in walk_folder(root, vm_prefix="web",
+                                        folder_prefix="group",
+                                        power_states=["poweredOff"])] == \
+        ["exercise", "web-0", "group-1", "group-team", "web-2"]
+
+    stream = io.StringIO()
+    assert render_tree(walk_folder(root, max_depth=1), stream, indent=2) == 4
+    assert stream.getvalue() == \
+        "+ exercise\n  * web-0\n  + MASTER-FOLDERS\n  + group-1\n"
+    stream = io.StringIO()
+    render_tree(walk_folder(team), stream, json_lines=True)
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert lines[1] == {"depth": 1, "kind": "vm", "name": "web-2",
+                        "path": "group-team/web-2", "power_state": None}
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def test_inventory_snapshot():
+    from pyVmomi import vim
+    from adles.vsphere.inventory import Inventory
+    from adles.vsphere.simulator import Simulator
+
+    sim = Simulator()
+    folder = sim.add_folder(None, "Folder")
+    sub = sim.add_folder(folder, "sub")
+    vm = sim.add_vm(sub, "VM")
+    sim.reset_stats()
+    inventory = Inventory.retrieve(sim.content, page_size=2)  # Paged
+    assert sim.round_trips() > 2
+    assert inventory.covers([vim.VirtualMachine, vim.Folder])
+    assert not inventory.covers([vim.Task])
+
+    sim.reset_stats()
+    assert inventory.find([vim.VirtualMachine], "vm") == vm
+    assert inventory.find([vim.VirtualMachine], "vm", container=folder) == vm
+    assert inventory.find([vim.VirtualMachine], "vm", container=folder,
+                          recursive=False) is None
+    assert inventory.child(sub, "VM") == vm
+    assert inventory.children(folder) == [sub]
+    assert inventory.is_within(vm, folder)
+    assert not inventory.is_within(vm, folder, recursive=False)
+    assert inventory.get(vm, "name") == "VM"
+    assert sim.round_trips() == 0  # Answered from the snapshot
+
+
+def test_inventory_records_changes():
+    from pyVmomi import vim
+    from adles.vsphere.inventory import Inventory
+    from adles.vsphere.simulator import Simulator
+
+    sim = Simulator()
+    folder = sim.add_folder(None, "folder")
+    other = sim.add_folder(None, "other")
+    vm = sim.add_vm(folder, "vm")
+    inventory = Inventory.retrieve(sim.content)
+
+    inventory.rename(vm, "renamed")
+    assert inventory.find([vim.VirtualMachine], "vm") is None
+    assert inventory.child(folder, "renamed") == vm
+    inventory.move(vm, other)
+    assert inventory.child(other, "renamed") == vm
+    assert inventory.children(folder) == []
+    inventory.remove(other)  # Along with the VM in it
+    assert vm not in inventory and other not in inventory
+    new = sim.add_vm(folder, "new")
+    inventory.add(new, "new", folder)
+    assert inventory.find([vim.VirtualMachine], "NEW", container=folder) == new
+
+
+def test_inventory_track_update():
+    from pyVmomi import vim
+    from adles.vsphere.inventory import Inventory
+    from adles.vsphere.simulator import Simulator
+
+    sim = Simulator()
+    folder = sim.add_folder(None, "folder")
+    vm = sim.add_vm(folder, "vm")
+    gone = sim.add_vm(folder, "gone")
+    inventory = Inventory.retrieve(sim.content)
+    inventory.track(sim.content)
+    assert inventory.is_tracking()
+    assert inventory.update() == 0  # Nothing changed yet
+
+    # Changes made by others on the server
+    vm.Rename_Task(newName="renamed").wait()
+    gone.Destroy_Task().wait()
+    new = sim.add_vm(folder, "new")
+    assert inventory.find([vim.VirtualMachine], "new") is None
+    assert inventory.update() == 3
+    assert inventory.child(folder, "renamed") == vm
+    assert gone not in inventory
+    assert inventory.find([vim.VirtualMachine], "new") == new
+
+    inventory.untrack()
+    assert not inventory.is_tracking()
+    assert inventory.update() == 0
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def test_journal_resume(tmpdir):
+    from adles.journal import Journal
+
+    filename = str(tmpdir.join("journal.db"))
+    journal = Journal(filename, "deploy")
+    journal.record("folder:/root", "Folder:group-v1")
+    journal.record("clone:/root/vm")
+    assert "folder:/root" in journal and len(journal) == 2
+    assert journal.get("folder:/root") == "Folder:group-v1"
+    assert journal.get("clone:/root/vm") == ""
+    assert journal.get("missing") is None
+    journal.close()
+
+    other = Journal(filename, "masters")  # Phases are kept separately
+    assert len(other) == 0
+    other.record("folder:/master")
+    other.close()
+
+    resumed = Journal(filename, "deploy", resume=True)
+    assert len(resumed) == 2
+    assert resumed.get("folder:/root") == "Folder:group-v1"
+    resumed.close()
+
+    restarted = Journal(filename, "deploy")  # Not resuming starts over
+    assert len(restarted) == 0
+    restarted.close()
+    other = Journal(filename, "masters", resume=True)
+    assert len(other) == 1
+    other.close()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def make_tree():
+    """ Makes a simulator with a tree of folders and VMs to index. """
+    from adles.vsphere.simulator import Simulator
+
+    sim = Simulator()
+    root = sim.add_folder(None, "root")
+    web = sim.add_folder(root, "web")
+    db = sim.add_folder(root, "db")
+    nested = sim.add_folder(web, "web-nested")
+    vms = {}
+    for folder, names in ((root, ["web-lb", "dns"]),
+                          (web, ["web-1", "web-2", "Web-3"]),
+                          (db, ["db-1", "web-db"]),
+                          (nested, ["web-10"])):
+        for name in names:
+            vms[name] = sim.add_vm(folder, name)
+    return sim, root, web, db, nested, vms
+
+
+def test_name_index_prefix():
+    from pyVmomi import vim
+    from adles.vsphere.name_index import NameIndex
+
+    sim, root, web, db, nested, vms = make_tree()
+    sim.reset_stats()
+    index = NameIndex.retrieve(root)
+    assert sim.round_trips() <= 5  # Regardless of the number of items
+    assert len(index) == 11
+
+    names = [index.name(vm) for vm in index.find(vim.VirtualMachine, "web")]
+    # In the order of a depth-first walk, sub-folders were created first
+    assert names == ["web-10", "web-1", "web-2", "web-db", "web-lb"]
+    assert index.find(vim.VirtualMachine, "Web") == [vms["Web-3"]]
+    assert index.find(vim.Folder, "web") == [web, nested]
+    assert index.find(vim.VirtualMachine, "missing") == []
+    assert len(index.find(vim.VirtualMachine)) == 8
+    assert index.find(vim.Datastore) == []
+
+
+def test_name_index_containers():
+    from pyVmomi import vim
+    from adles.vsphere.name_index import NameIndex
+
+    sim, root, web, db, nested, vms = make_tree()
+    index = NameIndex.retrieve(root)
+    assert index.find(vim.VirtualMachine, "web", container=web) == \
+        [vms["web-10"], vms["web-1"], vms["web-2"]]
+    assert index.find(vim.VirtualMachine, "web", container=web,
+                      recursive=False) == [vms["web-1"], vms["web-2"]]
+    assert index.find(vim.VirtualMachine, "web", recursive=False) == \
+        [vms["web-lb"]]
+    assert index.find(vim.VirtualMachine, container=db) == \
+        [vms["db-1"], vms["web-db"]]
+    assert index.contents(web) == [nested, vms["web-10"], vms["web-1"],
+                                   vms["web-2"], vms["Web-3"]]
+    assert index.contents(web, vim.Folder) == [nested]
+    assert index.depth(vms["web-10"]) == 3 and index.depth(root) == 0
+    assert index.ancestors(vms["web-10"]) == [nested, web, root]
+    assert vms["dns"] in index and root in index
+    assert index.find(vim.VirtualMachine, container=sim.add_folder(None, "x"))\
+        == []
+
+
+def test_name_index_patterns():
+    from pyVmomi import vim
+    from adles.vsphere.name_index import NameIndex
+
+    sim, root, web, db, nested, vms = make_tree()
+    index = NameIndex.retrieve(root)
+
+    def names(**kwargs):
+        return [index.name(vm)
+                for vm in index.find(vim.VirtualMachine, **kwargs)]
+
+    assert names(glob="web-?") == ["web-1", "web-2"]
+    assert names(glob="*db*") == ["db-1", "web-db"]
+    assert names(glob="[wd]*-1") == ["web-1", "db-1"]
+    assert names(regex=r"web-\d+$") == ["web-10", "web-1", "web-2"]
+    assert names(regex="d|web-l") == ["db-1", "web-lb", "dns"]
+    assert names(regex="webs?-1") == ["web-10", "web-1"]
+    assert names(prefix="web", glob="*1") == ["web-1"]
+    assert names(prefix="db", glob="web*") == []
+    assert names(glob="web-1", container=web, recursive=False) == ["web-1"]
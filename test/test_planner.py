@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+
+def test_plan_order_and_estimate():
+    from adles.planner import Plan
+
+    plan = Plan("test")
+    root = plan.add("folder", "/root", cost=1.0)
+    a = plan.add("clone", "/root/a", deps=[root], cost=2.0)
+    b = plan.add("clone", "/root/b", deps=[root], cost=3.0)
+    plan.add("template", "/root/b", deps=[b, None], cost=1.0)
+    assert [op.key for op in plan] == [root, a, b, "template:/root/b"]
+    assert plan.operations["template:/root/b"].deps == [b]
+    assert plan.dependents()[root] == [a, b]
+    assert plan.estimate(workers=1) == (7.0, 5.0, 7.0)
+    assert plan.estimate(workers=2) == (7.0, 5.0, 5.0)
+    assert "4 operations" in plan.format()
+
+
+def test_run_plan():
+    import threading
+    from adles.planner import Plan, run_plan
+
+    plan = Plan("test")
+    root = plan.add("folder", "/root")
+    ok = plan.add("clone", "/root/ok", deps=[root])
+    bad = plan.add("clone", "/root/bad", deps=[root])
+    after_bad = plan.add("template", "/root/bad", deps=[bad])
+    after_both = plan.add("folder", "/root/done", deps=[ok, after_bad])
+    lock = threading.Lock()
+    order = []
+
+    def execute(op, results):
+        assert all(dep in results for dep in op.deps)
+        with lock:
+            order.append(op.key)
+        if op.key == bad:
+            raise ValueError("Failed")
+        return op.path
+
+    results, failed = run_plan(plan, execute, max_workers=4)
+    assert order[0] == root
+    assert sorted(order) == sorted([root, ok, bad])
+    assert results == {root: "/root", ok: "/root/ok"}
+    assert sorted(failed) == sorted([bad, after_bad, after_both])
+
+
+def test_plan_add_duplicates():
+    from adles.planner import Plan
+
+    plan = Plan("test")
+    root = plan.add("folder", "/root", name="root")
+    net = plan.add("portgroup", "net", config={"vlan": 1})
+    assert plan.add("portgroup", "net", config={"vlan": 1}) == net
+    assert len(plan) == 2
+    with pytest.raises(ValueError):
+        plan.add("portgroup", "net", config={"vlan": 2})
+    with pytest.raises(ValueError):
+        plan.add("folder", "/root", deps=[net], name="root")
+    with pytest.raises(KeyError):
+        plan.add("folder", "/root/sub", deps=["folder:/missing"])
+    assert [op.key for op in plan] == [root, net]
@@ -47,8 +47,8 @@ def test_split_path():
 def test_get_vlan():
     from adles.utils import get_vlan
 
-    assert get_vlan() >= 2000
-    assert get_vlan() <= 4096
+    assert next(get_vlan()) >= 2000
+    assert next(get_vlan()) <= 4096
 
 
 def test_read_json():
@@ -56,3 +56,15 @@ def test_read_json():
 
     assert isinstance(read_json('../users.json'), dict)
     assert read_json('lame.jpg') is None
+
+
+def test_is_folder_and_is_vm():
+    from pyVmomi import vim
+    from adles.utils import is_folder, is_vm
+
+    assert is_folder(vim.Folder("group-v1"))
+    assert is_folder(vim.StoragePod("group-p1"))  # A kind of folder
+    assert not is_folder(vim.VirtualMachine("vm-1"))
+    assert is_vm(vim.VirtualMachine("vm-1"))
+    assert not is_vm(vim.Folder("group-v1"))
+    assert not is_folder("folder") and not is_vm(None)
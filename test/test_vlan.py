@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def test_vlan_allocate_and_release():
+    from adles.vlan import VlanAllocator
+
+    vlans = VlanAllocator(start=10, end=14)
+    assert vlans.allocate("a") == 10
+    assert vlans.allocate("a") == 10  # The same network keeps it's VLAN
+    assert vlans.allocate("b") == 11
+    assert vlans.allocate() == 12  # Not kept for a network
+    assert vlans.names() == ["a", "b"] and len(vlans) == 2
+    assert vlans.available() == 2
+    assert vlans.release("a")
+    assert not vlans.release("a")
+    assert "a" not in vlans and vlans.get("a") is None
+    assert vlans.allocate("c") == 10  # Released VLANs are reused
+    assert vlans.allocate("d") == 13
+    assert vlans.allocate("e") == 14
+    assert vlans.allocate("f") is None  # They've all been allocated
+    vlans.close()
+
+
+def test_vlan_reserve():
+    from adles.vlan import VlanAllocator
+
+    vlans = VlanAllocator(start=10, end=20)
+    assert vlans.reserve([10, 12, 12, 15, 99]) == 3
+    assert vlans.reserve([10]) == 0  # Already reserved
+    assert [vlans.allocate(str(i)) for i in range(4)] == [11, 13, 14, 16]
+    assert vlans.available() == 4
+    vlans.release("1")
+    assert vlans.available() == 5
+    assert vlans.allocate("again") == 13
+    vlans.close()
+
+
+def test_vlan_persist(tmpdir):
+    from adles.vlan import VlanAllocator
+
+    filename = str(tmpdir.join("vlans.db"))
+    vlans = VlanAllocator(filename, "exercise", start=100, end=200)
+    vlans.allocate("net-a")
+    vlans.allocate("net-b")
+    vlans.allocate()
+    vlans.release("net-a")
+    vlans.close()
+
+    vlans = VlanAllocator(filename, "exercise", start=100, end=200)
+    assert vlans.names() == ["net-b"]
+    assert vlans.get("net-b") == 101
+    assert vlans.allocate("net-c") == 100  # Unnamed VLANs aren't kept
+    vlans.close()
+
+    other = VlanAllocator(filename, "other", start=100, end=200)
+    assert len(other) == 0
+    other.close()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def test_vm_state_changes():
+    from adles.vsphere.simulator import Simulator
+    from adles.vsphere.vm import VM
+
+    sim = Simulator()
+    vm = VM(vm=sim.add_vm(sim.add_folder(None, "folder"), "vm"))
+    assert not vm.powered_on()
+    assert not vm.is_template()
+
+    assert vm.change_state("on")
+    sim.reset_stats()
+    assert vm.powered_on()  # Known from the change, without a round trip
+    assert vm.power_state == "poweredOn"
+    assert sim.round_trips() == 0
+    assert vm.change_state("off")
+    assert not vm.powered_on()
+
+    vm.convert_template()
+    assert vm.is_template()
+    assert not vm.change_state("on")
+    vm.convert_vm()
+    assert not vm.is_template()
+    assert VM(vm=vm.get_vim_vm()).template is False
+
+
+def test_vm_live_data_refresh():
+    from adles.vsphere.simulator import Simulator
+    from adles.vsphere.vm import VM
+
+    sim = Simulator()
+    vm = VM(vm=sim.add_vm(sim.add_folder(None, "folder"), "vm"))
+    assert not vm.powered_on()
+    vm.get_vim_vm().PowerOnVM_Task().wait()
+    assert not vm.powered_on()  # Reused until the TTL passes
+    assert vm.refresh()
+    assert vm.powered_on()
+    assert vm.power_state == "poweredOn"
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def make_interface(tmpdir, num_folders, num_services, sim=None):
+    """ Makes an interface for a generated exercise on a simulator. """
+    from adles.benchmark import make_infra, make_spec
+    from adles.interfaces.vsphere_interface import VsphereInterface
+    from adles.vsphere import Vsphere
+    from adles.vsphere.simulator import Simulator
+
+    if sim is None:
+        sim = Simulator()
+        templates = sim.add_folder(None, "Templates")
+        for i in range(num_services):
+            sim.add_vm(templates, "template-%d" % i, template=True)
+    infra = make_infra()["vmware-vsphere"]
+    infra["journal-file"] = str(tmpdir.join("journal.db"))
+    spec = make_spec(num_folders, num_services, str(tmpdir.join("infra.yaml")))
+    server = Vsphere(service_instance=sim.connect())
+    return VsphereInterface(infra, spec, server=server)
+
+
+def test_deploy_folders_sharing_services(tmpdir):
+    from pyVmomi import vim
+    from adles.vsphere.vm import VM
+
+    interface = make_interface(tmpdir, 2, 2)
+    interface.create_masters()
+    interface.deploy_environment()
+
+    masters = [vm for f in interface.master_folder.childEntity
+               for vm in f.childEntity]
+    assert len(masters) == 4
+    assert all(VM(vm=vm).is_template() for vm in masters)
+    # Every instance is cloned from the Master in it's own Master folder
+    for folder in ("folder-0", "folder-1"):
+        deployed = interface.root_folder.traverse_path(folder)
+        assert sorted(vm.name for vm in deployed.childEntity
+                      if isinstance(vm, vim.VirtualMachine)) == \
+            ["instance-0", "instance-1"]
+    assert len(interface.masters) == 4
+
+
+def test_deployment_plan_has_a_template_per_master(tmpdir):
+    interface = make_interface(tmpdir, 2, 2)
+    plan = interface.planner.plan_deployment()
+
+    templates = sorted(op.path for op in plan if op.kind == "template")
+    assert templates == [
+        "/MASTER-FOLDERS/(MASTER) folder-0/(MASTER) service-0",
+        "/MASTER-FOLDERS/(MASTER) folder-0/(MASTER) service-1",
+        "/MASTER-FOLDERS/(MASTER) folder-1/(MASTER) service-0",
+        "/MASTER-FOLDERS/(MASTER) folder-1/(MASTER) service-1"]
+    masters = [op.path for op in interface.planner.plan_masters()
+               if op.kind == "master"]
+    assert sorted(masters) == templates
+
+
+def test_journal_only_opened_by_phases_that_use_it(tmpdir):
+    interface = make_interface(tmpdir, 1, 1)
+    interface.cleanup_masters()
+    assert not tmpdir.join("journal.db").exists()
+    interface.create_masters()
+    assert tmpdir.join("journal.db").exists()
+
+
+def test_resume_from_journal(tmpdir):
+    from adles.journal import Journal
+    from adles.vsphere.simulator import Simulator
+
+    # The template of service-1 is missing, so it's Masters fail
+    sim = Simulator()
+    templates = sim.add_folder(None, "Templates")
+    sim.add_vm(templates, "template-0", template=True)
+    interface = make_interface(tmpdir, 2, 2, sim)
+    plan = interface.planner.plan_masters()
+    interface.create_masters()
+    journal = Journal(interface.journal_file, "masters", resume=True)
+    done = [op.key for op in plan if op.key in journal]
+    journal.close()
+    assert "folder:/MASTER-FOLDERS" in done
+    assert len(done) == len(plan) - 6  # The master, nics and snapshot ops
+    assert all("service-1" in op.key for op in plan if op.key not in done)
+
+    # Resuming only does what wasn't done
+    sim.add_vm(templates, "template-1", template=True)
+    sim.reset_stats()
+    make_interface(tmpdir, 2, 2, sim).create_masters(resume=True)
+    assert sim.calls["VirtualMachine.CloneVM_Task"] == 2
+    assert sim.calls["Folder.CreateFolder"] == 0
+    journal = Journal(interface.journal_file, "masters", resume=True)
+    assert all(op.key in journal for op in plan)
+    journal.close()
+
+    # Starting over finds the Masters that exist instead of cloning them
+    sim.reset_stats()
+    make_interface(tmpdir, 2, 2, sim).create_masters()
+    assert sim.calls["VirtualMachine.CloneVM_Task"] == 0
+
+
+def test_created_masters_keep_their_nics(tmpdir):
+    from adles.vsphere.simulator import Simulator
+
+    sim = Simulator()
+    templates = sim.add_folder(None, "Templates")
+    for i in range(2):
+        sim.add_vm(templates, "template-%d" % i, template=True)
+    interface = make_interface(tmpdir, 2, 2, sim)
+    interface.create_masters()
+    assert len(interface.created_masters) == 4
+    # The nics operations of cloned Masters don't read their devices
+    assert sim.calls["VirtualMachine.config"] == 4
+    assert sim.calls["VirtualMachine.ReconfigVM_Task"] == 0
+
+    # Masters that already exist aren't recorded as created
+    interface = make_interface(tmpdir, 2, 2, sim)
+    interface.create_masters()
+    assert not interface.created_masters
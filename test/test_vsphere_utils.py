@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def test_wait_for_tasks_sliding_window():
+    from adles.vsphere.simulator import Simulator
+    from adles.vsphere.vsphere_utils import wait_for_tasks
+
+    sim = Simulator()
+    folder = sim.add_folder(None, "folder")
+    vms = [sim.add_vm(folder, "vm-%d" % i) for i in range(5)]
+    started = []  # Tasks in the order they were started
+    states = []  # State of the first task when each other task started
+
+    def power_on(vm, duration):
+        def start():
+            if started:
+                states.append(started[0].info.state)
+            sim.task_duration = duration
+            started.append(vm.PowerOnVM_Task())
+            return started[-1]
+        return start
+
+    # The first task is slow, the rest are started in the other slot
+    tasks = [power_on(vms[0], 0.5)] + [power_on(vm, 0.01) for vm in vms[1:]]
+    _, outcomes = wait_for_tasks(tasks, concurrency=2)
+    assert outcomes == ["success"] * 5
+    assert states == ["running"] * 4
+
+
+def test_wait_for_tasks_outcomes():
+    from adles.vsphere.simulator import Simulator
+    from adles.vsphere.vsphere_utils import wait_for_tasks
+
+    sim = Simulator()
+    folder = sim.add_folder(None, "folder")
+    on = sim.add_vm(folder, "on", powered_on=True)
+    off = sim.add_vm(folder, "off")
+    results, outcomes = wait_for_tasks([
+        on.PowerOffVM_Task(), off.PowerOffVM_Task, None,
+        lambda: folder,  # Not a task
+        lambda: folder.parent.CreateFolder("folder")])  # Fails to start
+    assert outcomes == ["success", "InvalidPowerState", "invalid",
+                        "invalid", "DuplicateName"]
+    assert results == [None] * 5
+    assert wait_for_tasks([]) == ([], [])
+
+
+def test_wait_for_task_result():
+    from pyVmomi import vim
+    from adles.vsphere.simulator import Simulator
+    from adles.vsphere.vsphere_utils import wait_for_task
+
+    sim = Simulator(task_duration=0.05)
+    vm = sim.add_vm(sim.add_folder(None, "folder"), "vm")
+    clone = wait_for_task(vm.CloneVM_Task(folder=vm.parent, name="clone",
+                                          spec=vim.vm.CloneSpec()))
+    assert isinstance(clone, vim.VirtualMachine)
+    assert clone.name == "clone"
+    assert vm.PowerOffVM_Task().wait() is None  # Fault
+    assert wait_for_task(None) is None
+
+
+def test_task_waiter_timeout():
+    from adles.vsphere.simulator import Simulator
+    from adles.vsphere.vsphere_utils import TaskWaiter, wait_for_tasks
+
+    sim = Simulator(task_duration=30.0)
+    vm = sim.add_vm(sim.add_folder(None, "folder"), "vm")
+    task = vm.PowerOnVM_Task()
+    waiter = TaskWaiter([task], timeout=0.1)
+    info = waiter.wait()[0]
+    assert info.state == "error"
+    assert task._moId in waiter.timed_out
+    assert task.info.cancelled  # The task was cancelled on the server
+
+    _, outcomes = wait_for_tasks([vm.PowerOnVM_Task], timeout=0.1)
+    assert outcomes == ["timeout"]